@@ -0,0 +1,46 @@
+"""Benchmark for result assembly: parse -> price -> dedupe -> rank -> JSON body.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_assembly [--rows 200] [--repeat 200]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from backend.main import assemble_items
+from backend.benchmarks.bench_parser import make_rows
+from backend.scrapers.serpapi import normalize_shopping
+
+
+def run(shopping):
+    rows = normalize_shopping(shopping, 'us')
+    items = assemble_items(rows)
+    return json.dumps({'query': 'q', 'results': items, 'result_set_id': 'x'}, ensure_ascii=False)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=200)
+    ap.add_argument('--repeat', type=int, default=200)
+    args = ap.parse_args()
+    shopping = make_rows(args.rows)
+    for _ in range(20):  # warm up
+        run(shopping)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        run(shopping)
+    elapsed = (time.perf_counter() - start) / args.repeat
+
+    tracemalloc.start()
+    run(shopping)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{args.rows} rows: {elapsed * 1000:.2f} ms/search -> {elapsed / args.rows * 1e6:.1f} us/row, '
+          f'peak {peak / 1024:.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
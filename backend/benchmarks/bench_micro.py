@@ -0,0 +1,106 @@
+"""Microbenchmarks of the per-row search path over a realistic corpus.
+
+Covers `parse_currency` (with the classification cache cold and warm), `detect_discount`,
+`normalize_retailer`, `normalize_shopping`, and landed-cost math (`calculate_landed_cost`
+per row vs `landed_cost_batch` per result set). The corpus is the recorded
+`shopping_results` in `data/` plus generated rows with list prices and ambiguous `$`.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_micro [--json out.json] [--only parse]
+"""
+import argparse
+import json
+import os
+
+from backend.benchmarks.bench_parser import make_rows
+from backend.benchmarks.common import DATA_DIR, time_per_call, write_results
+from backend.scrapers.serpapi import normalize_shopping
+from backend.utils import calc, parser, retailer
+
+
+def load_corpus():
+    """(recorded payloads by region, flat list of rows: recorded + generated)."""
+    with open(os.path.join(DATA_DIR, 'shopping_results.json')) as f:
+        payloads = json.load(f)
+    rows = [r for p in payloads.values() for r in p['shopping_results']] + make_rows(2000, seed=19)
+    return payloads, rows
+
+
+def cases(payloads, rows):
+    """name -> (callable, rows handled per call)."""
+    prices = [str(r.get('price') or '') for r in rows]
+    hinted = [(p, r, parser.RowHints(r)) for p, r in zip(prices, rows)]
+    parsed = [parser.parse_currency(p, r) for p, r in zip(prices, rows)]
+    sources = [r.get('source') or '' for r in rows]
+    amounts = [p[0] for p in parsed]
+    currencies = [p[1] for p in parsed]
+    regions = [('us', 'gb', 'jp')[i % 3] for i in range(len(rows))]
+    origins = [calc.origin_for_region(r) for r in regions]
+
+    def parse_cold():
+        parser._classify.cache_clear()
+        for p, r in zip(prices, rows):
+            parser.parse_currency(p, r, parser.RowHints(r))
+
+    def parse_warm():
+        for p, r, h in hinted:
+            parser.parse_currency(p, r, h)
+
+    def discount():
+        for (_, r, h), (_, _, _, twd) in zip(hinted, parsed):
+            parser.detect_discount(r, twd, h)
+
+    def retailers():
+        for s in sources:
+            retailer.normalize_retailer(s)
+
+    def landed_per_row():
+        for a, c in zip(amounts, currencies):
+            calc.calculate_landed_cost(a, c)
+
+    def landed_batch():
+        calc.landed_cost_batch(amounts, currencies, origins=origins,
+                               origin_rates=calc.ORIGIN_RATES, default_weight_lbs=2)
+
+    recorded = list(payloads.items())
+    recorded_rows = sum(len(p['shopping_results']) for _, p in recorded)
+
+    def normalize():
+        for region, p in recorded:
+            normalize_shopping(p['shopping_results'], region)
+
+    n = len(rows)
+    return {
+        'parse_currency_cold': (parse_cold, n),
+        'parse_currency_warm': (parse_warm, n),
+        'detect_discount': (discount, n),
+        'normalize_retailer': (retailers, n),
+        'calculate_landed_cost': (landed_per_row, n),
+        'landed_cost_batch': (landed_batch, n),
+        'normalize_shopping': (normalize, recorded_rows),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--number', type=int, default=20, help='calls per timing run')
+    ap.add_argument('--repeat', type=int, default=5, help='timing runs; the best is kept')
+    ap.add_argument('--only', help='run only cases whose name contains this')
+    ap.add_argument('--json', help='write results to this file')
+    args = ap.parse_args()
+    payloads, rows = load_corpus()
+    results = {}
+    for name, (fn, n) in cases(payloads, rows).items():
+        if args.only and args.only not in name:
+            continue
+        fn()  # warm up
+        us = time_per_call(fn, args.number, args.repeat)
+        results[name] = {'us_per_row': round(us / n, 4), 'ops_per_s': round(n / us * 1e6)}
+        print(f'{name:<24} {us / n:>9.3f} us/row  {n / us * 1e6:>12,.0f} rows/s')
+    if args.json:
+        write_results(args.json, 'micro', results, {'rows': len(rows), 'number': args.number, 'repeat': args.repeat})
+
+
+if __name__ == '__main__':
+    main()
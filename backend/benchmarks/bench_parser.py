@@ -0,0 +1,63 @@
+"""Microbenchmark for price parsing: per-row cost of `parse_currency` + `detect_discount`.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_parser [--rows 20000]
+"""
+import argparse
+import random
+import time
+
+from backend.utils import parser
+
+PRICES = [
+    '$1,234.50', 'US$ 50', 'NT$ 12,800', '£329.00', '€ 299', '¥40,000', 'JPY 12000',
+    'USD 99.99', '$100', '99.99', 'GBP 280', 'TWD 3,000', '$ 89 sale',
+]
+
+
+def make_rows(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        price = rnd.choice(PRICES)
+        row = {
+            'title': f'Barbour Bedale Wax Jacket {i}',
+            'price': price,
+            'source': rnd.choice(['END. Clothing', 'SSENSE', 'Farfetch', 'Mr Porter']),
+            'link': f'https://example.com/p/{i}',
+            'thumbnail': f'https://example.com/img/{i}.jpg',
+            'delivery': rnd.choice(['Free delivery', 'NT$ 300 delivery', 'US$ 20 shipping']),
+        }
+        if rnd.random() < 0.3:
+            row['strike_price'] = rnd.choice(PRICES)
+        rows.append(row)
+    return rows
+
+
+def bench(rows):
+    start = time.perf_counter()
+    for r in rows:
+        hints = parser.RowHints(r)
+        _, _, _, twd = parser.parse_currency(r['price'], r, hints)
+        parser.detect_discount(r, twd, hints)
+    return time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=20000)
+    args = ap.parse_args()
+    rows = make_rows(args.rows)
+    bench(rows[:1000])  # warm up
+    elapsed = bench(rows)
+    print(f'{len(rows)} rows in {elapsed * 1000:.1f} ms -> {elapsed / len(rows) * 1e6:.2f} us/row')
+
+    start = time.perf_counter()
+    parser.parse_currency_many((r['price'], r) for r in rows)
+    elapsed = time.perf_counter() - start
+    print(f'parse_currency_many: {elapsed / len(rows) * 1e6:.2f} us/row')
+
+
+if __name__ == '__main__':
+    main()
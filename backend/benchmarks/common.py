@@ -0,0 +1,103 @@
+"""Shared helpers for the benchmarks: percentiles, result files and comparisons.
+
+Every benchmark can write its results with `--json PATH`; compare two runs (for example
+the parent commit and yours) with:
+
+    python -m backend.benchmarks.common BASE.json NEW.json
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Sequence
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+# metrics where a larger value is better; everything else (times) is lower-is-better
+HIGHER_IS_BETTER = ('rps', 'ops_per_s')
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values (0 if empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max/mean in milliseconds of latencies given in seconds."""
+    s = sorted(latencies)
+    return {
+        'p50_ms': round(percentile(s, 50) * 1000, 3),
+        'p95_ms': round(percentile(s, 95) * 1000, 3),
+        'p99_ms': round(percentile(s, 99) * 1000, 3),
+        'max_ms': round(s[-1] * 1000, 3) if s else 0.0,
+        'mean_ms': round(sum(s) / len(s) * 1000, 3) if s else 0.0,
+    }
+
+
+def time_per_call(fn: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """Best of `repeat` runs of `number` calls, in microseconds per call."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or 'unknown'
+    except Exception:
+        return 'unknown'
+
+
+def write_results(path: str, name: str, results: Dict[str, Dict[str, float]], config: Dict = None):
+    """Save `results` ({case: {metric: value}}) with the commit and Python version."""
+    doc = {
+        'benchmark': name,
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'config': config or {},
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+
+
+def compare(base: Dict, new: Dict) -> List[str]:
+    """Table of every metric present in both result files, with the relative change;
+    regressions are marked with `!`."""
+    lines = [f"{base.get('commit', '?')} -> {new.get('commit', '?')} ({new.get('benchmark', '')})"]
+    for case, metrics in new['results'].items():
+        for metric, value in metrics.items():
+            old = base['results'].get(case, {}).get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or not old:
+                continue
+            change = (value - old) / old * 100
+            worse = change < 0 if metric in HIGHER_IS_BETTER else change > 0
+            flag = '!' if worse and abs(change) >= 5 else ' '
+            lines.append(f'{flag} {case:<32} {metric:<12} {old:>12.3f} {value:>12.3f} {change:>+8.1f}%')
+    return lines
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    with open(sys.argv[1]) as f:
+        base = json.load(f)
+    with open(sys.argv[2]) as f:
+        new = json.load(f)
+    print('\n'.join(compare(base, new)))
+
+
+if __name__ == '__main__':
+    main()
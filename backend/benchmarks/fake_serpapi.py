@@ -0,0 +1,89 @@
+"""Local stand-in for SerpApi's Google Shopping endpoint, for load tests.
+
+Serves recorded `shopping_results` payloads (one per `gl` region, see `data/`) at
+`GET /search`, with configurable latency and injected failures:
+
+- `--latency-ms` / `--jitter-ms`: delay of every response (uniform jitter around it)
+- `--error-rate` / `--error-status`: share of calls answered with that status instead
+  (429 responses carry `Retry-After: 1`)
+- `--hang-rate`: share of calls that never answer in time (sleep 60 s), to exercise timeouts
+
+`GET /stats` returns how many calls were served and failed. Run from the repository root:
+
+    python -m backend.benchmarks.fake_serpapi --port 8765 --latency-ms 300 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+from typing import Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from backend.benchmarks.common import DATA_DIR
+
+
+def create_app(payloads: Optional[Dict[str, dict]] = None, latency_ms: float = 0, jitter_ms: float = 0,
+               error_rate: float = 0, error_status: int = 503, hang_rate: float = 0, seed: Optional[int] = None):
+    if payloads is None:
+        with open(os.path.join(DATA_DIR, 'shopping_results.json')) as f:
+            payloads = json.load(f)
+    bodies = {gl: json.dumps(p).encode() for gl, p in payloads.items()}
+    default = next(iter(bodies.values()))
+    rnd = random.Random(seed)
+    stats = {'calls': 0, 'errors': 0, 'hangs': 0, 'by_region': {}}
+
+    async def search(request: Request):
+        gl = request.query_params.get('gl', 'us')
+        stats['calls'] += 1
+        stats['by_region'][gl] = stats['by_region'].get(gl, 0) + 1
+        delay = max(0.0, latency_ms + rnd.uniform(-jitter_ms, jitter_ms)) / 1000
+        roll = rnd.random()
+        if roll < hang_rate:
+            stats['hangs'] += 1
+            await asyncio.sleep(60)
+        elif roll < hang_rate + error_rate:
+            stats['errors'] += 1
+            await asyncio.sleep(delay)
+            headers = {'Retry-After': '1'} if error_status == 429 else None
+            return JSONResponse({'error': 'injected failure'}, status_code=error_status, headers=headers)
+        if delay:
+            await asyncio.sleep(delay)
+        return Response(bodies.get(gl, default), media_type='application/json')
+
+    async def get_stats(request: Request):
+        return JSONResponse(stats)
+
+    app = Starlette(routes=[Route('/search', search), Route('/stats', get_stats)])
+    app.state.stats = stats
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--payloads', help='JSON file of {gl: SerpApi response}; default: the recorded set in data/')
+    ap.add_argument('--latency-ms', type=float, default=300)
+    ap.add_argument('--jitter-ms', type=float, default=100)
+    ap.add_argument('--error-rate', type=float, default=0.0)
+    ap.add_argument('--error-status', type=int, default=503)
+    ap.add_argument('--hang-rate', type=float, default=0.0)
+    ap.add_argument('--seed', type=int)
+    args = ap.parse_args()
+    payloads = None
+    if args.payloads:
+        with open(args.payloads) as f:
+            payloads = json.load(f)
+    import uvicorn
+    uvicorn.run(create_app(payloads, args.latency_ms, args.jitter_ms, args.error_rate, args.error_status,
+                           args.hang_rate, args.seed),
+                host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""End-to-end load test: the FastAPI app against the local SerpApi stand-in.
+
+Starts `fake_serpapi` and the app (uvicorn, pointed at the fake through `SERPAPI_URL`,
+with history/catalog/disk cache files in a temporary directory) as subprocesses, then
+runs `--concurrency` closed-loop clients for `--duration` seconds over `--distinct`
+different queries, and reports throughput, p50/p95/p99 latency, status counts and the
+number of upstream calls. Use `--target` to load an app that is already running instead.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.load --concurrency 32 --duration 20 --latency-ms 300 \\
+        --error-rate 0.02 --json load.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from backend.benchmarks.common import summarize, write_results
+
+BASE_QUERIES = [
+    'barbour bedale', 'barbour ashby', 'arcteryx beta lt', 'arcteryx atom hoody', 'stone island crewneck',
+    'new balance 990v6', 'new balance 2002r', 'patagonia retro-x', 'patagonia torrentshell', 'barbour transport',
+]
+
+
+def queries(distinct: int) -> List[str]:
+    return [BASE_QUERIES[i % len(BASE_QUERIES)] + (f' {i // len(BASE_QUERIES)}' if i >= len(BASE_QUERIES) else '')
+            for i in range(distinct)]
+
+
+def _spawn(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], env={**os.environ, **env},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc is not None and proc.poll() is not None:
+                raise RuntimeError(f'{url} exited: {proc.stderr.read().decode(errors="replace")[-2000:]}')
+            try:
+                await client.get(url, timeout=1)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+
+async def _request(client: httpx.AsyncClient, endpoint: str, q: str, regions: List[str]) -> int:
+    if endpoint == 'get':
+        resp = await client.get('/api/search', params={'q': q, 'regions': ','.join(regions)})
+    elif endpoint == 'stream':
+        async with client.stream('POST', '/api/search/stream', json={'q': q, 'regions': regions}) as resp:
+            async for _ in resp.aiter_raw():
+                pass
+        return resp.status_code
+    else:
+        resp = await client.post('/api/search', json={'q': q, 'regions': regions})
+    return resp.status_code
+
+
+async def run_load(target: str, endpoint: str, concurrency: int, duration: float, warmup: float,
+                   qs: List[str], regions: List[str], seed: int = 0):
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    rnd = random.Random(seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=60,
+                                 headers={'Accept-Encoding': 'gzip'}) as client:
+        start = time.perf_counter()
+        measure_from = start + warmup
+        stop_at = measure_from + duration
+
+        async def worker():
+            while True:
+                t0 = time.perf_counter()
+                if t0 >= stop_at:
+                    return
+                try:
+                    status = await _request(client, endpoint, rnd.choice(qs), regions)
+                except httpx.HTTPError as exc:
+                    status = type(exc).__name__
+                t1 = time.perf_counter()
+                if t0 >= measure_from:
+                    latencies.append(t1 - t0)
+                    statuses[str(status)] += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - measure_from
+    return latencies, statuses, elapsed
+
+
+async def amain(args):
+    procs = []
+    tmp = tempfile.TemporaryDirectory(prefix='hypeprice-load-')
+    fake_url = f'http://127.0.0.1:{args.fake_port}'
+    target = args.target
+    try:
+        if not target:
+            procs.append(_spawn([
+                '-m', 'backend.benchmarks.fake_serpapi', '--port', str(args.fake_port),
+                '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+                '--error-rate', str(args.error_rate), '--error-status', str(args.error_status),
+                '--hang-rate', str(args.hang_rate), '--seed', str(args.seed),
+            ], {}))
+            await _wait_ready(fake_url + '/stats', procs[-1])
+            env = {
+                'SERPAPI_KEY': 'load-test',
+                'SERPAPI_URL': fake_url + '/search',
+                'SERPAPI_RATE_PER_SECOND': str(args.upstream_rate),
+                'SERPAPI_BURST': str(max(10, int(args.upstream_rate))),
+                'CACHE_TTL': str(args.cache_ttl),
+                'PREWARM_ENABLED': '0',
+                'HISTORY_PATH': os.path.join(tmp.name, 'history.sqlite3'),
+                'CATALOG_PATH': os.path.join(tmp.name, 'catalog.sqlite3'),
+                'DISK_CACHE_PATH': os.path.join(tmp.name, 'serpapi.sqlite3'),
+                'LOG_LEVEL': 'WARNING',
+            }
+            procs.append(_spawn(['-m', 'uvicorn', 'backend.main:app', '--port', str(args.app_port),
+                                 '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log'], env))
+            target = f'http://127.0.0.1:{args.app_port}'
+            await _wait_ready(target + '/health', procs[-1])
+
+        regions = [r.strip() for r in args.regions.split(',') if r.strip()]
+        latencies, statuses, elapsed = await run_load(target, args.endpoint, args.concurrency, args.duration,
+                                                      args.warmup, queries(args.distinct), regions, args.seed)
+        upstream = {}
+        if not args.target:
+            async with httpx.AsyncClient() as client:
+                upstream = (await client.get(fake_url + '/stats')).json()
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        tmp.cleanup()
+
+    result = {'requests': len(latencies), 'rps': round(len(latencies) / elapsed, 1), **summarize(latencies),
+              'upstream_calls': upstream.get('calls', 0), 'upstream_errors': upstream.get('errors', 0)}
+    ok = sum(n for s, n in statuses.items() if s in ('200', '304'))
+    result['error_rate'] = round(1 - ok / len(latencies), 4) if latencies else 0.0
+    print(f"{args.endpoint} x{args.concurrency} for {elapsed:.1f}s: {result['requests']} requests, "
+          f"{result['rps']} req/s")
+    print(f"latency ms: p50 {result['p50_ms']}  p95 {result['p95_ms']}  p99 {result['p99_ms']}  "
+          f"max {result['max_ms']}")
+    print(f"statuses: {dict(statuses)}  upstream calls: {result['upstream_calls']} "
+          f"({result['upstream_errors']} injected failures)")
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k != 'json'}
+        write_results(args.json, 'load', {f'{args.endpoint}_c{args.concurrency}': result}, config)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--target', help='base URL of a running app (skips starting the app and the fake SerpApi)')
+    ap.add_argument('--endpoint', choices=('post', 'get', 'stream'), default='post')
+    ap.add_argument('--concurrency', type=int, default=16)
+    ap.add_argument('--duration', type=float, default=15, help='measured seconds')
+    ap.add_argument('--warmup', type=float, default=3, help='seconds run before measuring')
+    ap.add_argument('--distinct', type=int, default=50, help='number of different queries')
+    ap.add_argument('--regions', default='us,gb,jp')
+    ap.add_argument('--workers', type=int, default=1, help='uvicorn workers for the app')
+    ap.add_argument('--cache-ttl', type=int, default=120)
+    ap.add_argument('--upstream-rate', type=float, default=1000, help='SERPAPI_RATE_PER_SECOND for the app')
+    ap.add_argument('--latency-ms', type=float, default=300)
+    ap.add_argument('--jitter-ms', type=float, default=100)
+    ap.add_argument('--error-rate', type=float, default=0.0)
+    ap.add_argument('--error-status', type=int, default=503)
+    ap.add_argument('--hang-rate', type=float, default=0.0)
+    ap.add_argument('--fake-port', type=int, default=8765)
+    ap.add_argument('--app-port', type=int, default=8766)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--json', help='write results to this file')
+    asyncio.run(amain(ap.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
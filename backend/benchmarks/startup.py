@@ -0,0 +1,75 @@
+"""Cold-start benchmark: time to import `backend.main` in fresh interpreters.
+
+Each run starts a new Python process (with history/catalog/watchlist/image stores in a
+temporary directory), imports the app and reports the import time, plus the total
+process time including interpreter start. Also lists heavy modules that were imported
+eagerly (they should load lazily, see `WARM_IMPORTS` in main.py). With `--budget-ms`
+the command fails when the median import time is over budget, so CI can enforce it.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.startup --runs 7 --budget-ms 1500 [--json startup.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from backend.benchmarks.common import summarize, write_results
+
+# modules the app must not import before its first request
+LAZY_MODULES = ('numpy', 'httpx', 'PIL', 'playwright')
+
+_PROBE = (
+    "import json, sys, time; t = time.perf_counter(); import backend.main; "
+    "print(json.dumps({'import_s': time.perf_counter() - t, "
+    "'eager': [m for m in %r if m in sys.modules]}))" % (LAZY_MODULES,)
+)
+
+
+def run_once(env) -> dict:
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', _PROBE], env=env, capture_output=True, text=True, timeout=120)
+    total = time.perf_counter() - start
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['process_s'] = total
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--runs', type=int, default=7)
+    ap.add_argument('--budget-ms', type=float, help='fail if the median import time exceeds this')
+    ap.add_argument('--json', help='write results to this file')
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, 'HISTORY_PATH': os.path.join(tmp, 'history.sqlite3'),
+               'CATALOG_PATH': os.path.join(tmp, 'catalog.sqlite3'),
+               'WATCHLIST_PATH': os.path.join(tmp, 'watchlist.sqlite3'),
+               'IMAGE_CACHE_PATH': os.path.join(tmp, 'images'), 'LOG_LEVEL': 'ERROR'}
+        runs = [run_once(env) for _ in range(args.runs)]
+
+    results = {
+        'import': summarize([r['import_s'] for r in runs]),
+        'process': summarize([r['process_s'] for r in runs]),
+    }
+    eager = sorted({m for r in runs for m in r['eager']})
+    for case, s in results.items():
+        print(f"{case:<8} p50 {s['p50_ms']:8.1f} ms   max {s['max_ms']:8.1f} ms")
+    if eager:
+        print('imported eagerly:', ', '.join(eager))
+    if args.json:
+        write_results(args.json, 'startup', results, {'runs': args.runs, 'eager': eager})
+    median = results['import']['p50_ms']
+    if args.budget_ms is not None and median > args.budget_ms:
+        sys.exit(f'import took {median:.1f} ms, over the {args.budget_ms:.0f} ms budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,40 @@
 import os
-import requests
-import re
+import sys
+import time
+# cold-start timing (see STARTUP_BUDGET_MS): from here to the end of this module
+_import_started = time.perf_counter()
+import asyncio
+import hashlib
 import logging
-from fastapi import FastAPI, HTTPException
+from urllib.parse import quote
+from contextlib import asynccontextmanager
+import importlib
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, Tuple
 
-from .schemas import SearchRequest, SearchResponse, Item
-from .scrapers.dummy import scrape_dummy
-from .utils.calc import calculate_landed_cost, convert_to_twd
-from .utils import parser, cache, retailer
+from .schemas import (BatchSearchRequest, SearchRequest, SearchResponse, PricingParams, ResultView, Row,
+                      WatchRequest)
+from .scrapers import registry
+from .scrapers.dummy import DummyScraper
+from .scrapers.end_playwright import EndScraper
+from .scrapers.serpapi import SerpApiScraper
+from .scrapers.browser_pool import browser_pool
+from .scrapers.catalog import CatalogScraper
+from .utils.calc import landed_cost_batch, origin_for_region, ORIGIN_RATES
+from .utils import cache, encoding, metrics, paging, quota
+from .utils.prewarm import Prewarmer
+from .utils.matching import cluster_titles
+from .utils.history import BatchWriter, PriceHistory, normalize_url
+from .utils.catalog import Catalog
+from .utils.query import QueryStats, canonical_query, query_key
+from .utils.watchlist import LogSink, Watchlist, WatchScheduler, WebhookSink
+from .utils.images import DiskLRU, ImageError, ImageProxy, load_secret
+from .utils.static import FrontendFiles
+
+if TYPE_CHECKING:
+    import httpx
 
 # logging
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
@@ -21,13 +45,101 @@ logger = logging.getLogger('hypeprice')
 SERPAPI_KEY = os.getenv('SERPAPI_KEY')
 if not SERPAPI_KEY:
     logger.warning('Environment variable SERPAPI_KEY is not set. /api/search will return 503 until configured.')
-SERPAPI_URL = "https://serpapi.com/search"
+SERPAPI_URL = os.getenv('SERPAPI_URL', "https://serpapi.com/search")
+# per-request upstream timeout and overall per-search deadline (seconds). The timeout is
+# capped at half the deadline: a hung SerpApi request must time out, and count towards
+# the circuit breaker, before the deadline cancels the search that made it.
+SEARCH_DEADLINE = float(os.getenv('SEARCH_DEADLINE', '8'))
+SERPAPI_TIMEOUT = min(float(os.getenv('SERPAPI_TIMEOUT', '4')), SEARCH_DEADLINE / 2)
+# default foreign markets (exclude TW by default so we surface non-local prices)
+DEFAULT_REGIONS = ['us', 'gb', 'jp']
+
+# shared pooled client; created lazily and closed from the app lifespan. httpx itself is
+# imported with the first client (or by the post-startup warm-up), not at import time.
+_http_client: Optional['httpx.AsyncClient'] = None
+
+
+def get_http_client() -> 'httpx.AsyncClient':
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        import httpx
+        _http_client = httpx.AsyncClient(
+            timeout=SERPAPI_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _http_client
+
+
+# image downloads get their own client without keep-alive: the proxy connects to checked
+# IPs (see utils/images.py) and a pooled connection would be reused for any host on that IP
+_image_client: Optional['httpx.AsyncClient'] = None
+
 
+def get_image_client() -> 'httpx.AsyncClient':
+    global _image_client
+    if _image_client is None or _image_client.is_closed:
+        import httpx
+        _image_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=20, max_keepalive_connections=0))
+    return _image_client
 
 
-def call_serpapi(query: str, gl: str = 'tw', hl: str = 'zh-tw'):
+async def close_http_client():
+    global _http_client, _image_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    if _image_client is not None:
+        await _image_client.aclose()
+        _image_client = None
+
+
+# Upstream protection for SerpApi: rate limit, daily/monthly call budget (0 = unlimited),
+# circuit breaker and jittered retries of retryable statuses and timeouts. While the
+# breaker is open calls are refused at once, so searches go straight to the fallback providers.
+# The budget is counted in SERPAPI_BUDGET_PATH, shared by all workers and restarts.
+SERPAPI_BUDGET_PATH = os.getenv('SERPAPI_BUDGET_PATH', os.path.join('.cache', 'serpapi-budget.sqlite3'))
+
+
+def open_call_budget() -> quota.CallBudget:
+    daily = int(os.getenv('SERPAPI_DAILY_BUDGET', '0'))
+    monthly = int(os.getenv('SERPAPI_MONTHLY_BUDGET', '0'))
+    try:
+        return quota.CallBudget(daily=daily, monthly=monthly, path=SERPAPI_BUDGET_PATH)
+    except Exception:
+        logger.exception('Could not open call budget at %s; counting in this process only', SERPAPI_BUDGET_PATH)
+        return quota.CallBudget(daily=daily, monthly=monthly)
+
+
+serpapi_guard = quota.QuotaGuard(
+    quota.TokenBucket(
+        rate=float(os.getenv('SERPAPI_RATE_PER_SECOND', '5')),
+        burst=int(os.getenv('SERPAPI_BURST', '10')),
+    ),
+    open_call_budget(),
+    quota.CircuitBreaker(
+        threshold=int(os.getenv('SERPAPI_BREAKER_THRESHOLD', '5')),
+        reset_timeout=float(os.getenv('SERPAPI_BREAKER_RESET_SECONDS', '30')),
+    ),
+    max_retries=int(os.getenv('SERPAPI_MAX_RETRIES', '2')),
+    attempt_timeout=SERPAPI_TIMEOUT,
+)
+
+
+async def _serpapi_get(params: dict):
+    resp = await get_http_client().get(SERPAPI_URL, params=params)
+    resp.raise_for_status()
+    return resp.json()
+
+
+UPSTREAM_DURATION = metrics.Histogram('hypeprice_serpapi_upstream_duration_seconds',
+                                      'SerpApi calls that went upstream (retries included).', ['status'])
+UPSTREAM_IN_FLIGHT = metrics.Gauge('hypeprice_serpapi_upstream_in_flight', 'SerpApi calls in progress.')
+
+
+async def call_serpapi(query: str, gl: str = 'tw', hl: str = 'zh-tw'):
     params = {
         'engine': 'google_shopping',
+        # the user's spelling: the canonical form only keys the cache (see query_key)
         'q': query,
         'gl': gl,
         'hl': hl,
@@ -37,21 +149,248 @@ def call_serpapi(query: str, gl: str = 'tw', hl: str = 'zh-tw'):
         logger.error('call_serpapi invoked but SERPAPI_KEY is not configured')
         return {}
     params['api_key'] = SERPAPI_KEY
+    start = time.perf_counter()
+    status = 'ok'
+    UPSTREAM_IN_FLIGHT.inc()
     try:
-        resp = requests.get(SERPAPI_URL, params=params, timeout=15)
-        resp.raise_for_status()
-        return resp.json()
-    except Exception:
+        return await serpapi_guard.call(lambda: _serpapi_get(params))
+    except quota.Rejected as exc:
+        # raised, not returned as `{}`: a refusal says nothing about the query, so it must
+        # not be negatively cached, and batches report it instead of serving fallbacks
+        status = 'rejected'
+        logger.warning('SerpApi call for %r/%s skipped: %s', query, gl, exc.reason)
+        raise
+    except asyncio.CancelledError:
+        status = 'cancelled'
+        raise
+    except Exception as exc:
+        httpx = sys.modules.get('httpx')
+        status = 'timeout' if httpx is not None and isinstance(exc, httpx.TimeoutException) else 'error'
         logger.exception('SerpApi request failed')
         return {}
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+        UPSTREAM_DURATION.labels(status).observe(time.perf_counter() - start)
+
+
+# Optional persistent L2 tier shared by all workers on this host (stale-while-revalidate).
+DISK_CACHE_ENABLED = os.getenv('DISK_CACHE_ENABLED', '0').lower() in ('1', 'true', 'yes')
+DISK_CACHE_PATH = os.getenv('DISK_CACHE_PATH', os.path.join('.cache', 'serpapi.sqlite3'))
+serpapi_l2 = None
+if DISK_CACHE_ENABLED:
+    try:
+        from .utils.disk_cache import SQLiteCache
+        serpapi_l2 = SQLiteCache(DISK_CACHE_PATH, stale_ttl=float(os.getenv('DISK_CACHE_STALE_TTL', '600')))
+    except Exception:
+        logger.exception('Could not open disk cache at %s; continuing with in-memory cache only', DISK_CACHE_PATH)
+
+# Cached wrapper to reduce SerpApi calls. Bounded LRU; failed calls (`{}`) are only
+# negatively cached for a short time, calls the quota guard refused are not cached at
+# all; concurrent misses for one query share one call.
+# Keyed on the canonical (query, gl, hl), so "Barbour Bedale" and "barbour  bedale " share an entry.
+call_serpapi_cached = cache.ttl_cache(
+    ttl=int(os.getenv('CACHE_TTL', '120')),
+    key=query_key,
+    max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '1024')),
+    max_bytes=int(os.getenv('CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    negative_ttl=int(os.getenv('CACHE_NEGATIVE_TTL', '10')),
+    l2=serpapi_l2,
+)(call_serpapi)
+serpapi_cache = call_serpapi_cached.cache
+# how often canonical keys hit where raw query strings would not have
+query_stats = QueryStats(ttl=serpapi_cache.ttl)
+
+
+async def search_serpapi(query: str, gl: str):
+    """Cached SerpApi call used by the search paths (counted in `query_stats`)."""
+    query_stats.observe(query, gl)
+    return await call_serpapi_cached(query, gl=gl)
+
+# Normalized (unpriced) rows of recent searches, keyed by result_set_id, for re-pricing.
+result_sets = cache.LRUTTLCache(
+    ttl=int(os.getenv('RESULT_SET_TTL', '1800')),
+    max_entries=int(os.getenv('RESULT_SET_MAX_ENTRIES', '512')),
+)
+
+# Encoded search bodies by ETag, and their compressed forms by coded ETag (see
+# `encoding.coded_etag`); repeated searches and reprices skip assembly, encoding and compression.
+encoded_bodies = cache.LRUTTLCache(
+    ttl=int(os.getenv('RESULT_SET_TTL', '1800')),
+    max_entries=256,
+    max_bytes=int(os.getenv('ENCODED_BODY_CACHE_BYTES', str(16 * 1024 * 1024))),
+    sizeof=len,
+)
+# Priced, deduplicated and grouped result sets by (result set, pricing), so paging through
+# a set prices and clusters it once.
+result_frames = cache.LRUTTLCache(
+    ttl=int(os.getenv('RESULT_SET_TTL', '1800')),
+    max_entries=64,
+    max_bytes=None,
+)
+# bumped when the response shape changes so old ETags stop matching
+ETAG_VERSION = 4
+# responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+
+# Price history of every listing we have seen, written in batches off the request path.
+HISTORY_ENABLED = os.getenv('HISTORY_ENABLED', '1').lower() in ('1', 'true', 'yes')
+HISTORY_PATH = os.getenv('HISTORY_PATH', os.path.join('.cache', 'history.sqlite3'))
+price_history = None
+history_writer = None
+if HISTORY_ENABLED:
+    try:
+        price_history = PriceHistory(
+            HISTORY_PATH,
+            resolution=int(os.getenv('HISTORY_RESOLUTION_SECONDS', '300')),
+            retention_days=int(os.getenv('HISTORY_RETENTION_DAYS', '365')),
+        )
+        history_writer = BatchWriter(price_history, flush_interval=float(os.getenv('HISTORY_FLUSH_SECONDS', '2')))
+    except Exception:
+        logger.exception('Could not open price history at %s; history is disabled', HISTORY_PATH)
+
+# Local catalog of recent real listings with a full-text index; the fallback provider when
+# SerpApi is down, over budget or empty.
+CATALOG_ENABLED = os.getenv('CATALOG_ENABLED', '1').lower() in ('1', 'true', 'yes')
+CATALOG_PATH = os.getenv('CATALOG_PATH', os.path.join('.cache', 'catalog.sqlite3'))
+catalog = None
+catalog_writer = None
+if CATALOG_ENABLED:
+    try:
+        catalog = Catalog(CATALOG_PATH, max_age_days=float(os.getenv('CATALOG_MAX_AGE_DAYS', '30')))
+        catalog_writer = BatchWriter(catalog, flush_interval=float(os.getenv('HISTORY_FLUSH_SECONDS', '2')))
+    except Exception:
+        logger.exception('Could not open catalog at %s; catalog fallback is disabled', CATALOG_PATH)
+
+# Keeps the most popular (query, region) pairs warm by refreshing them just before expiry.
+PREWARM_ENABLED = os.getenv('PREWARM_ENABLED', '1').lower() in ('1', 'true', 'yes')
+prewarmer = Prewarmer(
+    call_serpapi_cached,
+    top_k=int(os.getenv('PREWARM_TOP_K', '10')),
+    budget_per_minute=int(os.getenv('PREWARM_BUDGET_PER_MINUTE', '10')),
+    lead=float(os.getenv('PREWARM_LEAD_SECONDS', '15')),
+    canonical=canonical_query,
+)
+
+# Saved searches re-priced in the background; alerts go to WATCH_ALERT_WEBHOOK (or the log)
+# when an entry's best landed price changes.
+WATCHLIST_ENABLED = os.getenv('WATCHLIST_ENABLED', '1').lower() in ('1', 'true', 'yes')
+WATCHLIST_PATH = os.getenv('WATCHLIST_PATH', os.path.join('.cache', 'watchlist.sqlite3'))
+WATCH_MIN_INTERVAL = float(os.getenv('WATCH_MIN_INTERVAL_SECONDS', '900'))
+watchlist = None
+watch_scheduler = None
+if WATCHLIST_ENABLED:
+    try:
+        watchlist = Watchlist(WATCHLIST_PATH)
+        webhook = os.getenv('WATCH_ALERT_WEBHOOK')
+        watch_scheduler = WatchScheduler(
+            watchlist,
+            # late-bound: defined below with the other search helpers
+            lambda query, regions, pricing: watch_best(query, regions, pricing),
+            sink=WebhookSink(webhook, get_http_client) if webhook else LogSink(),
+            budget_per_minute=int(os.getenv('WATCH_BUDGET_PER_MINUTE', '20')),
+            min_interval=WATCH_MIN_INTERVAL,
+            max_interval=float(os.getenv('WATCH_MAX_INTERVAL_SECONDS', str(6 * 3600))),
+            hot_fn=prewarmer.is_hot,
+        )
+    except Exception:
+        logger.exception('Could not open watchlist at %s; watchlist is disabled', WATCHLIST_PATH)
+
+# Image proxy (/img): product images are downloaded once, resized (WebP or JPEG; needs
+# Pillow) and kept in a size-capped disk cache; `Item.image_url` points at it. Only URLs
+# signed by `proxied_image` are fetched; the key is IMAGE_PROXY_SECRET, else a random
+# one kept next to the cache so all workers and restarts share it.
+IMAGE_PROXY_ENABLED = os.getenv('IMAGE_PROXY_ENABLED', '1').lower() in ('1', 'true', 'yes')
+IMAGE_CACHE_PATH = os.getenv('IMAGE_CACHE_PATH', os.path.join('.cache', 'images'))
+# width of the thumbnails `image_url` asks for (rounded up to 200, 400 or 800)
+IMAGE_WIDTH = int(os.getenv('IMAGE_WIDTH', '400'))
+image_proxy = None
+if IMAGE_PROXY_ENABLED:
+    try:
+        image_cache = DiskLRU(IMAGE_CACHE_PATH, max_bytes=int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(256 * 1024 * 1024))))
+        image_proxy = ImageProxy(
+            image_cache,
+            get_image_client,
+            os.getenv('IMAGE_PROXY_SECRET', '').encode('utf-8') or load_secret(IMAGE_CACHE_PATH.rstrip('/\\') + '.key'),
+            concurrency=int(os.getenv('IMAGE_FETCH_CONCURRENCY', '8')),
+        )
+    except Exception:
+        logger.exception('Could not open image cache at %s; images are hotlinked', IMAGE_CACHE_PATH)
+
+
+# Search providers (see scrapers/registry.py). SEARCH_PROVIDERS picks which ones run;
+# `catalog` only runs when the live providers found nothing, `dummy` only when the catalog
+# found nothing either.
+registry.register(SerpApiScraper(
+    # late-bound so the cached wrapper can be swapped at runtime (and in tests)
+    lambda query, gl: search_serpapi(query, gl),
+    default_regions=DEFAULT_REGIONS,
+)).timeout = SEARCH_DEADLINE
+registry.register(EndScraper())
+if catalog is not None:
+    registry.register(CatalogScraper(catalog))
+registry.register(DummyScraper())
+SEARCH_PROVIDERS = [n.strip() for n in os.getenv('SEARCH_PROVIDERS', 'serpapi,catalog,dummy').split(',') if n.strip()]
+orchestrator = registry.Orchestrator()
+# /api/search/batch: most queries per request, and upstream calls in flight per batch
+BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', '500'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '16'))
+
+
+# Cold-start budget: module import plus lifespan startup, in ms. Both are measured on every
+# start (see /health `startup` and the hypeprice_startup_seconds gauge); a start over
+# budget is logged. Modules only the first requests need (numpy, HTTP client, Pillow) are
+# imported in a thread right after startup instead of before it.
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '1500'))
+STARTUP_DURATION = metrics.Gauge('hypeprice_startup_seconds', 'Time spent starting the app.', ['phase'])
+WARM_IMPORTS = ('numpy', 'httpx', 'PIL.Image', 'PIL.ImageOps')
+startup: Dict[str, Any] = {'import_ms': None, 'lifespan_ms': None, 'warm_imports_ms': None}
 
 
-# Cached wrapper to reduce SerpApi calls
-call_serpapi_cached = cache.ttl_cache(ttl=120)(call_serpapi)
+def warm_imports():
+    start = time.perf_counter()
+    for name in WARM_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    startup['warm_imports_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    serpapi_cache.start_sweeper(interval=30)
+    if PREWARM_ENABLED and SERPAPI_KEY:
+        prewarmer.start()
+    if watch_scheduler is not None and SERPAPI_KEY:
+        watch_scheduler.start()
+    writers = [w for w in (history_writer, catalog_writer) if w is not None]
+    for w in writers:
+        w.start()
+    warmup = asyncio.get_running_loop().run_in_executor(None, warm_imports)
+    lifespan_s = time.perf_counter() - started
+    startup['lifespan_ms'] = round(lifespan_s * 1000, 1)
+    STARTUP_DURATION.labels('lifespan').set(lifespan_s)
+    total = (startup['import_ms'] or 0) + startup['lifespan_ms']
+    if total > STARTUP_BUDGET_MS:
+        logger.warning('Startup took %.0f ms (import %.0f ms), over the %.0f ms budget',
+                       total, startup['import_ms'] or 0, STARTUP_BUDGET_MS)
+    yield
+    await warmup
+    await prewarmer.stop()
+    if watch_scheduler is not None:
+        await watch_scheduler.stop()
+    for w in writers:
+        await w.stop()
+    if browser_pool.started:
+        await browser_pool.stop()
+    await serpapi_cache.stop_sweeper()
+    await close_http_client()
 
-app = FastAPI(title="HypePrice Tracker API")
 
+app = FastAPI(title="HypePrice Tracker API", lifespan=lifespan)
+
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -61,13 +400,423 @@ app.add_middleware(
 )
 
 
+def pricing_kwargs(pricing: Optional[PricingParams]) -> dict:
+    """Translate request-level pricing options into `calc.landed_cost_batch` keyword args."""
+    if pricing is None:
+        return {}
+    kw = dict(tax_rate=pricing.tax_rate, tax_threshold=pricing.tax_threshold, apply_tax=pricing.apply_tax)
+    if pricing.shipping_twd is not None:
+        kw['shipping_twd'] = pricing.shipping_twd
+    elif pricing.origin or pricing.weight_lbs is not None:
+        kw['origin_rates'] = ORIGIN_RATES
+        kw['default_weight_lbs'] = pricing.weight_lbs if pricing.weight_lbs is not None else 1.0
+    return kw
+
+
+def price_columns(rows: List[Row], pricing: Optional[PricingParams] = None) -> Dict[str, List[int]]:
+    """Landed cost of every row as columns (price_twd, shipping_twd, tax_twd,
+    final_price_twd), index-aligned with `rows`; the rows themselves are not touched.
+
+    Every search path prices through this one batch call (see `calc.landed_cost_batch`).
+    """
+    if not rows:
+        return {'price_twd': [], 'shipping_twd': [], 'tax_twd': [], 'final_price_twd': []}
+    if pricing is not None and pricing.origin:
+        origins = [pricing.origin] * len(rows)
+    else:
+        origins = [origin_for_region(r.region) for r in rows]
+    priced = landed_cost_batch(
+        [r.original_price for r in rows],
+        [r.currency for r in rows],
+        origins=origins,
+        **pricing_kwargs(pricing),
+    )
+    return {k: v.tolist() for k, v in priced.items()}
+
+
+def proxied_image(url: Optional[str]) -> Optional[str]:
+    """Signed `/img` URL of a remote image (see `image`); the URL itself when the proxy is off."""
+    if image_proxy is None or not url or not url.startswith(('http://', 'https://')):
+        return url
+    return f"/img?u={quote(url, safe='')}&w={IMAGE_WIDTH}&s={image_proxy.sign(url)}"
+
+
+def row_item(row: Row, cols: Dict[str, List[int]], i: int, is_lowest: bool = False,
+             group_id: Optional[int] = None, group_size: int = 1) -> dict:
+    """Wire dict of `rows[i]` priced by `cols`."""
+    return row.to_item(cols['price_twd'][i], cols['shipping_twd'][i], cols['tax_twd'][i],
+                       cols['final_price_twd'][i], is_lowest, group_id, group_size, proxied_image(row.image))
+
+
+def dedupe(rows: List[Row], final: List[int]) -> List[int]:
+    """Indexes of the rows to keep: per unique key (link when available) the cheapest landed price."""
+    best: Dict[Any, int] = {}
+    for i, row in enumerate(rows):
+        key = row.key or i
+        j = best.get(key)
+        if j is None or final[i] < final[j]:
+            best[key] = i
+    return list(best.values())
+
+
+def group_products(rows: List[Row], keep: List[int], final: List[int]) -> List[List[int]]:
+    """Cluster the kept rows into products (see `matching.cluster_titles`).
+
+    Groups are ordered cheapest first and list their rows cheapest first.
+    """
+    labels = cluster_titles([rows[i].title for i in keep], [rows[i].retailer for i in keep])
+    groups: Dict[int, List[int]] = {}
+    for i, label in zip(keep, labels):
+        groups.setdefault(label, []).append(i)
+    ordered = [sorted(members, key=final.__getitem__) for members in groups.values()]
+    ordered.sort(key=lambda members: final[members[0]])
+    return ordered
+
+
+def group_summary(rows: List[Row], members: List[int], group_id: int, final: List[int]) -> dict:
+    cheapest = rows[members[0]]
+    return {
+        'group_id': group_id,
+        'title': cheapest.title,
+        'size': len(members),
+        'lowest_final_price_twd': final[members[0]],
+        'retailers': sorted({rows[i].retailer for i in members}),
+        'regions': sorted({rows[i].region for i in members if rows[i].region}),
+    }
+
+
+def assemble_items(rows: List[Row], pricing: Optional[PricingParams] = None) -> Tuple[List[dict], List[dict]]:
+    """Price rows, dedupe them, group them per product and mark each group's lowest.
+
+    Works on index columns; only the surviving rows are converted. Returns JSON-ready
+    `Item` dicts (grouped, cheapest group first) and the `ProductGroup` summaries.
+    """
+    cols = price_columns(rows, pricing)
+    final = cols['final_price_twd']
+    items, groups = [], []
+    for gid, members in enumerate(group_products(rows, dedupe(rows, final), final)):
+        for i in members:
+            items.append(row_item(rows[i], cols, i, i == members[0], gid, len(members)))
+        groups.append(group_summary(rows, members, gid, final))
+    return items, groups
+
+
+def result_frame(rows: List[Row], result_set_id: str, pricing: Optional[PricingParams] = None) -> Dict[str, Any]:
+    """Price columns, product groups (as in `assemble_items`) and facets of a result set.
+
+    `rank` maps every kept (deduplicated) row index to its group id; `facets` counts the
+    kept rows per retailer, region and currency. Cached per result set and pricing.
+    """
+    key = encoding.make_etag(result_set_id, pricing.model_dump() if pricing else None)
+    frame = result_frames.get(key)
+    if frame is None:
+        cols = price_columns(rows, pricing)
+        final = cols['final_price_twd']
+        groups = group_products(rows, dedupe(rows, final), final)
+        rank = {i: gid for gid, members in enumerate(groups) for i in members}
+        facets: Dict[str, Dict[str, int]] = {'retailer': {}, 'region': {}, 'currency': {}}
+        for i in rank:
+            row = rows[i]
+            for name, value in (('retailer', row.retailer), ('region', row.region), ('currency', row.currency)):
+                if value:
+                    facets[name][value] = facets[name].get(value, 0) + 1
+        frame = {'cols': cols, 'groups': groups, 'rank': rank, 'facets': facets}
+        result_frames.set(key, frame)
+    return frame
+
+
+def view_sort_key(sort: str, rows: List[Row], final: List[int], rank: Dict[int, int]):
+    """Sort key of kept row `i` under `sort`; unique, as keyset paging needs (ends with `i`)."""
+    if sort == 'price_asc':
+        return lambda i: (final[i], i)
+    if sort == 'price_desc':
+        return lambda i: (-final[i], i)
+    if sort == 'discount':
+        return lambda i: (-(rows[i].discount_pct or 0), final[i], i)
+    # recommended: the unpaged order, cheapest group first and cheapest listing first within it
+    return lambda i: (rank[i], final[i], i)
+
+
+def view_page(rows: List[Row], result_set_id: str, pricing: Optional[PricingParams],
+              view: ResultView) -> Dict[str, Any]:
+    """One page of a result set under `view`: items, their groups, total and next cursor.
+
+    Filters run over the cached frame's index columns and only the page's rows are
+    converted to items; the page is a bounded-heap top-K after the cursor's key.
+    """
+    try:
+        after = paging.decode_cursor(view.cursor, view.sort) if view.cursor else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    frame = result_frame(rows, result_set_id, pricing)
+    cols, groups, rank = frame['cols'], frame['groups'], frame['rank']
+    final = cols['final_price_twd']
+    retailers = {r.lower() for r in view.retailer} if view.retailer else None
+    regions = {r.lower() for r in view.region} if view.region else None
+    currencies = {c.upper() for c in view.currency} if view.currency else None
+    lo, hi = view.min_price_twd, view.max_price_twd
+    matching = []
+    for i in rank:
+        row = rows[i]
+        if retailers is not None and (row.retailer or '').lower() not in retailers:
+            continue
+        if regions is not None and (row.region or '').lower() not in regions:
+            continue
+        if currencies is not None and (row.currency or '').upper() not in currencies:
+            continue
+        if (lo is not None and final[i] < lo) or (hi is not None and final[i] > hi):
+            continue
+        matching.append(i)
+
+    page, last = paging.top_k(matching, view_sort_key(view.sort, rows, final, rank), view.limit, after)
+    items, summaries = [], {}
+    for i in page:
+        gid = rank[i]
+        members = groups[gid]
+        items.append(row_item(rows[i], cols, i, i == members[0], gid, len(members)))
+        if gid not in summaries:
+            summaries[gid] = group_summary(rows, members, gid, final)
+    return {
+        'results': items,
+        'groups': list(summaries.values()),
+        'total': len(matching),
+        'next_cursor': paging.encode_cursor(view.sort, last) if last is not None else None,
+        'facets': frame['facets'],
+    }
+
+
+def result_set_key(query: str, rows: List[Row]) -> str:
+    """Content hash of a result set: the same upstream data gives the same id (and ETag)."""
+    h = hashlib.blake2b(query.encode('utf-8'), digest_size=12)
+    for r in rows:
+        h.update(repr(tuple(getattr(r, f) for f in Row.__slots__)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def store_result_set(query: str, rows: List[Row]) -> str:
+    # keep the normalized rows so the set can be re-priced later without searching again
+    result_set_id = result_set_key(query, rows)
+    result_sets.set(result_set_id, {'query': query, 'rows': rows})
+    record_listings(rows)
+    return result_set_id
+
+
+def record_listings(rows: List[Row]):
+    """Queue live listings (known url and market; not catalog replays) for the price history
+    and the catalog; both are written in batches by background tasks."""
+    live = [r for r in rows if r.url and r.region and r.original_price > 0 and r.seen_at is None]
+    if not live:
+        return
+    if history_writer is not None:
+        now = time.time()
+        history_writer.push((now, r.url, r.retailer, r.region, r.original_price, r.currency) for r in live)
+    if catalog_writer is not None:
+        catalog_writer.push(live)
+
+
+def server_timing(timings: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    if not timings:
+        return {}
+    return {'Server-Timing': ', '.join(f'{name};dur={t["ms"]};desc="{t["status"]}"' for name, t in timings.items())}
+
+
+BUILD_DURATION = metrics.Histogram('hypeprice_response_build_duration_seconds',
+                                   'Pricing, grouping and encoding of a search body not already cached.')
+SEARCH_ROWS = metrics.Histogram('hypeprice_search_rows', 'Rows the providers returned for one search.',
+                                buckets=(0, 1, 5, 10, 20, 40, 80, 160, 320))
+SEARCH_MOCK = metrics.Counter('hypeprice_search_mock_fallbacks_total', 'Searches answered with generated listings.')
+
+
+def search_etag(result_set_id: str, pricing: Optional[PricingParams] = None, providers=None,
+                view: Optional[ResultView] = None) -> str:
+    parts = [ETAG_VERSION, result_set_id, pricing.model_dump() if pricing else None, providers]
+    if view is not None:
+        parts.append(view.model_dump())
+    return encoding.make_etag(*parts)
+
+
+def search_body(query: str, rows: List[Row], result_set_id: str, pricing: Optional[PricingParams] = None,
+                providers=None, view: Optional[ResultView] = None) -> Tuple[str, bytes]:
+    """(ETag, encoded search body); the body is kept per ETag, so repeats skip assembly and
+    serialization. With a `view`, the body holds only that page (see `view_page`)."""
+    etag = search_etag(result_set_id, pricing, providers, view)
+    body = encoded_bodies.get(etag)
+    if body is None:
+        start = time.perf_counter()
+        # items are built from already-normalized rows; skip re-validating them against SearchResponse
+        if view is None:
+            items, groups = assemble_items(rows, pricing)
+            content = {'results': items, 'groups': groups}
+        else:
+            content = view_page(rows, result_set_id, pricing, view)
+        body = encoding.dumps({
+            'query': query,
+            **content,
+            'result_set_id': result_set_id,
+            'providers': providers,
+        })
+        encoded_bodies.set(etag, body)
+        BUILD_DURATION.observe(time.perf_counter() - start)
+    return etag, body
+
+
+def search_response(request: Request, query: str, rows: List[Row], result_set_id: str,
+                    pricing: Optional[PricingParams] = None, providers=None,
+                    headers: Optional[Dict[str, str]] = None, view: Optional[ResultView] = None) -> Response:
+    """Encoded (and possibly compressed) search body with a strong ETag.
+
+    The ETag is derived from the result set, pricing and view before anything is assembled,
+    so a conditional GET for an unchanged result set is answered with 304 right away.
+    """
+    etag = search_etag(result_set_id, pricing, providers, view)
+    matched = encoding.revalidated(request, etag) if request.method == 'GET' else None
+    if matched:
+        return encoding.not_modified(matched, headers)
+    etag, body = search_body(query, rows, result_set_id, pricing, providers, view)
+    return encoding.json_response(request, body, etag, COMPRESS_MIN_BYTES, headers, cache=encoded_bodies)
+
+
+PLACEHOLDER_IMAGE = "https://placehold.co/400x400?text=Product+Image"
+
+
+def resolve_regions(req: SearchRequest) -> List[str]:
+    # Query multiple regions (foreign-first) to surface international listings/discounts.
+    requested_regions = req.regions if getattr(req, 'regions', None) else None
+    return requested_regions if requested_regions else DEFAULT_REGIONS
+
+
+def mock_rows(query: str) -> List[Row]:
+    """Generated listings used when no provider returned anything."""
+    q = (query or '').lower()
+    default_image = PLACEHOLDER_IMAGE
+    mock = []
+    brand_models = {
+        'barbour': [
+            ('Barbour Bedale', 329.0, 'GBP'),
+            ('Barbour Ashby', 289.0, 'GBP'),
+            ('Barbour Beaufort', 349.0, 'GBP'),
+        ],
+    }
+    entries = []
+    for k, models in brand_models.items():
+        if k in q:
+            entries = models
+            break
+    if not entries:
+        entries = [
+            (f"{query} Classic", 120.0, 'USD'),
+            (f"{query} Premium", 199.0, 'USD'),
+            (f"{query} Limited", 249.0, 'USD'),
+        ]
+    i = 0
+    while len(mock) < 6 and i < len(entries) * 3:
+        base = entries[i % len(entries)]
+        name = base[0]
+        price = round(base[1] * (1 + (i % 3) * 0.05), 2)
+        currency = base[2]
+        mock.append(Row(
+            key=None,
+            title=name,
+            retailer=f"Mock Retailer {i+1}",
+            image=default_image,
+            original_price=price,
+            original_price_string=f"{price} {currency}",
+            currency=currency,
+            url=f"https://example.com/{name.replace(' ', '-').lower()}",
+            sizes=['S','M','L'],
+            weight=f"{1.0 + (i%3)*0.2}kg",
+        ))
+        i += 1
+    return mock
+
+
 @app.get("/health")
 async def health():
-    return {"status": "ok", "serpapi_configured": bool(SERPAPI_KEY)}
+    return {
+        "status": "ok",
+        "serpapi_configured": bool(SERPAPI_KEY),
+        "cache": {
+            "memory": serpapi_cache.stats(),
+            "query": query_stats.stats(),
+            "disk": serpapi_l2.stats() if serpapi_l2 is not None else None,
+        },
+        "prewarm": prewarmer.stats() if PREWARM_ENABLED else None,
+        "upstream": {"serpapi": serpapi_guard.stats()},
+        "history": history_writer.stats() if history_writer is not None else None,
+        "catalog": catalog_writer.stats() if catalog_writer is not None else None,
+        "watchlist": watch_scheduler.stats() if watch_scheduler is not None else None,
+        "images": image_proxy.stats() if image_proxy is not None else None,
+        "startup": {**startup, "budget_ms": STARTUP_BUDGET_MS},
+    }
 
 
-@app.post("/api/search", response_model=SearchResponse)
-async def search(req: SearchRequest):
+CACHE_HITS = metrics.Counter('hypeprice_cache_hits_total', 'Cache lookups that found a value.', ['cache'])
+CACHE_MISSES = metrics.Counter('hypeprice_cache_misses_total', 'Cache lookups that found nothing.', ['cache'])
+CACHE_EVICTIONS = metrics.Counter('hypeprice_cache_evictions_total',
+                                  'Entries evicted to stay within the size limits.', ['cache'])
+CACHE_EXPIRATIONS = metrics.Counter('hypeprice_cache_expirations_total', 'Entries dropped after their TTL.', ['cache'])
+CACHE_ENTRIES = metrics.Gauge('hypeprice_cache_entries', 'Entries held.', ['cache'])
+CACHE_BYTES = metrics.Gauge('hypeprice_cache_bytes', 'Approximate bytes held.', ['cache'])
+QUERY_LOOKUPS = metrics.Counter('hypeprice_query_lookups_total', 'SerpApi lookups made by searches.')
+QUERY_HITS = metrics.Counter('hypeprice_query_hits_total',
+                             'Lookups whose key was seen within the cache TTL, by raw or canonical query.', ['keying'])
+UPSTREAM_BREAKER_OPEN = metrics.Gauge('hypeprice_serpapi_breaker_open', '1 while the SerpApi circuit breaker is open.')
+UPSTREAM_REJECTED = metrics.Counter('hypeprice_serpapi_rejected_total',
+                                    'SerpApi calls refused by the quota guard.', ['reason'])
+UPSTREAM_RETRIES = metrics.Counter('hypeprice_serpapi_retries_total', 'SerpApi calls retried.')
+UPSTREAM_BUDGET_USED = metrics.Gauge('hypeprice_serpapi_budget_used', 'SerpApi calls counted against the budget.',
+                                     ['period'])
+WRITER_QUEUED = metrics.Gauge('hypeprice_writer_queued', 'Records waiting to be written.', ['store'])
+WRITER_DROPPED = metrics.Counter('hypeprice_writer_dropped_total', 'Records dropped from a full queue.', ['store'])
+
+
+def collect_metrics():
+    """Copy counters kept by the caches, the quota guard and the writers into the registry;
+    runs on each scrape so the hot paths only keep their own plain counters."""
+    caches = [('serpapi', serpapi_cache), ('result_sets', result_sets), ('result_frames', result_frames),
+              ('encoded_bodies', encoded_bodies)]
+    if image_proxy is not None:
+        caches.append(('images', image_proxy.cache))
+    for name, c in caches:
+        st = c.stats()
+        CACHE_HITS.labels(name).set(st['hits'])
+        CACHE_MISSES.labels(name).set(st['misses'])
+        CACHE_EVICTIONS.labels(name).set(st['evictions'])
+        CACHE_EXPIRATIONS.labels(name).set(st['expirations'])
+        CACHE_ENTRIES.labels(name).set(st['size'])
+        CACHE_BYTES.labels(name).set(st['bytes'])
+    if serpapi_l2 is not None:
+        st = serpapi_l2.stats()
+        CACHE_HITS.labels('serpapi_disk').set(st['hits'] + st['stale_hits'])
+        CACHE_MISSES.labels('serpapi_disk').set(st['misses'])
+    st = query_stats.stats()
+    QUERY_LOOKUPS.set(st['lookups'])
+    QUERY_HITS.labels('raw').set(st['raw_hits'])
+    QUERY_HITS.labels('normalized').set(st['normalized_hits'])
+    st = serpapi_guard.stats()
+    UPSTREAM_BREAKER_OPEN.set(1 if st['breaker']['state'] == 'open' else 0)
+    for reason, n in st['rejected'].items():
+        UPSTREAM_REJECTED.labels(reason).set(n)
+    UPSTREAM_RETRIES.set(st['retries'])
+    UPSTREAM_BUDGET_USED.labels('day').set(st['budget']['used_today'])
+    UPSTREAM_BUDGET_USED.labels('month').set(st['budget']['used_month'])
+    for name, w in (('history', history_writer), ('catalog', catalog_writer)):
+        if w is not None:
+            st = w.stats()
+            WRITER_QUEUED.labels(name).set(st['queued'])
+            WRITER_DROPPED.labels(name).set(st['dropped'])
+
+
+metrics.REGISTRY.add_collector(collect_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.REGISTRY.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+async def run_search(req: SearchRequest, request: Request) -> Response:
     if not req.q:
         raise HTTPException(status_code=400, detail="Query parameter `q` is required")
 
@@ -80,201 +829,456 @@ async def search(req: SearchRequest):
     if not SERPAPI_KEY:
         logger.warning('SERPAPI_KEY is not configured; using fallback/mock data for search results')
 
-    # Query multiple regions (foreign-first) to surface international listings/discounts.
-    requested_regions = req.regions if getattr(req, 'regions', None) else None
-    # default foreign markets (exclude TW by default so we surface non-local prices)
-    default_regions = ['us', 'gb', 'jp']
-    regions = requested_regions if requested_regions else default_regions
-
-    items = []
-    placeholder = "https://placehold.co/400x400?text=Product+Image"
-
-    # collect by unique key (prefer link when available)
-    seen = {}
-    for region in regions:
-        data = call_serpapi_cached(req.q, gl=region)
-        shopping = data.get('shopping_results') or []
-        for s in shopping:
-            try:
-                title = s.get('title') or s.get('product_title') or s.get('name') or ''
-                price_text = s.get('price') or s.get('extracted_price') or s.get('price_string') or ''
-                thumbnail = s.get('thumbnail') or s.get('thumbnail_image') or s.get('image') or ''
-                source_raw = s.get('source') or s.get('merchant') or s.get('store') or s.get('displayed_at') or 'Retailer'
-                source = retailer.normalize_retailer(source_raw)
-                link = s.get('link') or s.get('product_link') or ''
-
-                # preserve original string
-                original_price_string = str(price_text) if price_text is not None else ''
-
-                parsed_amount, parsed_currency, assumed_usd, price_twd = parser.parse_currency(original_price_string, s)
-                if assumed_usd and original_price_string:
-                    original_price_string = f"{original_price_string} (Assumed USD)"
-
-                shipping = 800
-                tax = int(round((price_twd + shipping) * 0.17))
-                final_price = int(round(price_twd + shipping + tax))
-
-                discount_text, discount_pct, strike_twd = parser.detect_discount(s, price_twd)
-
-                key = link or f"{title}||{source}||{region}"
-                # dedupe: if we already have this link, keep the cheaper one
-                existing = seen.get(key)
-                candidate = dict(
-                    retailer=source,
-                    image=thumbnail or None,
-                    image_url=thumbnail or None,
-                    original_price=parsed_amount,
-                    original_price_string=original_price_string,
-                    currency=parsed_currency,
-                    discount_text=discount_text,
-                    discount_pct=discount_pct,
-                    price_twd=price_twd,
-                    shipping_twd=shipping,
-                    tax_twd=tax,
-                    final_price_twd=final_price,
-                    landed_cost_estimate=final_price,
-                    url=link or None,
-                    sizes=[],
-                    weight='N/A',
-                    region=region,
-                )
-                if existing:
-                    # keep the one with lower final_price_twd
-                    if candidate['final_price_twd'] < existing['final_price_twd']:
-                        seen[key] = candidate
-                else:
-                    seen[key] = candidate
-            except Exception:
+    regions = resolve_regions(req)
+    prewarmer.observe(req.q, regions)
+    # collect normalized rows from every provider, then price the whole set in one batch and dedupe
+    rows, timings = await orchestrator.run(req.q, regions, registry.enabled_providers(SEARCH_PROVIDERS))
+    SEARCH_ROWS.observe(len(rows))
+
+    # Fallback to generated mock data if nothing
+    if not rows:
+        SEARCH_MOCK.inc()
+        rows = mock_rows(req.q)
+
+    result_set_id = store_result_set(req.q, rows)
+    # timings go in a Server-Timing header so the body (and its ETag) only changes with the data
+    providers = {name: {'status': t['status'], 'rows': t['rows']} for name, t in timings.items()}
+    return search_response(request, req.q, rows, result_set_id, req.pricing, providers, server_timing(timings),
+                           req.view)
+
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    values = [v.strip() for v in value.split(',') if v.strip()] if value else []
+    return values or None
+
+
+def view_params(sort: Optional[Literal['recommended', 'price_asc', 'price_desc', 'discount']] = None,
+                retailer: Optional[str] = None, region: Optional[str] = None, currency: Optional[str] = None,
+                min_price_twd: Optional[int] = Query(None, ge=0), max_price_twd: Optional[int] = Query(None, ge=0),
+                limit: Optional[int] = Query(None, ge=1, le=200),
+                cursor: Optional[str] = None) -> Optional[ResultView]:
+    """`ResultView` from query parameters (filters comma-separated); None when none is given,
+    which keeps the unpaged response."""
+    given = {
+        'sort': sort, 'retailer': _split(retailer), 'region': _split(region), 'currency': _split(currency),
+        'min_price_twd': min_price_twd, 'max_price_twd': max_price_twd, 'limit': limit, 'cursor': cursor,
+    }
+    given = {k: v for k, v in given.items() if v is not None}
+    return ResultView(**given) if given else None
+
+
+@app.post("/api/search", response_model=SearchResponse)
+async def search(req: SearchRequest, request: Request):
+    """Search every provider. With `view`, only one sorted and filtered page of the result
+    set is returned; further pages come from /api/search/{result_set_id}/page."""
+    return await run_search(req, request)
+
+
+@app.get("/api/search", response_model=SearchResponse)
+async def search_get(request: Request, q: str, regions: Optional[str] = None,
+                     pricing: PricingParams = Depends(), view: Optional[ResultView] = Depends(view_params)):
+    """GET form of /api/search (`regions` comma-separated) for HTTP caching: send the
+    returned ETag back in `If-None-Match` to get `304 Not Modified` while the result
+    set is unchanged. `sort`, `retailer`, `region`, `currency`, `min_price_twd`,
+    `max_price_twd`, `limit` and `cursor` select one page (see `ResultView`)."""
+    region_list = [r.strip() for r in regions.split(',') if r.strip()] if regions else None
+    return await run_search(SearchRequest(q=q, regions=region_list, pricing=pricing, view=view), request)
+
+
+def _serpapi_cached(query: str, gl: str) -> bool:
+    key = getattr(call_serpapi_cached, 'key', None)
+    return key is not None and (serpapi_cache.ttl_remaining(key(query, gl=gl)) or 0) > 0
+
+
+class BatchPlan:
+    """The unique (query, region) SerpApi calls of a batch, started together.
+
+    Pairs are deduplicated on their canonical query. Pairs already in the memory cache
+    resolve at once; the others share one semaphore of `concurrency` slots (on top of the
+    SerpApi quota guard), so a large watchlist cannot flood upstream and cached queries
+    never wait behind uncached ones. Uncached calls are `quota.patient`: they wait for
+    rate-limit tokens instead of being rejected, pacing the batch to the SerpApi rate.
+    """
+
+    def __init__(self, pairs, concurrency: int):
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self.tasks: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.requested = 0
+        self.cached = 0
+        for query, gl in pairs:
+            self.requested += 1
+            pair = (canonical_query(query), gl)
+            if pair in self.tasks:
                 continue
+            cached = _serpapi_cached(query, gl)
+            self.cached += cached
+            self.tasks[pair] = asyncio.ensure_future(self._fetch(query, gl, cached))
 
-    # include any seen items
-    for v in seen.values():
-        items.append(Item(
-            retailer=v['retailer'],
-            image=v['image'],
-            image_url=v['image_url'],
-            original_price=v['original_price'],
-            original_price_string=v['original_price_string'],
-            currency=v['currency'],
-            discount_text=v.get('discount_text'),
-            discount_pct=v.get('discount_pct'),
-            price_twd=v['price_twd'],
-            shipping_twd=v['shipping_twd'],
-            tax_twd=v['tax_twd'],
-            final_price_twd=v['final_price_twd'],
-            landed_cost_estimate=v['landed_cost_estimate'],
-            url=v['url'],
-            sizes=v.get('sizes') or [],
-            weight=v.get('weight') or 'N/A',
-        ))
-    # Fallback to mock/dummy if nothing
-    if not items:
-        # try dummy scraper
+    async def _fetch(self, query: str, gl: str, cached: bool):
+        if cached:
+            return await search_serpapi(query, gl)
+        # this task's own context: only the calls it starts wait patiently
+        quota.patient.set(True)
+        async with self._sem:
+            return await search_serpapi(query, gl)
+
+    def rejected(self, query: str, regions: List[str]) -> Optional[quota.Rejected]:
+        """The refusal of one of the query's planned calls, if the quota guard refused any."""
+        for r in regions:
+            t = self.task(query, r)
+            if t.done() and not t.cancelled() and isinstance(t.exception(), quota.Rejected):
+                return t.exception()
+        return None
+
+    def task(self, query: str, gl: str) -> asyncio.Future:
+        return self.tasks[(canonical_query(query), gl)]
+
+    async def fetch(self, query: str, gl: str):
+        return await self.task(query, gl)
+
+    def cancel(self):
+        for t in self.tasks.values():
+            t.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        done = [t for t in self.tasks.values() if t.done() and not t.cancelled()]
+        return {
+            'requested': self.requested,
+            'unique': len(self.tasks),
+            'cached': self.cached,
+            'failed': sum(1 for t in done if t.exception() is not None or not t.result()),
+            'rejected': sum(1 for t in done if isinstance(t.exception(), quota.Rejected)),
+        }
+
+
+async def _batch_query(plan: BatchPlan, q: str, regions: List[str], pricing: Optional[PricingParams]) -> bytes:
+    # wait for this query's planned calls, then run the normal provider chain with SerpApi
+    # answered from the plan, so fallbacks, pricing and grouping match /api/search
+    await asyncio.wait([plan.task(q, r) for r in regions])
+    rejected = plan.rejected(q, regions)
+    if rejected is not None:
+        # fallback rows would pass for this query's results; report the refusal instead
+        raise rejected
+    planned = SerpApiScraper(plan.fetch, default_regions=regions)
+    planned.timeout = SEARCH_DEADLINE
+    providers = [planned if p.name == 'serpapi' else p for p in registry.enabled_providers(SEARCH_PROVIDERS)]
+    rows, timings = await orchestrator.run(q, regions, providers)
+    SEARCH_ROWS.observe(len(rows))
+    if not rows:
+        SEARCH_MOCK.inc()
+        rows = mock_rows(q)
+    result_set_id = store_result_set(q, rows)
+    providers_body = {name: {'status': t['status'], 'rows': t['rows']} for name, t in timings.items()}
+    return search_body(q, rows, result_set_id, pricing, providers_body)[1]
+
+
+@app.post("/api/search/batch")
+async def search_batch(req: BatchSearchRequest):
+    """Search many queries at once (watchlists).
+
+    The unique (query, region) upstream calls of the whole batch are planned up front:
+    duplicates share one call, cached pairs are answered from the cache and the rest run
+    under one bounded-concurrency scheduler (`BATCH_CONCURRENCY`). Responds with
+    newline-delimited JSON, one line per query in completion order:
+    - `result`: `index` (position in `queries`) and `search`, the /api/search body
+    - `error`: `index` and `detail` if that query failed, or if the quota guard refused one
+      of its upstream calls (budget spent, breaker open)
+    - `done`: query count, upstream call stats and elapsed ms
+    """
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="`queries` must not be empty")
+    if len(req.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    jobs = []
+    for bq in req.queries:
+        q = bq.q.strip()
+        if not q:
+            raise HTTPException(status_code=400, detail="Every query needs a non-empty `q`")
+        regions = list(dict.fromkeys(r.strip().lower() for r in (bq.regions or []) if r.strip())) or DEFAULT_REGIONS
+        jobs.append((q, regions, bq.pricing or req.pricing))
+        prewarmer.observe(q, regions)
+    logger.info("Batch search triggered for %d queries", len(jobs))
+
+    async def events():
+        start = time.perf_counter()
+        plan = BatchPlan([(q, r) for q, regions, _ in jobs for r in regions], BATCH_CONCURRENCY)
+
+        async def run(i, job):
+            try:
+                return i, await _batch_query(plan, *job), None
+            except quota.Rejected as exc:
+                return i, None, f'SerpApi call refused: {exc.reason}'
+            except Exception as exc:
+                logger.exception('batch query %r failed', job[0])
+                return i, None, repr(exc)
+
+        tasks = [asyncio.ensure_future(run(i, job)) for i, job in enumerate(jobs)]
         try:
-            fallback = await scrape_dummy(req.q)
-        except Exception:
-            fallback = []
-
-        if fallback:
-            for r in fallback:
-                original_price_string = r.get('original_price_string') or str(r.get('original_price', ''))
-                parsed_amount, parsed_currency, assumed_usd, price_twd = parser.parse_currency(original_price_string, r)
-                if assumed_usd and original_price_string:
-                    original_price_string = f"{original_price_string} (Assumed USD)"
-                shipping = 800
-                tax = int(round((price_twd + shipping) * 0.17))
-                final_price = int(round(price_twd + shipping + tax))
-
-                items.append(Item(
-                    retailer=r.get('retailer', 'unknown'),
-                    image=r.get('image'),
-                    image_url=r.get('image'),
-                    original_price=float(r.get('original_price', 0.0)),
-                    original_price_string=original_price_string,
-                    currency=r.get('currency', 'USD'),
-                    discount_text=None,
-                    discount_pct=None,
-                    price_twd=price_twd,
-                    shipping_twd=shipping,
-                    tax_twd=tax,
-                    final_price_twd=final_price,
-                    landed_cost_estimate=final_price,
-                    url=r.get('url'),
-                    sizes=r.get('sizes') or [],
-                    weight=r.get('weight') or 'N/A',
-                ))
-        else:
-            # smart mock
-            async def get_mock_data(query: str):
-                q = (query or '').lower()
-                default_image = placeholder
-                mock = []
-                brand_models = {
-                    'barbour': [
-                        ('Barbour Bedale', 329.0, 'GBP'),
-                        ('Barbour Ashby', 289.0, 'GBP'),
-                        ('Barbour Beaufort', 349.0, 'GBP'),
-                    ],
-                }
-                entries = []
-                for k, models in brand_models.items():
-                    if k in q:
-                        entries = models
-                        break
-                if not entries:
-                    entries = [
-                        (f"{query} Classic", 120.0, 'USD'),
-                        (f"{query} Premium", 199.0, 'USD'),
-                        (f"{query} Limited", 249.0, 'USD'),
-                    ]
-                i = 0
-                while len(mock) < 6 and i < len(entries) * 3:
-                    base = entries[i % len(entries)]
-                    name = base[0]
-                    price = round(base[1] * (1 + (i % 3) * 0.05), 2)
-                    currency = base[2]
-                    # normalize mock price and produce integer TWD
-                    original_price_string = f"{price} {currency}"
-                    parsed_amount, parsed_currency, assumed_usd, price_twd = parser.parse_currency(original_price_string)
-                    if assumed_usd and original_price_string:
-                        original_price_string = f"{original_price_string} (Assumed USD)"
-                    shipping = 800
-                    tax = int(round((price_twd + shipping) * 0.17))
-                    final_price = int(round(price_twd + shipping + tax))
-                    mock.append(Item(
-                        retailer=f"Mock Retailer {i+1}",
-                        image=default_image,
-                        image_url=default_image,
-                        original_price=price,
-                        original_price_string=original_price_string,
-                        currency=currency,
-                        discount_text=None,
-                        discount_pct=None,
-                        price_twd=price_twd,
-                        shipping_twd=shipping,
-                        tax_twd=tax,
-                        final_price_twd=final_price,
-                        landed_cost_estimate=final_price,
-                        url=f"https://example.com/{name.replace(' ', '-').lower()}",
-                        sizes=['S','M','L'],
-                        weight=f"{1.0 + (i%3)*0.2}kg",
-                    ))
-                    i += 1
-                return mock
-
-            items = await get_mock_data(req.q)
-
-    # mark lowest
-    if items:
-        lowest = min(items, key=lambda x: x.final_price_twd)
-        for it in items:
-            it.is_lowest = (it is lowest)
-
-    return SearchResponse(query=req.q, results=items)
+            for fut in asyncio.as_completed(tasks):
+                i, body, error = await fut
+                if body is None:
+                    yield encoding.dumps({'type': 'error', 'index': i, 'query': jobs[i][0], 'detail': error}) + b'\n'
+                else:
+                    # the cached search body is spliced in as-is, not re-encoded
+                    yield b'{"type":"result","index":' + str(i).encode() + b',"search":' + body + b'}\n'
+            yield encoding.dumps({
+                'type': 'done',
+                'queries': len(jobs),
+                'upstream': plan.stats(),
+                'ms': round((time.perf_counter() - start) * 1000, 1),
+            }) + b'\n'
+        finally:
+            # client gone: stop the remaining queries and their upstream calls
+            for t in tasks:
+                t.cancel()
+            plan.cancel()
+
+    return StreamingResponse(events(), media_type='application/x-ndjson', headers={'Cache-Control': 'no-cache'})
+
+
+async def watch_best(query: str, regions: List[str], pricing: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Cheapest live listing for a watchlist entry, or None if the live providers found nothing.
+
+    Fallback providers are skipped: a catalog or generated price is not a price change.
+    """
+    providers = [p for p in registry.enabled_providers(SEARCH_PROVIDERS) if not p.fallback]
+    rows, _ = await orchestrator.run(query, regions, providers)
+    if not rows:
+        return None
+    params = PricingParams(**pricing) if pricing else None
+    final = price_columns(rows, params)['final_price_twd']
+    i = min(range(len(rows)), key=final.__getitem__)
+    row = rows[i]
+    return {
+        'final_price_twd': final[i],
+        'title': row.title,
+        'retailer': row.retailer,
+        'region': row.region,
+        'url': row.url,
+        'original_price_string': row.original_price_string,
+        'result_set_id': store_result_set(query, rows),
+    }
+
+
+def _require_watchlist() -> Watchlist:
+    if watchlist is None:
+        raise HTTPException(status_code=503, detail="Watchlist is disabled")
+    return watchlist
+
+
+@app.post("/api/watchlist")
+async def add_watch(req: WatchRequest):
+    """Save a search to be re-priced in the background; the first check runs on the next tick."""
+    store = _require_watchlist()
+    if not req.q.strip():
+        raise HTTPException(status_code=400, detail="Query parameter `q` is required")
+    regions = list(dict.fromkeys(r.strip().lower() for r in (req.regions or []) if r.strip())) or DEFAULT_REGIONS
+    pricing = req.pricing.model_dump(exclude_defaults=True) if req.pricing else None
+    return await asyncio.to_thread(store.add, req.q.strip(), regions, req.target_twd, pricing or None,
+                                   WATCH_MIN_INTERVAL)
+
+
+@app.get("/api/watchlist")
+async def list_watches():
+    return await asyncio.to_thread(_require_watchlist().list)
+
+
+@app.delete("/api/watchlist/{watch_id}")
+async def delete_watch(watch_id: int):
+    if not await asyncio.to_thread(_require_watchlist().delete, watch_id):
+        raise HTTPException(status_code=404, detail="Unknown watch")
+    return {"deleted": watch_id}
+
+
+@app.post("/api/watchlist/{watch_id}/check")
+async def check_watch(watch_id: int):
+    """Re-price one entry now (outside the schedule and its budget); returns the entry and any alert sent."""
+    store = _require_watchlist()
+    entry = await asyncio.to_thread(store.get, watch_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown watch")
+    alert = await watch_scheduler.check(entry)
+    return {"watch": await asyncio.to_thread(store.get, watch_id), "alert": alert}
+
+
+def _stored_result_set(result_set_id: str) -> Dict[str, Any]:
+    stored = result_sets.get(result_set_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Result set not found or expired; search again")
+    return stored
+
+
+@app.post("/api/search/{result_set_id}/reprice", response_model=SearchResponse)
+async def reprice(result_set_id: str, pricing: PricingParams, request: Request,
+                  view: Optional[ResultView] = Depends(view_params)):
+    """Re-price a cached result set under new landed-cost options (no upstream calls);
+    view query parameters as for GET /api/search."""
+    stored = _stored_result_set(result_set_id)
+    return search_response(request, stored['query'], stored['rows'], result_set_id, pricing, view=view)
+
+
+@app.get("/api/search/{result_set_id}/page", response_model=SearchResponse)
+async def result_page(result_set_id: str, request: Request, pricing: PricingParams = Depends(),
+                      view: Optional[ResultView] = Depends(view_params)):
+    """One sorted and filtered page of a cached result set (no upstream calls), with pricing
+    and view query parameters as for GET /api/search; revalidates with its ETag."""
+    stored = _stored_result_set(result_set_id)
+    return search_response(request, stored['query'], stored['rows'], result_set_id, pricing,
+                           view=view or ResultView())
+
+
+# proxied images never change under their URL; clients may keep them for a year
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@app.get("/img")
+async def image(request: Request, u: str, w: int = Query(IMAGE_WIDTH, ge=16, le=4000), s: Optional[str] = None):
+    """Remote product image `u`, scaled down to width `w` (rounded up to a cached size) as
+    WebP when the client accepts it, else JPEG.
+
+    `s` is the signature `proxied_image` put in the URL; 403 without a valid one. The
+    origin is fetched once; variants are served from the disk cache with a strong
+    ETag and a year-long immutable Cache-Control. 400 for URLs that may not be proxied,
+    502 when the origin fails or returns no image (the frontend shows its placeholder).
+    """
+    if image_proxy is None:
+        raise HTTPException(status_code=404, detail="Image proxy is disabled")
+    if not image_proxy.verify(u, s):
+        raise HTTPException(status_code=403, detail="Image URL is not signed")
+    width = image_proxy.width_for(w)
+    fmt = image_proxy.variant_format(request.headers.get('accept', ''))
+    etag = encoding.make_etag('img', u, width, fmt)
+    headers = {'Cache-Control': IMAGE_CACHE_CONTROL, 'Vary': 'Accept'}
+    if encoding.etag_matches(request, etag):
+        return Response(status_code=304, headers={'ETag': etag, **headers})
+    try:
+        data, content_type = await image_proxy.get(u, width, fmt)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except ImageError as exc:
+        raise HTTPException(status_code=502, detail=str(exc), headers={'Cache-Control': 'no-store'})
+    return Response(content=data, media_type=content_type, headers={'ETag': etag, **headers})
+
+
+@app.get("/api/history")
+async def history(request: Request, url: str, retailer: Optional[str] = None, region: Optional[str] = None,
+                  days: float = Query(90, gt=0, le=3650), points: int = Query(100, ge=1, le=1000)):
+    """Downsampled landed-price history of a listing (by product URL; optionally one retailer/region).
+
+    Returns one series per (retailer, region) the URL was seen under, each with at most
+    `points` buckets of min/avg/max landed price (default pricing) over the last `days`.
+    """
+    if price_history is None:
+        raise HTTPException(status_code=503, detail="Price history is disabled")
+    until = time.time()
+    since = until - days * 86400
+    series = []
+    for p in await price_history.aproducts(url, retailer, region):
+        series.append({
+            'retailer': p['retailer'],
+            'region': p['region'],
+            'points': await price_history.aseries(p['id'], since, until, points),
+        })
+    body = encoding.dumps({'url': normalize_url(url), 'since': int(since), 'until': int(until), 'series': series})
+    return encoding.json_response(request, body, min_size=COMPRESS_MIN_BYTES)
+
+
+def _encode_event(event: dict, sse: bool) -> bytes:
+    data = encoding.dumps(event)
+    if sse:
+        return b"event: " + event['type'].encode() + b"\ndata: " + data + b"\n\n"
+    return data + b"\n"
+
+
+@app.post("/api/search/stream")
+async def search_stream(req: SearchRequest, request: Request):
+    """Streaming variant of /api/search.
+
+    Emits newline-delimited JSON (or Server-Sent Events when the client sends
+    `Accept: text/event-stream`):
+    - `item`: a priced item as soon as its provider/region has been parsed; a later `item`
+      with the same `key` (a cheaper duplicate) replaces the earlier one
+    - `region`: a SerpApi region finished, with its row count
+    - `provider`: a provider finished: status (`ok`, `timeout`, `error`), row count and ms
+    - `done`: `lowest_key`, summary stats, the product `groups` (with the `keys` of their
+      items, cheapest first) and the `result_set_id` for re-pricing
+
+    If the client disconnects, providers and regions still in flight are cancelled.
+    """
+    if not req.q:
+        raise HTTPException(status_code=400, detail="Query parameter `q` is required")
+    regions = resolve_regions(req)
+    prewarmer.observe(req.q, regions)
+    sse = 'text/event-stream' in request.headers.get('accept', '')
+
+    async def events():
+        all_rows: List[Row] = []
+        best: Dict[str, int] = {}  # key -> final_price_twd of the item sent for it
+
+        def emit_rows(rows):
+            cols = price_columns(rows, req.pricing)
+            for i, row in enumerate(rows):
+                final = cols['final_price_twd'][i]
+                existing = best.get(row.key)
+                if existing is None or final < existing:
+                    best[row.key] = final
+                    item = row_item(row, cols, i)
+                    item['key'] = row.key
+                    yield _encode_event({'type': 'item', 'item': item}, sse)
+
+        # closing this generator (client gone) cancels every provider still running
+        async for event in orchestrator.stream(req.q, regions, registry.enabled_providers(SEARCH_PROVIDERS)):
+            if event['type'] == 'chunk':
+                rows = event['rows']
+                all_rows.extend(rows)
+                for line in emit_rows(rows):
+                    yield line
+                if event['region']:
+                    yield _encode_event({'type': 'region', 'provider': event['provider'], 'region': event['region'],
+                                         'status': 'ok', 'count': len(rows)}, sse)
+            else:
+                yield _encode_event(event, sse)
+
+        SEARCH_ROWS.observe(len(all_rows))
+        if not all_rows:
+            SEARCH_MOCK.inc()
+            all_rows = mock_rows(req.q)
+            for i, row in enumerate(all_rows):
+                row.key = f"fallback-{i}"
+            for line in emit_rows(all_rows):
+                yield line
+
+        result_set_id = store_result_set(req.q, all_rows)
+        # product groups over everything streamed; `keys` map them onto the items already sent
+        final = price_columns(all_rows, req.pricing)['final_price_twd']
+        groups = []
+        for gid, members in enumerate(group_products(all_rows, dedupe(all_rows, final), final)):
+            group = group_summary(all_rows, members, gid, final)
+            group['keys'] = [all_rows[i].key for i in members]
+            groups.append(group)
+        finals = list(best.values())
+        lowest_key = min(best, key=best.get) if best else None
+        yield _encode_event({
+            'type': 'done',
+            'query': req.q,
+            'result_set_id': result_set_id,
+            'lowest_key': lowest_key,
+            'count': len(best),
+            'min_final_price_twd': min(finals) if finals else None,
+            'max_final_price_twd': max(finals) if finals else None,
+            'groups': groups,
+        }, sse)
+
+    media_type = 'text/event-stream' if sse else 'application/x-ndjson'
+    return StreamingResponse(events(), media_type=media_type, headers={'Cache-Control': 'no-cache'})
 
 
 # mount frontend at the end
 frontend_dir = os.path.join(os.path.dirname(__file__), '..', 'frontend_dist')
 frontend_dir = os.path.abspath(frontend_dir)
 if os.path.exists(frontend_dir):
-    app.mount('/', StaticFiles(directory=frontend_dir, html=True), name='frontend')
+    app.mount('/', FrontendFiles(frontend_dir), name='frontend')
+
+_import_s = time.perf_counter() - _import_started
+startup['import_ms'] = round(_import_s * 1000, 1)
+STARTUP_DURATION.labels('import').set(_import_s)
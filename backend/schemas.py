@@ -1,5 +1,33 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
+
+class PricingParams(BaseModel):
+    # flat shipping in TWD; overrides the origin/weight estimate when set
+    shipping_twd: Optional[float] = None
+    # ship every item from this origin (ORIGIN_RATES key, e.g. 'US'); default: each item's search region
+    origin: Optional[str] = None
+    # parcel weight used with the per-lb origin rates
+    weight_lbs: Optional[float] = None
+    apply_tax: bool = True
+    tax_threshold: float = 0
+    tax_rate: float = Field(0.17, ge=0, le=1)
+
+
+# one page of a result set: sort order, filters and a keyset cursor
+class ResultView(BaseModel):
+    # recommended: cheapest product group first (the unpaged order); discount: largest discount_pct first
+    sort: Literal['recommended', 'price_asc', 'price_desc', 'discount'] = 'recommended'
+    # keep listings matching any of these (retailer case-insensitive, region like 'us', currency like 'GBP')
+    retailer: Optional[List[str]] = None
+    region: Optional[List[str]] = None
+    currency: Optional[List[str]] = None
+    # bounds on final_price_twd, inclusive
+    min_price_twd: Optional[int] = Field(None, ge=0)
+    max_price_twd: Optional[int] = Field(None, ge=0)
+    limit: int = Field(24, ge=1, le=200)
+    # `next_cursor` of the previous page
+    cursor: Optional[str] = None
+
 
 class SearchRequest(BaseModel):
     q: str
@@ -7,10 +35,37 @@ class SearchRequest(BaseModel):
     # optional list of market regions to query (Google 'gl' parameter).
     # Example: ['us','gb','jp'] — if not provided, backend will query a small set of foreign markets.
     regions: Optional[List[str]] = None
+    # landed-cost options; defaults to flat 800 TWD shipping and 17% tax
+    pricing: Optional[PricingParams] = None
+    # return one sorted/filtered page instead of every listing
+    view: Optional[ResultView] = None
+
+class BatchQuery(BaseModel):
+    q: str
+    regions: Optional[List[str]] = None
+    # overrides the batch-wide pricing for this query
+    pricing: Optional[PricingParams] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery]
+    # default landed-cost options for every query
+    pricing: Optional[PricingParams] = None
+
+
+class WatchRequest(BaseModel):
+    q: str
+    regions: Optional[List[str]] = None
+    # alert when the best landed price reaches this (TWD); every change is recorded either way
+    target_twd: Optional[int] = Field(None, ge=0)
+    pricing: Optional[PricingParams] = None
+
 
 class Item(BaseModel):
+    title: Optional[str] = None
     retailer: str
     image: Optional[str]
+    # resized, cached copy of `image` served by /img (or `image` itself when the proxy is off)
     image_url: Optional[str]
     original_price: float
     original_price_string: Optional[str] = None
@@ -23,10 +78,106 @@ class Item(BaseModel):
     url: Optional[str]
     sizes: Optional[List[str]] = Field(default_factory=list)
     weight: Optional[str] = "N/A"
+    # cheapest listing of its product group (see `group_id`)
     is_lowest: bool = False
     discount_text: Optional[str] = None
     discount_pct: Optional[float] = None
+    # listings of the same product (across retailers and regions) share a group_id
+    group_id: Optional[int] = None
+    group_size: int = 1
+    # unix time the listing was last seen live; only set for results served from the local catalog
+    observed_at: Optional[float] = None
+
+
+class ProductGroup(BaseModel):
+    group_id: int
+    title: Optional[str] = None
+    size: int
+    lowest_final_price_twd: int
+    retailers: List[str]
+    regions: List[str]
 
 class SearchResponse(BaseModel):
     query: str
+    # grouped by product: cheapest group first, cheapest listing first within a group
     results: List[Item]
+    groups: List[ProductGroup] = Field(default_factory=list)
+    # id of the cached result set; pass to /api/search/{id}/reprice to re-price without searching again
+    result_set_id: Optional[str] = None
+    # per-provider status, row count and time in ms
+    providers: Optional[Dict[str, Dict[str, Any]]] = None
+    # set when a `view` was requested: listings matching the filters, the cursor of the
+    # next page (None on the last) and per-value counts of retailer/region/currency
+    # over the whole (deduplicated, unfiltered) result set
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+
+
+class Row:
+    """Internal normalized listing, produced by the scrapers and kept in result sets.
+
+    Not part of the API: a plain slotted object so a 100+ row search does not allocate
+    a dict per row per stage or run pydantic validation on the hot path. Prices are
+    computed per request into columns (see `main.price_columns`) and the wire dict
+    (`Item` fields) is built once per returned row by `to_item`.
+    """
+
+    __slots__ = ('key', 'title', 'retailer', 'image', 'original_price', 'original_price_string', 'currency',
+                 'url', 'discount_text', 'discount_pct', 'sizes', 'weight', 'region', 'seen_at')
+
+    def __init__(self, key: Optional[str], retailer: str, original_price: float, currency: str,
+                 original_price_string: Optional[str] = None, image: Optional[str] = None,
+                 url: Optional[str] = None, discount_text: Optional[str] = None,
+                 discount_pct: Optional[float] = None, sizes: Optional[List[str]] = None,
+                 weight: Optional[str] = 'N/A', region: Optional[str] = None, title: Optional[str] = None,
+                 seen_at: Optional[float] = None):
+        self.key = key
+        self.title = title
+        self.retailer = retailer
+        self.original_price = original_price
+        self.currency = currency
+        self.original_price_string = original_price_string
+        self.image = image
+        self.url = url
+        self.discount_text = discount_text
+        self.discount_pct = discount_pct
+        self.sizes = sizes or []
+        self.weight = weight or 'N/A'
+        self.region = region
+        # set on listings served from the local catalog: when the listing was last seen live
+        self.seen_at = seen_at
+
+    def __repr__(self):
+        return f"Row({self.key!r}, {self.original_price} {self.currency}, region={self.region!r})"
+
+    def to_item(self, price_twd: int, shipping_twd: int, tax_twd: int, final_price_twd: int,
+                is_lowest: bool = False, group_id: Optional[int] = None, group_size: int = 1,
+                image_url: Optional[str] = None) -> Dict[str, Any]:
+        """JSON-ready dict with the `Item` fields (the duplicated wire fields are filled here only).
+
+        `image_url` defaults to the remote `image`; the API passes its image proxy URL.
+        """
+        return {
+            'title': self.title,
+            'retailer': self.retailer,
+            'image': self.image,
+            'image_url': image_url or self.image,
+            'original_price': self.original_price,
+            'original_price_string': self.original_price_string,
+            'currency': self.currency,
+            'price_twd': price_twd,
+            'shipping_twd': shipping_twd,
+            'tax_twd': tax_twd,
+            'final_price_twd': final_price_twd,
+            'landed_cost_estimate': final_price_twd,
+            'url': self.url,
+            'sizes': self.sizes,
+            'weight': self.weight,
+            'is_lowest': is_lowest,
+            'discount_text': self.discount_text,
+            'discount_pct': self.discount_pct,
+            'group_id': group_id,
+            'group_size': group_size,
+            'observed_at': self.seen_at,
+        }
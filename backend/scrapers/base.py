@@ -1,13 +1,57 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+
+from ..schemas import Row
+
+# one chunk of provider output: (region or None, normalized rows)
+Chunk = Tuple[Optional[str], List[Row]]
+
 
 class BaseScraper(ABC):
     """Abstract base scraper. Concrete scrapers should implement `scrape`.
 
-    The `scrape` method should return a list of dicts with at least:
-    - retailer, image, price, currency, url
+    The `scrape` method should return a list of normalized `Row`s (see `rows_from_scraper`).
+
+    Class attributes tune how the orchestrator runs the provider:
+    - `name`: registry name, also used in timings and env overrides
+    - `timeout`: seconds the provider may take per search before it is cancelled
+    - `max_concurrency`: searches this provider may serve at once (across requests)
+    - `fallback`: tier; 0 (False) providers always run, tier 1 (True) only when they all
+      returned nothing, tier 2 only when tier 1 returned nothing too, and so on
     """
 
+    name: str = 'base'
+    timeout: float = 10.0
+    max_concurrency: int = 4
+    fallback: int = 0
+
     @abstractmethod
-    async def scrape(self, query: str) -> List[Dict[str, Any]]:
+    async def scrape(self, query: str, regions: Optional[List[str]] = None) -> List[Row]:
         raise NotImplementedError()
+
+    async def scrape_chunks(self, query: str, regions: Optional[List[str]] = None) -> AsyncIterator[Chunk]:
+        """Yield results progressively; the default yields everything as one chunk."""
+        yield None, await self.scrape(query, regions)
+
+
+def rows_from_scraper(items: List[Dict[str, Any]], region: Optional[str] = None) -> List[Row]:
+    """Normalize plain scraper dicts (retailer, image, original_price, currency, url)."""
+    rows = []
+    for i, r in enumerate(items):
+        # scraper rows carry a structured amount and currency; no string parsing needed
+        currency = r.get('currency', 'USD')
+        amount = float(r.get('original_price', 0.0))
+        rows.append(Row(
+            key=r.get('url') or f"{r.get('retailer', 'unknown')}||{i}",
+            title=r.get('title'),
+            retailer=r.get('retailer', 'unknown'),
+            image=r.get('image') or None,
+            original_price=amount,
+            original_price_string=r.get('original_price_string') or f"{amount} {currency}",
+            currency=currency,
+            url=r.get('url'),
+            sizes=r.get('sizes'),
+            weight=r.get('weight'),
+            region=region,
+        ))
+    return rows
@@ -0,0 +1,186 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, List
+from urllib.parse import urlsplit
+
+logger = logging.getLogger('hypeprice.browser')
+
+# resource types we never need for scraping product lists (the `src` attributes are
+# still in the DOM, the bytes are just not downloaded)
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font', 'stylesheet'}
+# analytics/ads hosts; matched on the host suffix
+BLOCKED_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'facebook.net',
+    'facebook.com', 'hotjar.com', 'criteo.com', 'criteo.net', 'tiktok.com', 'bing.com',
+    'pinterest.com', 'snapchat.com', 'clarity.ms', 'quantserve.com', 'scorecardresearch.com',
+    'optimizely.com', 'adservice.google.com', 'cookielaw.org', 'onetrust.com',
+)
+
+
+def should_block(resource_type: str, url: str) -> bool:
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlsplit(url).hostname or ''
+    return any(host == h or host.endswith('.' + h) for h in BLOCKED_HOSTS)
+
+
+async def _block_route(route):
+    req = route.request
+    if should_block(req.resource_type, req.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def _launch_chromium():
+    # imported lazily: Playwright is optional and slow to import
+    from playwright.async_api import async_playwright
+    pw = await async_playwright().start()
+    browser = await pw.chromium.launch(headless=True)
+    return pw, browser
+
+
+class _PooledContext:
+    __slots__ = ('context', 'uses', 'broken')
+
+    def __init__(self, context):
+        self.context = context
+        self.uses = 0
+        self.broken = False
+
+
+class BrowserPool:
+    """One long-lived headless browser with a bounded pool of reusable contexts.
+
+    - at most `max_pages` pages are open at once; further callers wait
+    - a context is recycled after `max_uses` pages, or right away if its page crashed
+      or raised; the browser is relaunched if it disconnected
+    - images, fonts, media, stylesheets and known trackers are blocked per context
+
+    The browser is launched on first use; call `stop()` on app shutdown.
+    """
+
+    def __init__(self, max_pages: int = 2, max_uses: int = 50, block_resources: bool = True,
+                 launch: Callable[[], Awaitable[Any]] = _launch_chromium):
+        self.max_pages = max_pages
+        self.max_uses = max_uses
+        self.block_resources = block_resources
+        self._launch = launch
+        self._sem = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self._driver = None
+        self._browser = None
+        self._idle: List[_PooledContext] = []
+        self.launches = 0
+        self.contexts_created = 0
+        self.contexts_recycled = 0
+        self.pages_served = 0
+
+    @property
+    def started(self) -> bool:
+        return self._browser is not None
+
+    async def _ensure_browser(self):
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._browser is not None:
+                logger.warning('browser disconnected; relaunching')
+                self._idle.clear()
+            self._driver, self._browser = await self._launch()
+            self.launches += 1
+            return self._browser
+
+    async def _new_context(self) -> _PooledContext:
+        browser = await self._ensure_browser()
+        context = await browser.new_context()
+        if self.block_resources:
+            await context.route('**/*', _block_route)
+        self.contexts_created += 1
+        return _PooledContext(context)
+
+    async def _retire(self, pc: _PooledContext):
+        self.contexts_recycled += 1
+        try:
+            await pc.context.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a fresh page in a pooled context: `async with pool.page() as page: ...`"""
+        async with self._sem:
+            pc = None
+            while self._idle:
+                candidate = self._idle.pop()
+                if self._browser is not None and self._browser.is_connected():
+                    pc = candidate
+                    break
+            if pc is None:
+                pc = await self._new_context()
+            page = None
+
+            def _on_crash(*_):
+                pc.broken = True
+
+            try:
+                # inside the try: a context that cannot open a page is retired, not leaked
+                page = await pc.context.new_page()
+                page.on('crash', _on_crash)
+                yield page
+            except BaseException:
+                pc.broken = True
+                raise
+            finally:
+                if page is not None:
+                    pc.uses += 1
+                    self.pages_served += 1
+                    try:
+                        await page.close()
+                    except Exception:
+                        pc.broken = True
+                if pc.broken or pc.uses >= self.max_uses:
+                    await self._retire(pc)
+                else:
+                    self._idle.append(pc)
+
+    async def stop(self):
+        async with self._lock:
+            for pc in self._idle:
+                try:
+                    await pc.context.close()
+                except Exception:
+                    pass
+            self._idle.clear()
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception:
+                    logger.exception('closing browser failed')
+            if self._driver is not None:
+                try:
+                    await self._driver.stop()
+                except Exception:
+                    logger.exception('stopping playwright failed')
+            self._browser = None
+            self._driver = None
+
+    def stats(self):
+        return {
+            'started': self.started,
+            'max_pages': self.max_pages,
+            'idle_contexts': len(self._idle),
+            'launches': self.launches,
+            'contexts_created': self.contexts_created,
+            'contexts_recycled': self.contexts_recycled,
+            'pages_served': self.pages_served,
+        }
+
+
+# shared pool used by the Playwright scrapers; closed from the app lifespan
+browser_pool = BrowserPool(
+    max_pages=int(os.getenv('BROWSER_POOL_MAX_PAGES', '2')),
+    max_uses=int(os.getenv('BROWSER_POOL_MAX_USES', '50')),
+)
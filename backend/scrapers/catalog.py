@@ -0,0 +1,26 @@
+import asyncio
+from typing import List, Optional
+
+from .base import BaseScraper
+from ..schemas import Row
+from ..utils.catalog import Catalog
+
+
+class CatalogScraper(BaseScraper):
+    """Recent real listings from the local catalog (see `utils.catalog.Catalog`).
+
+    A first-tier fallback: answers from the full-text index when upstream is down, over
+    budget or empty, before any synthetic data is considered. Rows carry `seen_at`.
+    """
+
+    name = 'catalog'
+    timeout = 1.0
+    max_concurrency = 8
+    fallback = 1
+
+    def __init__(self, catalog: Catalog, limit: int = 40):
+        self.catalog = catalog
+        self.limit = limit
+
+    async def scrape(self, query: str, regions: Optional[List[str]] = None) -> List[Row]:
+        return await asyncio.to_thread(self.catalog.search, query, regions, self.limit)
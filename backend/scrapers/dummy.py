@@ -1,5 +1,8 @@
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from .base import BaseScraper, rows_from_scraper
+from ..schemas import Row
 
 # Dummy scraper returns mock data quickly so frontend and API can be wired.
 async def scrape_dummy(query: str) -> List[Dict[str, Any]]:
@@ -34,6 +37,17 @@ async def scrape_dummy(query: str) -> List[Dict[str, Any]]:
     # Filter pseudo by query for demo (keeps all for now)
     return items
 
+class DummyScraper(BaseScraper):
+    """Fixed sample listings; only used when no real provider (nor the catalog) returned anything."""
+
+    name = 'dummy'
+    timeout = 2.0
+    fallback = 2
+
+    async def scrape(self, query: str, regions: Optional[List[str]] = None) -> List[Row]:
+        return rows_from_scraper(await scrape_dummy(query))
+
+
 # Example of real Playwright-based scraper (commented-out)
 """
 from playwright.async_api import async_playwright
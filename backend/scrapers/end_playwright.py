@@ -1,83 +1,220 @@
-from playwright.async_api import async_playwright
-from typing import List, Dict, Any
+from html.parser import HTMLParser
+from typing import List, Dict, Any, Optional
 import re
 
+from . import browser_pool as _browser_pool
+from .base import BaseScraper, rows_from_scraper
+from ..schemas import Row
 
-async def scrape_end(query: str, max_results: int = 8) -> List[Dict[str, Any]]:
+BASE_URL = 'https://www.endclothing.com'
+CARD_SELECTOR = 'a[data-test="product-card"]'
+FALLBACK_CARD_SELECTOR = 'a[href*="/product/"]'
+
+# Runs inside the page: collects href, first <img> src, the price span text and all span
+# texts of every card in one round trip instead of several IPC calls per card.
+EXTRACT_CARDS_JS = """
+({selectors, max}) => {
+  let cards = [];
+  for (const sel of selectors) {
+    cards = Array.from(document.querySelectorAll(sel));
+    if (cards.length) break;
+  }
+  return cards.slice(0, max).map(c => {
+    const img = c.querySelector('img');
+    const price = c.querySelector('span[class*=price]');
+    return {
+      href: c.getAttribute('href') || '',
+      img: img ? (img.getAttribute('src') || '') : '',
+      price: price ? price.innerText : null,
+      spans: Array.from(c.querySelectorAll('span')).map(s => s.innerText),
+    };
+  });
+}
+"""
+
+_PRICE_RE = re.compile(r"([£€$¥])\s*([0-9,]+\.?[0-9]*)")
+_NUMBER_RE = re.compile(r"([0-9,]+\.?[0-9]*)")
+_DIGIT_RE = re.compile(r"\d")
+_SYMBOL_CURRENCY = {'£': 'GBP', '$': 'USD', '¥': 'JPY', '€': 'EUR'}
+_CODE_RE = re.compile(r"\b(GBP|EUR|JPY|USD)\b")
+
+
+def _looks_like_price(text: str) -> bool:
+    return bool(_DIGIT_RE.search(text)) and any(s in text for s in ('£', '$', '¥', '€', 'JPY', 'GBP', 'EUR'))
+
+
+def parse_end_cards(cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Turn raw card payloads ({href, img, price, spans}) into scraper rows.
+
+    Pure Python so it can be tested offline (see `extract_cards_from_html`).
+    """
+    items = []
+    for c in cards:
+        try:
+            href = c.get('href') or ''
+            url = href if href.startswith('http') else BASE_URL + href
+
+            # price - the price span, else any span that looks like a price
+            price_text = c.get('price')
+            if price_text is None:
+                price_text = ''
+                for t in c.get('spans') or []:
+                    t = (t or '').strip()
+                    if _looks_like_price(t):
+                        price_text = t
+                        break
+
+            # Normalize price and currency
+            price_val = 0.0
+            currency = 'GBP'
+            m = _PRICE_RE.search(price_text)
+            if m:
+                price_val = float(m.group(2).replace(',', ''))
+                currency = _SYMBOL_CURRENCY.get(m.group(1), 'GBP')
+            else:
+                # try to parse numbers only, with a currency code if there is one ("EUR 99")
+                m2 = _NUMBER_RE.search(price_text)
+                if m2:
+                    price_val = float(m2.group(1).replace(',', ''))
+                code = _CODE_RE.search(price_text)
+                if code:
+                    currency = code.group(1)
+
+            items.append({
+                'retailer': 'END. Clothing (UK)',
+                'image': c.get('img') or '',
+                'original_price': price_val,
+                'currency': currency,
+                'url': url,
+            })
+        except Exception:
+            continue
+    return items
+
+
+class _CardHTMLParser(HTMLParser):
+    """Offline counterpart of EXTRACT_CARDS_JS for saved HTML pages.
+
+    Spans are listed in document order (by start tag), like `querySelectorAll`: each
+    gets its slot when it opens and its text when it closes, so nested spans come out
+    in the same order, and the same price, as in the browser.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cards = {'primary': [], 'fallback': []}
+        self._card = None
+        self._card_depth = 0
+        self._spans = []  # stack of open spans: [text parts, slot in card['spans']]
+        self._price_slot = None
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if self._card is None:
+            if tag == 'a':
+                href = a.get('href') or ''
+                if a.get('data-test') == 'product-card':
+                    kind = 'primary'
+                elif '/product/' in href:
+                    kind = 'fallback'
+                else:
+                    return
+                self._card = {'href': href, 'img': '', 'price': None, 'spans': [], '_kind': kind, '_has_img': False}
+                self._card_depth = 1
+                self._price_slot = None
+            return
+        if tag == 'a':
+            self._card_depth += 1
+        elif tag == 'img' and not self._card['_has_img']:
+            self._card['_has_img'] = True
+            self._card['img'] = a.get('src') or ''
+        elif tag == 'span':
+            slot = len(self._card['spans'])
+            self._card['spans'].append('')
+            if self._price_slot is None and 'price' in (a.get('class') or ''):
+                self._price_slot = slot
+            self._spans.append([[], slot])
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_data(self, data):
+        for parts, _ in self._spans:
+            parts.append(data)
+
+    def handle_endtag(self, tag):
+        if self._card is None:
+            return
+        if tag == 'span' and self._spans:
+            self._close_span()
+        elif tag == 'a':
+            self._card_depth -= 1
+            if self._card_depth == 0:
+                # spans left open end with the card, as the browser would close them
+                while self._spans:
+                    self._close_span()
+                card = self._card
+                kind = card.pop('_kind')
+                card.pop('_has_img')
+                self.cards[kind].append(card)
+                self._card = None
+                self._spans = []
+
+
+    def _close_span(self):
+        parts, slot = self._spans.pop()
+        text = ''.join(parts).strip()
+        self._card['spans'][slot] = text
+        if slot == self._price_slot:
+            self._card['price'] = text
+
+
+def extract_cards_from_html(html: str, max_results: int = 8) -> List[Dict[str, Any]]:
+    """Build the same card payload EXTRACT_CARDS_JS returns, from static HTML."""
+    p = _CardHTMLParser()
+    p.feed(html)
+    p.close()
+    cards = p.cards['primary'] or p.cards['fallback']
+    return cards[:max_results]
+
+
+async def scrape_end(query: str, max_results: int = 8, pool: Optional[_browser_pool.BrowserPool] = None) -> List[Dict[str, Any]]:
     """Scrape End. Clothing search results for `query` using Playwright.
 
+    Pages come from the shared long-lived `browser_pool` (or `pool`), so warm calls
+    only pay for the page load. All cards are read in a single in-page evaluation.
+
     Returns list of dicts with keys: retailer, image, original_price, currency, url
     """
-    items = []
-    search_url = f"https://www.endclothing.com/gb/search?q={query.replace(' ', '+')}"
+    search_url = f"{BASE_URL}/gb/search?q={query.replace(' ', '+')}"
+    pool = pool or _browser_pool.browser_pool
 
-    async with async_playwright() as pw:
-        browser = await pw.chromium.launch(headless=True)
+    async with pool.page() as page:
+        await page.goto(search_url, timeout=30000)
+        # Wait for product tiles - selector may vary; the extractor falls back to generic product links
         try:
-            page = await browser.new_page()
-            await page.goto(search_url, timeout=30000)
-            # Wait for product tiles - selector may vary; try a few fallbacks
-            try:
-                await page.wait_for_selector('a[data-test="product-card"]', timeout=5000)
-                cards = await page.query_selector_all('a[data-test="product-card"]')
-            except Exception:
-                # fallback generic link to product
-                cards = await page.query_selector_all('a[href*="/product/"]')
-
-            for c in cards[:max_results]:
-                try:
-                    href = await c.get_attribute('href') or ''
-                    url = href if href.startswith('http') else 'https://www.endclothing.com' + href
-                    # image
-                    img = ''
-                    img_el = await c.query_selector('img')
-                    if img_el:
-                        img = await img_el.get_attribute('src') or ''
-
-                    # price - try to locate price text
-                    price_text = ''
-                    price_el = await c.query_selector('span[class*=price]')
-                    if price_el:
-                        price_text = await price_el.inner_text()
-                    else:
-                        # try any element that looks like a price
-                        possible = await c.query_selector_all('span')
-                        for p in possible:
-                            t = (await p.inner_text()).strip()
-                            if re.search(r"\d", t) and ("£" in t or "$" in t or "¥" in t or "JPY" in t or "GBP" in t):
-                                price_text = t
-                                break
-
-                    # Normalize price and currency
-                    price_val = 0.0
-                    currency = 'GBP'
-                    m = re.search(r"([£€$¥])\s*([0-9,]+\.?[0-9]*)", price_text)
-                    if m:
-                        symbol = m.group(1)
-                        num = m.group(2).replace(',', '')
-                        price_val = float(num)
-                        if symbol == '£':
-                            currency = 'GBP'
-                        elif symbol == '$':
-                            currency = 'USD'
-                        elif symbol == '¥' or symbol == 'JPY':
-                            currency = 'JPY'
-                    else:
-                        # try to parse numbers only
-                        m2 = re.search(r"([0-9,]+\.?[0-9]*)", price_text)
-                        if m2:
-                            price_val = float(m2.group(1).replace(',', ''))
-
-                    items.append({
-                        'retailer': 'END. Clothing (UK)',
-                        'image': img,
-                        'original_price': price_val,
-                        'currency': currency,
-                        'url': url,
-                    })
-                except Exception:
-                    continue
-        finally:
-            await browser.close()
+            await page.wait_for_selector(CARD_SELECTOR, timeout=5000)
+        except Exception:
+            pass
+        cards = await page.evaluate(
+            EXTRACT_CARDS_JS,
+            {'selectors': [CARD_SELECTOR, FALLBACK_CARD_SELECTOR], 'max': max_results},
+        )
 
-    return items
+    return parse_end_cards(cards or [])
+
+
+class EndScraper(BaseScraper):
+    """END. Clothing (UK) search page through the shared Playwright browser pool."""
+
+    name = 'end'
+    timeout = 20.0
+    # bounded by the browser pool as well; keep queued searches from piling up behind it
+    max_concurrency = 2
+
+    def __init__(self, max_results: int = 8):
+        self.max_results = max_results
+
+    async def scrape(self, query: str, regions: Optional[List[str]] = None) -> List[Row]:
+        # END. ships from the UK regardless of the searched regions
+        return rows_from_scraper(await scrape_end(query, self.max_results), region='gb')
@@ -0,0 +1,143 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .base import BaseScraper
+from ..schemas import Row
+from ..utils import metrics
+
+logger = logging.getLogger('hypeprice.providers')
+
+PROVIDER_DURATION = metrics.Histogram('hypeprice_provider_duration_seconds',
+                                      'Time a provider ran for one search.', ['provider', 'status'])
+PROVIDER_ROWS = metrics.Counter('hypeprice_provider_rows_total', 'Rows returned by each provider.', ['provider'])
+PROVIDER_FAILURES = metrics.Counter('hypeprice_provider_failures_total',
+                                    'Provider runs that timed out or raised.', ['provider', 'status'])
+PROVIDER_IN_FLIGHT = metrics.Gauge('hypeprice_provider_in_flight', 'Provider runs in progress.', ['provider'])
+
+# name -> provider instance
+PROVIDERS: Dict[str, BaseScraper] = {}
+
+
+def register(provider: BaseScraper) -> BaseScraper:
+    """Add a provider to the registry; per-provider env overrides are applied here:
+    PROVIDER_<NAME>_TIMEOUT and PROVIDER_<NAME>_CONCURRENCY."""
+    prefix = f"PROVIDER_{provider.name.upper()}_"
+    if os.getenv(prefix + 'TIMEOUT'):
+        provider.timeout = float(os.getenv(prefix + 'TIMEOUT'))
+    if os.getenv(prefix + 'CONCURRENCY'):
+        provider.max_concurrency = int(os.getenv(prefix + 'CONCURRENCY'))
+    PROVIDERS[provider.name] = provider
+    return provider
+
+
+def enabled_providers(names: Optional[List[str]] = None) -> List[BaseScraper]:
+    """Registered providers listed in `names` (default: env SEARCH_PROVIDERS, else all)."""
+    if names is None:
+        env = os.getenv('SEARCH_PROVIDERS')
+        names = [n.strip() for n in env.split(',') if n.strip()] if env else list(PROVIDERS)
+    return [PROVIDERS[n] for n in names if n in PROVIDERS]
+
+
+class Orchestrator:
+    """Runs providers concurrently, each under its own timeout and concurrency limit.
+
+    Fallback providers only run when every lower tier produced no rows (see
+    `BaseScraper.fallback`). A slow or failing provider costs its own timeout, not the
+    whole request.
+    """
+
+    def __init__(self):
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _limit(self, p: BaseScraper) -> asyncio.Semaphore:
+        sem = self._limits.get(p.name)
+        if sem is None:
+            sem = self._limits[p.name] = asyncio.Semaphore(p.max_concurrency)
+        return sem
+
+    async def _run_provider(self, p: BaseScraper, query: str, regions, queue: asyncio.Queue):
+        start = time.perf_counter()
+        status = 'ok'
+        count = 0
+        in_flight = PROVIDER_IN_FLIGHT.labels(p.name)
+        in_flight.inc()
+        try:
+            async with asyncio.timeout(p.timeout):
+                async with self._limit(p):
+                    async for region, rows in p.scrape_chunks(query, regions):
+                        count += len(rows)
+                        await queue.put({'type': 'chunk', 'provider': p.name, 'region': region, 'rows': rows})
+        except TimeoutError:
+            status = 'timeout'
+            logger.warning('provider %s timed out after %.1fs', p.name, p.timeout)
+        except asyncio.CancelledError:
+            status = 'cancelled'
+            raise
+        except Exception as exc:
+            status = 'error'
+            logger.error('provider %s failed: %r', p.name, exc)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            PROVIDER_DURATION.labels(p.name, status).observe(elapsed)
+            PROVIDER_ROWS.labels(p.name).inc(count)
+            if status in ('timeout', 'error'):
+                PROVIDER_FAILURES.labels(p.name, status).inc()
+            await queue.put({
+                'type': 'provider', 'provider': p.name, 'status': status, 'rows': count,
+                'ms': round(elapsed * 1000, 1),
+            })
+
+    async def _stream_group(self, providers: List[BaseScraper], query: str, regions) -> AsyncIterator[Dict[str, Any]]:
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks = [asyncio.ensure_future(self._run_provider(p, query, regions, queue)) for p in providers]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                event = await queue.get()
+                if event['type'] == 'provider':
+                    remaining -= 1
+                yield event
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    async def stream(self, query: str, regions: Optional[List[str]] = None,
+                     providers: Optional[List[BaseScraper]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield `chunk` events ({provider, region, rows}) as they arrive and one
+        `provider` event ({provider, status, rows, ms}) per provider when it finishes."""
+        providers = enabled_providers() if providers is None else providers
+        for tier in sorted({int(p.fallback) for p in providers}):
+            got_rows = False
+            async for event in self._stream_group([p for p in providers if int(p.fallback) == tier], query, regions):
+                if event['type'] == 'chunk' and event['rows']:
+                    got_rows = True
+                yield event
+            if got_rows:
+                break
+
+    async def run(self, query: str, regions: Optional[List[str]] = None,
+                  providers: Optional[List[BaseScraper]] = None):
+        """Collect every row; returns (rows, timings) where timings maps provider -> stats.
+
+        Rows are ordered by provider, then region, whatever order they arrived in, so the
+        same upstream data always gives the same result set.
+        """
+        providers = enabled_providers() if providers is None else providers
+        provider_order = {p.name: i for i, p in enumerate(providers)}
+        region_order = {r: i for i, r in enumerate(regions or [])}
+        chunks = []
+        timings: Dict[str, Dict[str, Any]] = {}
+        async for event in self.stream(query, regions, providers):
+            if event['type'] == 'chunk':
+                order = (provider_order.get(event['provider'], 0), region_order.get(event['region'], -1))
+                chunks.append((order, event['rows']))
+            else:
+                timings[event['provider']] = {k: event[k] for k in ('status', 'rows', 'ms')}
+        chunks.sort(key=lambda c: c[0])
+        rows: List[Row] = [r for _, chunk in chunks for r in chunk]
+        return rows, timings
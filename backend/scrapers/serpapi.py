@@ -0,0 +1,122 @@
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .base import BaseScraper, Chunk
+from ..schemas import Row
+from ..utils import metrics, parser, retailer
+
+logger = logging.getLogger('hypeprice.serpapi')
+
+REGION_DURATION = metrics.Histogram('hypeprice_serpapi_region_duration_seconds',
+                                    'Time until a region\'s results were ready, cache hits included.',
+                                    ['region', 'status'])
+# per response, not per row: one observation per region batch keeps the hot loop cheap
+PARSE_DURATION = metrics.Histogram('hypeprice_parse_duration_seconds',
+                                   'Time spent in one parsing stage for one region\'s results.', ['stage'],
+                                   buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+_PARSE_CURRENCY = PARSE_DURATION.labels('parse_currency')
+_DETECT_DISCOUNT = PARSE_DURATION.labels('detect_discount')
+
+
+def _region_label(region: str) -> str:
+    # regions come from the request; keep the label set bounded
+    return region.lower() if len(region) == 2 and region.isalpha() else 'other'
+
+
+def normalize_shopping(shopping: List[dict], region: str) -> List[Row]:
+    """Parse SerpApi `shopping_results` rows of one region into normalized, unpriced rows."""
+    rows = []
+    clock = time.perf_counter
+    currency_time = discount_time = 0.0
+    for s in shopping:
+        try:
+            title = s.get('title') or s.get('product_title') or s.get('name') or ''
+            price_text = s.get('price') or s.get('extracted_price') or s.get('price_string') or ''
+            thumbnail = s.get('thumbnail') or s.get('thumbnail_image') or s.get('image') or ''
+            source_raw = s.get('source') or s.get('merchant') or s.get('store') or s.get('displayed_at') or 'Retailer'
+            source = retailer.normalize_retailer(source_raw)
+            link = s.get('link') or s.get('product_link') or ''
+
+            # preserve original string
+            original_price_string = str(price_text) if price_text is not None else ''
+
+            # scan the row's text for currency hints once; shared by price and discount parsing
+            hints = parser.RowHints(s)
+            t0 = clock()
+            parsed_amount, parsed_currency, assumed_usd, price_twd = parser.parse_currency(original_price_string, s, hints)
+            t1 = clock()
+            currency_time += t1 - t0
+            if assumed_usd and original_price_string:
+                original_price_string = f"{original_price_string} (Assumed USD)"
+
+            discount_text, discount_pct, strike_twd = parser.detect_discount(s, price_twd, hints)
+            discount_time += clock() - t1
+
+            rows.append(Row(
+                key=link or f"{title}||{source}||{region}",
+                title=title or None,
+                retailer=source,
+                image=thumbnail or None,
+                original_price=parsed_amount,
+                original_price_string=original_price_string,
+                currency=parsed_currency,
+                discount_text=discount_text,
+                discount_pct=discount_pct,
+                url=link or None,
+                region=region,
+            ))
+        except Exception:
+            continue
+    if shopping:
+        _PARSE_CURRENCY.observe(currency_time)
+        _DETECT_DISCOUNT.observe(discount_time)
+    return rows
+
+
+class SerpApiScraper(BaseScraper):
+    """Google Shopping results through SerpApi, one upstream call per region.
+
+    `fetch(query, gl=region)` is the (cached) SerpApi call. Regions are queried
+    concurrently and each region is yielded as soon as its response is parsed.
+    """
+
+    name = 'serpapi'
+    timeout = 8.0
+    max_concurrency = 32
+
+    def __init__(self, fetch: Callable[..., Awaitable[Dict[str, Any]]], default_regions: Optional[List[str]] = None):
+        self.fetch = fetch
+        self.default_regions = default_regions or ['us', 'gb', 'jp']
+
+    async def scrape_chunks(self, query: str, regions: Optional[List[str]] = None) -> AsyncIterator[Chunk]:
+        regions = regions or self.default_regions
+        start = time.perf_counter()
+        tasks = {asyncio.ensure_future(self.fetch(query, gl=region)): region for region in regions}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    region = tasks[t]
+                    if t.cancelled():
+                        continue
+                    exc = t.exception()
+                    if exc is not None:
+                        REGION_DURATION.labels(_region_label(region), 'error').observe(time.perf_counter() - start)
+                        logger.error('SerpApi call for region %s failed: %r', region, exc)
+                        continue
+                    data = t.result() or {}
+                    REGION_DURATION.labels(_region_label(region), 'ok' if data else 'empty').observe(time.perf_counter() - start)
+                    yield region, normalize_shopping(data.get('shopping_results') or [], region)
+        finally:
+            # cancelled by the orchestrator (timeout / client gone): stop the remaining regions
+            for t in pending:
+                t.cancel()
+
+    async def scrape(self, query: str, regions: Optional[List[str]] = None) -> List[Row]:
+        rows = []
+        async for _, chunk in self.scrape_chunks(query, regions):
+            rows.extend(chunk)
+        return rows
@@ -0,0 +1,16 @@
+import os
+import shutil
+import tempfile
+
+# The app opens its SQLite stores and image cache when backend.main is imported, at
+# paths relative to the working directory. Point them at a scratch directory first, so
+# tests never write into the repo's .cache/ and never see rows left by earlier runs.
+_STORE_DIR = tempfile.mkdtemp(prefix='hypeprice-tests-')
+for _name, _path in (('HISTORY_PATH', 'history.sqlite3'), ('CATALOG_PATH', 'catalog.sqlite3'),
+                     ('WATCHLIST_PATH', 'watchlist.sqlite3'), ('IMAGE_CACHE_PATH', 'images'),
+                     ('DISK_CACHE_PATH', 'serpapi.sqlite3'), ('SERPAPI_BUDGET_PATH', 'serpapi-budget.sqlite3')):
+    os.environ[_name] = os.path.join(_STORE_DIR, _path)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_STORE_DIR, ignore_errors=True)
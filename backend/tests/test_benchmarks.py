@@ -0,0 +1,31 @@
+from starlette.testclient import TestClient
+
+from backend.benchmarks import common
+from backend.benchmarks.fake_serpapi import create_app
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert common.percentile(values, 50) == 50
+    assert common.percentile(values, 99) == 99
+    assert common.percentile(values, 100) == 100
+    assert common.percentile([], 50) == 0.0
+    assert common.summarize([0.001, 0.002, 0.003])['p50_ms'] == 2.0
+
+
+def test_fake_serpapi_serves_recorded_payloads_and_injects_errors():
+    ok = TestClient(create_app())
+    body = ok.get('/search', params={'engine': 'google_shopping', 'q': 'x', 'gl': 'gb'}).json()
+    assert body['search_parameters']['gl'] == 'gb' and len(body['shopping_results']) == 40
+
+    failing = TestClient(create_app(error_rate=1.0, error_status=429))
+    resp = failing.get('/search', params={'q': 'x', 'gl': 'us'})
+    assert resp.status_code == 429 and resp.headers['retry-after'] == '1'
+    assert failing.get('/stats').json()['errors'] == 1
+
+
+def test_compare_flags_regressions():
+    base = {'commit': 'a', 'results': {'parse': {'us_per_row': 1.0, 'ops_per_s': 1000}}}
+    new = {'commit': 'b', 'results': {'parse': {'us_per_row': 1.5, 'ops_per_s': 700}}}
+    lines = common.compare(base, new)
+    assert all(line.startswith('!') for line in lines[1:]) and len(lines) == 3
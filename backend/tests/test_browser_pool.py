@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from backend.scrapers.browser_pool import BrowserPool, should_block
+
+
+class FakePage:
+    def __init__(self):
+        self.handlers = {}
+        self.closed = False
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+        self.routes = []
+
+    async def route(self, pattern, handler):
+        self.routes.append(pattern)
+
+    async def new_page(self):
+        return FakePage()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self):
+        ctx = FakeContext()
+        self.contexts.append(ctx)
+        return ctx
+
+    async def close(self):
+        self.connected = False
+
+
+def make_pool(**kwargs):
+    browsers = []
+
+    async def launch():
+        b = FakeBrowser()
+        browsers.append(b)
+        return None, b
+
+    return BrowserPool(launch=launch, **kwargs), browsers
+
+
+def test_contexts_are_reused_then_recycled():
+    pool, browsers = make_pool(max_pages=1, max_uses=2)
+
+    async def run():
+        for _ in range(3):
+            async with pool.page():
+                pass
+
+    asyncio.run(run())
+    assert len(browsers) == 1
+    ctxs = browsers[0].contexts
+    assert len(ctxs) == 2 and ctxs[0].closed and not ctxs[1].closed
+    assert ctxs[0].routes == ['**/*']
+    assert pool.stats()['pages_served'] == 3
+
+
+def test_crashed_page_retires_context_and_disconnect_relaunches():
+    pool, browsers = make_pool()
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            async with pool.page():
+                raise RuntimeError('target closed')
+        browsers[0].connected = False
+        async with pool.page():
+            pass
+
+    asyncio.run(run())
+    assert browsers[0].contexts[0].closed
+    assert len(browsers) == 2
+
+
+def test_context_that_cannot_open_a_page_is_retired():
+    pool, browsers = make_pool()
+
+    async def fail():
+        raise RuntimeError('context closed')
+
+    async def run():
+        async with pool.page():
+            pass
+        browsers[0].contexts[0].new_page = fail
+        with pytest.raises(RuntimeError):
+            async with pool.page():
+                pass
+        async with pool.page():
+            pass
+
+    asyncio.run(run())
+    first, second = browsers[0].contexts
+    assert first.closed and not second.closed
+    assert pool.stats()['pages_served'] == 2
+
+
+def test_concurrency_limit():
+    pool, _ = make_pool(max_pages=2)
+    active = {'now': 0, 'peak': 0}
+
+    async def use():
+        async with pool.page():
+            active['now'] += 1
+            active['peak'] = max(active['peak'], active['now'])
+            await asyncio.sleep(0.01)
+            active['now'] -= 1
+
+    async def run():
+        await asyncio.gather(*(use() for _ in range(6)))
+
+    asyncio.run(run())
+    assert active['peak'] == 2
+
+
+def test_should_block():
+    assert should_block('image', 'https://media.endclothing.com/a.jpg')
+    assert should_block('script', 'https://www.googletagmanager.com/gtm.js')
+    assert not should_block('document', 'https://www.endclothing.com/gb/search?q=x')
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+from backend.utils.cache import LRUTTLCache, ttl_cache
+
+
+def test_lru_eviction_by_entries():
+    c = LRUTTLCache(ttl=60, max_entries=2)
+    c.set('a', 1)
+    c.set('b', 2)
+    assert c.get('a') == 1  # 'a' is now most recent
+    c.set('c', 3)
+    assert c.get('b') is None
+    assert c.get('a') == 1 and c.get('c') == 3
+    assert c.stats()['evictions'] == 1
+
+
+def test_eviction_by_bytes():
+    c = LRUTTLCache(ttl=60, max_entries=100, max_bytes=100, sizeof=lambda v: 40)
+    for k in 'abc':
+        c.set(k, k)
+    assert len(c) == 2
+    assert c.bytes == 80
+
+
+def test_negative_ttl_and_sweep():
+    c = LRUTTLCache(ttl=60, negative_ttl=0.05)
+    c.set('fail', {})
+    c.set('ok', {'x': 1})
+    assert c.get('fail') == {}
+    time.sleep(0.06)
+    assert c.sweep() == 1
+    assert c.get('ok') == {'x': 1}
+    assert c.stats()['negative_sets'] == 1
+
+
+def test_single_flight_coalesces_concurrent_misses():
+    calls = []
+
+    @ttl_cache(ttl=60)
+    async def fetch(q):
+        calls.append(q)
+        await asyncio.sleep(0.05)
+        return {'q': q}
+
+    async def run():
+        return await asyncio.gather(*(fetch('bedale') for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert calls == ['bedale']
+    assert all(r == {'q': 'bedale'} for r in results)
+    assert fetch.cache.stats()['coalesced'] == 9
+
+
+def test_l2_serves_stale_and_refreshes_in_background(tmp_path):
+    from backend.utils.disk_cache import SQLiteCache
+
+    l2 = SQLiteCache(str(tmp_path / 'c.sqlite3'), stale_ttl=60)
+    calls = []
+
+    def make(version):
+        @ttl_cache(ttl=60, l2=l2)
+        async def fetch(q):
+            calls.append(version)
+            return {'v': version}
+        return fetch
+
+    async def run():
+        first = make(1)
+        assert await first('bedale') == {'v': 1}
+        # a fresh process (new in-memory tier) reads the entry from disk
+        second = make(2)
+        assert await second('bedale') == {'v': 1}
+        assert calls == [1]
+
+        # expire it: the stale value is served right away and refreshed behind the scenes
+        l2._conn().execute('UPDATE entries SET expires_at = 0')
+        third = make(3)
+        assert await third('bedale') == {'v': 1}
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if calls[-1] == 3:
+                break
+        assert calls == [1, 3]
+        assert l2.get('fetch|bedale|{}')[0] == {'v': 3}
+
+    asyncio.run(run())
+    assert l2.stats()['stale_hits'] == 1
+    assert l2.stats()['refreshes'] == 1
+
+
+def test_shared_call_cancelled_when_all_waiters_cancel():
+    state = {'cancelled': False}
+
+    @ttl_cache(ttl=60)
+    async def slow(q):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            state['cancelled'] = True
+            raise
+        return {'q': q}
+
+    async def run():
+        waiters = [asyncio.ensure_future(slow('x')) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not state['cancelled']  # one caller still waiting
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert state['cancelled']
@@ -14,3 +14,31 @@ def test_calculate_landed_default_shipping():
     assert res['shipping_twd'] == 800.0
     assert round(res['tax_twd'], 2) == round((3250.0 + 800.0) * 0.17, 2)
     assert round(res['final_price_twd'], 2) == round(3250.0 + 800.0 + res['tax_twd'], 2)
+
+
+def test_batch_matches_flat_formula():
+    from backend.utils.calc import landed_cost_batch
+
+    res = landed_cost_batch([100, 329.0, 40000, 1200], ['USD', 'GBP', 'JPY', 'TWD'])
+    for i, (amt, rate) in enumerate([(100, 32.5), (329.0, 41.5), (40000, 0.21), (1200, 1.0)]):
+        price = int(round(amt * rate))
+        tax = int(round((price + 800) * 0.17))
+        assert res['price_twd'][i] == price
+        assert res['shipping_twd'][i] == 800
+        assert res['tax_twd'][i] == tax
+        assert res['final_price_twd'][i] == price + 800 + tax
+
+
+def test_batch_origin_rates_and_tax_threshold():
+    from backend.utils.calc import landed_cost_batch, ORIGIN_RATES, origin_for_region
+
+    res = landed_cost_batch(
+        [10, 200, 50], ['USD', 'GBP', 'USD'],
+        origins=[origin_for_region('us'), origin_for_region('uk'), 'mars'],
+        weights_lbs=[2, None, 1],
+        origin_rates=ORIGIN_RATES, default_weight_lbs=1.5,
+        tax_threshold=2000,
+    )
+    assert res['shipping_twd'].tolist() == [300, 300, 800]  # unknown origin -> default
+    assert res['tax_twd'][0] == 0  # 325 TWD is under the threshold
+    assert res['tax_twd'][1] == int(round((8300 + 300) * 0.17))
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from backend.schemas import Row
+from backend.scrapers import registry
+from backend.scrapers.catalog import CatalogScraper
+from backend.utils.catalog import Catalog, fts_query
+
+
+def _row(title, url, region='us', price=100.0, retailer='SSENSE'):
+    return Row(url, retailer, price, 'USD', title=title, url=url, region=region)
+
+
+def test_fts_query_keeps_searchable_words():
+    assert fts_query('Barbour Bedale "wax" x') == '"barbour" "bedale" "wax"'
+    assert fts_query('Barbour Bedale', any_word=True) == '"barbour" OR "bedale"'
+    assert fts_query('a b') is None
+
+
+def test_catalog_search_ranks_and_filters(tmp_path):
+    cat = Catalog(str(tmp_path / 'c.sqlite3'))
+    cat.record_many([
+        _row('Barbour Bedale Wax Jacket', 'https://x.com/p/1'),
+        _row('Barbour Beaufort Wax Jacket', 'https://x.com/p/2'),
+        _row('Barbour Bedale Wax Jacket', 'https://y.co.uk/p/1', region='gb', retailer='END.'),
+        _row('Nike Air Max 90', 'https://x.com/p/3'),
+    ])
+    found = cat.search('barbour bedale')
+    assert {r.url for r in found} == {'https://x.com/p/1', 'https://y.co.uk/p/1'}
+    # nothing has every word: any word will do, best match first
+    assert cat.search('bedale trousers')[0].title == 'Barbour Bedale Wax Jacket'
+    assert all(r.seen_at is not None for r in found)
+    # partial words match through the trigram index; regions filter
+    assert [r.url for r in cat.search('bedal', regions=['gb'])] == ['https://y.co.uk/p/1']
+
+    # a newer sighting updates the listing instead of duplicating it
+    cat.record_many([_row('Barbour Bedale Wax Jacket', 'https://x.com/p/1/?utm_source=g', price=80.0)])
+    prices = [r.original_price for r in cat.search('bedale', regions=['us'])]
+    assert prices == [80.0]
+
+
+def test_catalog_ignores_stale_listings(tmp_path):
+    cat = Catalog(str(tmp_path / 'c.sqlite3'), max_age_days=1)
+    cat.record_many([_row('Barbour Bedale', 'https://x.com/p/1')])
+    cat._conn().execute('UPDATE listings SET seen_at = ?', (time.time() - 2 * 86400,))
+    assert cat.search('bedale') == []
+    assert cat.prune() == 1
+
+
+def test_catalog_tier_runs_before_dummy(tmp_path):
+    cat = Catalog(str(tmp_path / 'c.sqlite3'))
+    cat.record_many([_row('Barbour Bedale Wax Jacket', 'https://x.com/p/1')])
+
+    class Empty(CatalogScraper):
+        name = 'live'
+        fallback = 0
+
+        async def scrape(self, query, regions=None):
+            return []
+
+    class Fake(CatalogScraper):
+        name = 'fake'
+        fallback = 2
+
+        async def scrape(self, query, regions=None):
+            raise AssertionError('should not run')
+
+    providers = [Empty(cat), CatalogScraper(cat), Fake(cat)]
+    rows, timings = asyncio.run(registry.Orchestrator().run('bedale', ['us'], providers))
+    assert [r.url for r in rows] == ['https://x.com/p/1']
+    assert set(timings) == {'live', 'catalog'}
@@ -0,0 +1,63 @@
+import gzip
+import json
+
+import pytest
+
+from starlette.requests import Request
+
+from backend.utils import encoding
+
+
+def _request(**headers):
+    raw = [(k.replace('_', '-').lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': raw, 'query_string': b''})
+
+
+def test_dumps_is_compact_utf8():
+    assert json.loads(encoding.dumps({'a': '台北', 'b': [1, 2]})) == {'a': '台北', 'b': [1, 2]}
+    assert b' ' not in encoding.dumps({'a': 1, 'b': 2})
+
+
+def test_etag_is_stable_and_matches_if_none_match():
+    etag = encoding.make_etag('rs1', {'apply_tax': True})
+    assert etag == encoding.make_etag('rs1', {'apply_tax': True})
+    assert etag != encoding.make_etag('rs1', {'apply_tax': False})
+    assert encoding.etag_matches(_request(if_none_match=f'"other", W/{etag}'), etag)
+    assert not encoding.etag_matches(_request(if_none_match='"other"'), etag)
+    assert not encoding.etag_matches(_request(), etag)
+
+
+def test_choose_encoding_honours_q_values():
+    assert encoding.choose_encoding(_request(accept_encoding='gzip, deflate'), ('gzip',)) == 'gzip'
+    assert encoding.choose_encoding(_request(accept_encoding='gzip;q=0'), ('gzip',)) is None
+    assert encoding.choose_encoding(_request(), ('gzip',)) is None
+
+
+def test_json_response_compresses_above_threshold_only():
+    body = encoding.dumps({'results': ['https://example.com/img/very/long/thumbnail.jpg'] * 100})
+    resp = encoding.json_response(_request(accept_encoding='gzip'), body, '"x"', min_size=1024)
+    if encoding.brotli is None:
+        assert resp.headers['content-encoding'] == 'gzip'
+        assert gzip.decompress(resp.body) == body
+    # each coding is its own representation with its own strong validator
+    assert resp.headers['etag'] == f'"x-{resp.headers["content-encoding"]}"'
+    assert encoding.json_response(_request(), body, '"x"').headers['etag'] == '"x"'
+
+    small = encoding.json_response(_request(accept_encoding='gzip'), b'{}', None, min_size=1024)
+    assert 'content-encoding' not in small.headers and small.body == b'{}'
+
+
+def test_json_response_caches_compressed_bodies_per_coded_etag(monkeypatch):
+    from backend.utils.cache import LRUTTLCache
+
+    cache = LRUTTLCache(ttl=60, max_entries=8)
+    body = encoding.dumps({'results': list(range(1000))})
+    first = encoding.json_response(_request(accept_encoding='gzip'), body, '"x"', cache=cache)
+    monkeypatch.setattr(encoding, 'compress', lambda *a: pytest.fail('compressed again'))
+    again = encoding.json_response(_request(accept_encoding='gzip'), body, '"x"', cache=cache)
+    assert again.body == first.body and cache.get(first.headers['etag']) == first.body
+
+    # a 304 only for the form of the ETag this request would get
+    assert encoding.revalidated(_request(accept_encoding='gzip', if_none_match='"x-gzip"'), '"x"') == '"x-gzip"'
+    assert encoding.revalidated(_request(if_none_match='"x-gzip"'), '"x"') is None
+    assert encoding.revalidated(_request(accept_encoding='gzip', if_none_match='"x"'), '"x"') == '"x"'
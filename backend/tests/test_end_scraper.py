@@ -0,0 +1,55 @@
+import os
+
+from backend.scrapers.end_playwright import extract_cards_from_html, parse_end_cards
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_extract_cards_from_saved_page():
+    cards = extract_cards_from_html(load('end_search.html'))
+    assert len(cards) == 4
+    assert cards[0]['href'] == '/gb/barbour-bedale-wax-jacket-mwx0018-sg91.html'
+    assert cards[0]['img'] == 'https://media.endclothing.com/media/bedale.jpg'
+    assert cards[0]['price'] == '£329'
+    assert cards[1]['price'] is None
+    assert '£1,249.50' in cards[1]['spans']
+
+
+def test_parse_end_cards():
+    items = parse_end_cards(extract_cards_from_html(load('end_search.html')))
+    assert [i['original_price'] for i in items] == [329.0, 1249.5, 399.0, 0.0]
+    assert [i['currency'] for i in items] == ['GBP', 'GBP', 'EUR', 'GBP']
+    assert items[0]['url'] == 'https://www.endclothing.com/gb/barbour-bedale-wax-jacket-mwx0018-sg91.html'
+    assert items[1]['url'] == 'https://www.endclothing.com/gb/barbour-ashby-wax-jacket.html'
+    assert items[2]['image'] == ''
+
+
+def test_fallback_selector_when_no_product_cards():
+    html = '<a href="/gb/product/1"><img src="a.jpg"><span>$120</span></a>'
+    items = parse_end_cards(extract_cards_from_html(html))
+    assert items == [{
+        'retailer': 'END. Clothing (UK)', 'image': 'a.jpg', 'original_price': 120.0,
+        'currency': 'USD', 'url': 'https://www.endclothing.com/gb/product/1',
+    }]
+
+
+def test_unlabelled_eur_prices_are_found():
+    html = ('<a href="/gb/product/1"><span>New</span><span>€ 245</span></a>'
+            '<a href="/gb/product/2"><span>EUR 99</span></a>')
+    items = parse_end_cards(extract_cards_from_html(html))
+    assert [(i['original_price'], i['currency']) for i in items] == [(245.0, 'EUR'), (99.0, 'EUR')]
+
+
+def test_nested_spans_keep_document_order():
+    # querySelectorAll lists the outer span first; a closing-tag order would list it last
+    html = ('<a data-test="product-card" href="/gb/x.html">'
+            '<span class="price-wrap">Now <span class="price">£120</span></span>'
+            '<span>£150</span></a>')
+    card = extract_cards_from_html(html)[0]
+    assert card['spans'] == ['Now £120', '£120', '£150']
+    assert card['price'] == 'Now £120'
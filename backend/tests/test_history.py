@@ -0,0 +1,78 @@
+import asyncio
+
+from backend.utils.history import BatchWriter, PriceHistory, normalize_url
+
+T0 = 1_700_000_040  # a multiple of the 60 s resolution
+
+
+def test_normalize_url_drops_tracking_and_noise():
+    assert normalize_url('https://WWW.Example.com/p/123/?utm_source=x&size=M&gclid=abc#reviews') == \
+        'https://example.com/p/123?size=M'
+    assert normalize_url('https://example.com/p/123') == normalize_url('https://www.example.com/p/123/')
+
+
+def test_series_is_downsampled_per_product(tmp_path):
+    store = PriceHistory(str(tmp_path / 'h.sqlite3'), resolution=60)
+    day = 86400
+    obs = [(T0 + i * 600, 'https://x.com/p/1?utm_campaign=a', 'SSENSE', 'us', 100.0 + i % 10, 'USD')
+           for i in range(1440)]  # 10 days, every 10 minutes
+    obs.append((T0, 'https://x.com/p/1', 'END.', 'gb', 80.0, 'GBP'))
+    assert store.record_many(obs) == len(obs)
+
+    products = store.products('https://www.x.com/p/1/')
+    assert sorted(p['retailer'] for p in products) == ['END.', 'SSENSE']
+    pid = next(p['id'] for p in products if p['retailer'] == 'SSENSE')
+    points = store.series(pid, T0, T0 + 10 * day, points=10)
+    assert len(points) == 10
+    assert sum(p['count'] for p in points) == 1440
+    assert all(p['min_final_twd'] <= p['avg_final_twd'] <= p['max_final_twd'] for p in points)
+
+
+def test_id_cache_reset_keeps_writing_every_product(tmp_path):
+    store = PriceHistory(str(tmp_path / 'h.sqlite3'), resolution=1, max_cached_ids=2)
+    assert store.record_many([(T0, f'https://x.com/p/{i}', 'R', 'us', 10.0, 'USD') for i in range(3)]) == 3
+    # cached and new products in one batch, with the id cache over its cap
+    batch = [(T0 + 1, f'https://x.com/p/{i}', 'R', 'us', 12.0, 'USD') for i in range(1, 6)]
+    assert store.record_many(batch) == 5
+    assert store.errors == 0 and store.written == 8
+    for i in range(6):
+        [product] = store.products(f'https://x.com/p/{i}')
+        assert len(store.series(product['id'], T0, T0 + 2)) == (2 if i in (1, 2) else 1)
+
+
+def test_writer_batches_off_the_request_path(tmp_path):
+    store = PriceHistory(str(tmp_path / 'h.sqlite3'), resolution=1)
+
+    async def run():
+        writer = BatchWriter(store, batch_size=100, flush_interval=60)
+        writer.start()
+        writer.push((1_700_000_000 + i, f'https://x.com/p/{i % 5}', 'R', 'us', 10.0, 'USD') for i in range(250))
+        assert store.written == 0  # push only queues
+        await writer.stop()  # flushes what is left
+        return writer
+
+    writer = asyncio.run(run())
+    assert store.written == 250
+    assert writer.batches == 3
+
+
+def test_history_endpoint_returns_recorded_series(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import backend.main as main
+
+    store = PriceHistory(str(tmp_path / 'h.sqlite3'))
+    monkeypatch.setattr(main, 'price_history', store)
+    monkeypatch.setattr(main, 'history_writer', BatchWriter(store, flush_interval=0.05))
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        return {'shopping_results': [{'title': 'Bedale', 'price': '$100', 'source': 'SSENSE',
+                                      'link': 'https://x.com/p/1?utm_source=google'}]}
+
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    with TestClient(main.app) as client:
+        assert client.post('/api/search', json={'q': 'Bedale', 'regions': ['us']}).status_code == 200
+    # the lifespan flushed the queue on shutdown
+    with TestClient(main.app) as client:
+        body = client.get('/api/history', params={'url': 'https://x.com/p/1'}).json()
+    assert [s['region'] for s in body['series']] == ['us']
+    assert body['series'][0]['points'][0]['min_price_twd'] == 3250
@@ -0,0 +1,181 @@
+import asyncio
+import socket
+from io import BytesIO
+from urllib.parse import urlsplit
+
+import pytest
+
+import backend.main as main
+from backend.utils.images import DiskLRU, ImageError, ImageProxy, check_url, load_secret, resolve_public
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+def _png(width=1200, height=800):
+    out = BytesIO()
+    PIL.new('RGB', (width, height), (200, 30, 30)).save(out, 'PNG')
+    return out.getvalue()
+
+
+class _Response:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.is_redirect = status_code in (301, 302, 307, 308)
+        self.read = 0
+
+    async def aiter_bytes(self):
+        for i in range(0, len(self.content), 1024):
+            self.read += 1024
+            yield self.content[i:i + 1024]
+
+
+class _Stream:
+    def __init__(self, resp):
+        self.resp = resp
+
+    async def __aenter__(self):
+        await asyncio.sleep(0.01)
+        return self.resp
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Client:
+    """Fake httpx client; records (url as requested, pinned address) per call."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+
+    def stream(self, method, target, headers=None, extensions=None, **kw):
+        parts = urlsplit(target)
+        url = f"{parts.scheme}://{headers['Host']}{parts.path}"
+        if extensions:
+            assert extensions['sni_hostname'] == headers['Host'].split(':')[0]
+        self.calls.append((url, parts.hostname))
+        return _Stream(self.routes.get(url, _Response(404)))
+
+
+async def _public(host, port):
+    return '93.184.216.34'
+
+
+def _proxy(tmp_path, client, **kw):
+    return ImageProxy(DiskLRU(str(tmp_path)), lambda: client, b'k' * 32, resolve=_public, **kw)
+
+
+def test_disk_lru_evicts_least_recently_used(tmp_path):
+    cache = DiskLRU(str(tmp_path), max_bytes=25)
+    cache.set('a', b'x' * 10)
+    cache.set('b', b'y' * 10)
+    assert cache.get('a') == b'x' * 10  # a is now the most recent
+    cache.set('c', b'z' * 10)
+    assert cache.get('b') is None and cache.get('a') and cache.get('c')
+    assert cache.stats()['evictions'] == 1 and cache.bytes == 20
+    # the index is rebuilt from the files on disk
+    assert len(DiskLRU(str(tmp_path), max_bytes=25)) == 2
+
+
+def test_proxy_fetches_once_and_serves_resized_variants(tmp_path):
+    client = _Client({
+        'https://img.example.com/a.png': _Response(302, headers={'location': '/b.png'}),
+        'https://img.example.com/b.png': _Response(200, _png()),
+        'https://img.example.com/page': _Response(200, b'<html></html>'),
+    })
+    proxy = _proxy(tmp_path, client)
+
+    async def run():
+        results = await asyncio.gather(*(proxy.get('https://img.example.com/a.png', 400, 'webp') for _ in range(5)))
+        small, _ = await proxy.get('https://img.example.com/a.png', 200, 'jpeg')
+        with pytest.raises(ImageError):
+            await proxy.get('https://img.example.com/page', 400, 'jpeg')
+        with pytest.raises(ImageError):
+            await proxy.get('https://img.example.com/page', 400, 'jpeg')
+        return results, small
+
+    results, small = asyncio.run(run())
+    data, content_type = results[0]
+    assert content_type == 'image/webp' and all(r == results[0] for r in results)
+    assert PIL.open(BytesIO(data)).size == (400, 267)
+    assert PIL.open(BytesIO(small)).size == (200, 133)
+    # one download for the image (through its redirect), one for the failed page
+    assert client.calls == [('https://img.example.com/a.png', '93.184.216.34'),
+                            ('https://img.example.com/b.png', '93.184.216.34'),
+                            ('https://img.example.com/page', '93.184.216.34')]
+    assert proxy.width_for(300) == 400 and proxy.width_for(5000) == 800
+
+
+def test_check_url_refuses_internal_hosts():
+    assert check_url('https://cdn.example.com/x.jpg')
+    for url in ('http://127.0.0.1/x', 'http://10.0.0.5/x', 'http://[::1]/x', 'http://localhost:8000/x',
+                'file:///etc/passwd', '/img?u=x'):
+        with pytest.raises(ValueError):
+            check_url(url)
+
+
+def test_proxy_rechecks_redirects_and_caps_downloads(tmp_path, monkeypatch):
+    client = _Client({
+        'https://img.example.com/r.png': _Response(302, headers={'location': 'http://metadata.example/x'}),
+        'https://img.example.com/big.png': _Response(200, _png(3000, 3000)),
+    })
+
+    async def resolve(host, port):
+        if host == 'metadata.example':
+            raise ValueError('Image host is not public')
+        return '93.184.216.34'
+
+    proxy = ImageProxy(DiskLRU(str(tmp_path)), lambda: client, b'k' * 32, resolve=resolve, max_source_bytes=4096)
+    with pytest.raises(ImageError, match='not public'):
+        asyncio.run(proxy.source('https://img.example.com/r.png'))
+    with pytest.raises(ImageError, match='too large'):
+        asyncio.run(proxy.source('https://img.example.com/big.png'))
+    # the body stopped streaming once it passed the cap
+    assert client.routes['https://img.example.com/big.png'].read <= 5 * 1024
+
+    # names are resolved and refused when any address is internal
+    async def getaddrinfo(host, port, **kw):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('93.184.216.34', port)),
+                (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('169.254.169.254', port))]
+
+    async def check():
+        monkeypatch.setattr(asyncio.get_running_loop(), 'getaddrinfo', getaddrinfo)
+        return await resolve_public('rebind.example.com', 443)
+
+    with pytest.raises(ValueError):
+        asyncio.run(check())
+
+
+def test_load_secret_is_shared(tmp_path):
+    path = str(tmp_path / 'images.key')
+    secret = load_secret(path)
+    assert len(secret) == 32 and load_secret(path) == secret
+
+
+def test_img_endpoint_and_item_urls(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    client = _Client({'https://img.example.com/a.png': _Response(200, _png())})
+    proxy = _proxy(tmp_path, client)
+    monkeypatch.setattr(main, 'image_proxy', proxy)
+    url = main.proxied_image('https://img.example.com/a.png')
+    signature = proxy.sign('https://img.example.com/a.png')
+    assert url == f'/img?u=https%3A%2F%2Fimg.example.com%2Fa.png&w=400&s={signature}'
+    with TestClient(main.app) as http:
+        resp = http.get(url, headers={'Accept': 'image/avif,image/webp,*/*'})
+        assert resp.status_code == 200 and resp.headers['content-type'] == 'image/webp'
+        assert 'immutable' in resp.headers['cache-control'] and resp.headers['vary'].startswith('Accept')
+        again = http.get(url, headers={'Accept': 'image/webp', 'If-None-Match': resp.headers['etag']})
+        assert again.status_code == 304
+        jpeg = http.get(url, headers={'Accept': 'image/*'})
+        assert jpeg.headers['content-type'] == 'image/jpeg' and jpeg.headers['etag'] != resp.headers['etag']
+        # unsigned or re-targeted URLs are refused before anything is fetched
+        assert http.get('/img', params={'u': 'https://img.example.com/b.png'}).status_code == 403
+        assert http.get('/img', params={'u': 'https://img.example.com/b.png', 's': signature}).status_code == 403
+        local = 'http://127.0.0.1/x'
+        assert http.get('/img', params={'u': local, 's': proxy.sign(local)}).status_code == 400
+        missing = 'https://img.example.com/missing.png'
+        assert http.get('/img', params={'u': missing, 's': proxy.sign(missing)}).status_code == 502
+    assert len(client.calls) == 2
@@ -0,0 +1,42 @@
+import random
+import time
+
+from backend.utils.matching import cluster_titles, title_tokens
+
+
+def test_title_tokens_drop_sizes_filler_and_retailer():
+    tokens, colours = title_tokens("BARBOUR Men's Bedale Waxed Jackets in Navy - Size UK 40 | END.", 'END.')
+    assert tokens == {'barbour', 'bedale', 'wax', 'jacket'}
+    assert colours == {'navy'}
+
+
+def test_cluster_groups_same_product_across_retailers():
+    titles = [
+        'Barbour Bedale Wax Jacket - Navy',            # 0
+        "BARBOUR Men's Bedale Waxed Jacket in Navy",   # 0
+        'Barbour Bedale Wax Jacket Sage',              # other colour
+        'Barbour Beaufort Wax Jacket Navy',            # other model
+        'Barbour Bedale Waxed Jacket Size UK 40',      # 0 (no colour given)
+        'Nike Air Max 90 White',
+        'Nike Air Max 95 White',                       # model numbers differ
+        None,
+    ]
+    labels = cluster_titles(titles, ['SSENSE', 'END.', 'Farfetch', 'SSENSE', 'END.', 'A', 'B', 'C'])
+    assert labels[0] == labels[1] == labels[4]
+    assert len({labels[0], labels[2], labels[3]}) == 3
+    assert labels[5] != labels[6]
+    assert labels[7] not in labels[:7]
+
+
+def test_cluster_scales_near_linearly():
+    rnd = random.Random(0)
+    models = [f'model{i}' for i in range(500)]
+    titles = [f"Brand {rnd.choice(models)} Jacket {rnd.choice(['', 'Waxed', 'Classic Fit'])}" for _ in range(5000)]
+    start = time.perf_counter()
+    labels = cluster_titles(titles)
+    assert time.perf_counter() - start < 2.0
+    # every title of a model lands in one cluster
+    by_model = {}
+    for t, label in zip(titles, labels):
+        by_model.setdefault(t.split()[1], set()).add(label)
+    assert all(len(v) == 1 for v in by_model.values())
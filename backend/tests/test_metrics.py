@@ -0,0 +1,54 @@
+import backend.main as main
+from backend.utils import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    reg = metrics.Registry()
+    h = metrics.Histogram('t_seconds', 'Test.', ['stage'], buckets=(0.1, 1.0), registry=reg)
+    h.labels('a').observe(0.05)
+    h.labels('a').observe(0.5)
+    h.labels('a').observe(5)
+    c = metrics.Counter('t_total', 'Test.', ['name'], registry=reg)
+    c.labels('x"y').inc(2)
+
+    text = reg.render()
+    assert '# TYPE t_seconds histogram' in text
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 't_seconds_count{stage="a"} 3' in text
+    assert 't_seconds_sum{stage="a"} 5.55' in text
+    assert 't_total{name="x\\"y"} 2' in text
+
+
+def test_collectors_run_at_scrape_time():
+    reg = metrics.Registry()
+    g = metrics.Gauge('t_size', 'Test.', registry=reg)
+    size = [3]
+    reg.add_collector(lambda: g.set(size[0]))
+    assert 't_size 3' in reg.render()
+    size[0] = 7
+    assert 't_size 7' in reg.render()
+
+
+def test_metrics_endpoint_reports_search_stages(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        return {'shopping_results': [{'title': 'Bedale', 'price': '$100', 'source': 'SSENSE', 'link': f'https://x/{gl}'}]}
+
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    with TestClient(main.app) as client:
+        assert client.post('/api/search', json={'q': 'Bedale', 'regions': ['us']}).status_code == 200
+        client.get('/no/such/page')
+        resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.headers['content-type'].startswith('text/plain')
+    text = resp.text
+    assert 'hypeprice_serpapi_region_duration_seconds_count{region="us",status="ok"}' in text
+    assert 'hypeprice_provider_duration_seconds_count{provider="serpapi",status="ok"}' in text
+    assert 'hypeprice_parse_duration_seconds_count{stage="parse_currency"}' in text
+    assert 'hypeprice_http_request_duration_seconds_count{method="POST",route="/api/search",status="200"}' in text
+    assert 'route="unmatched"' in text or 'route="/"' in text
+    assert 'hypeprice_cache_entries{cache="result_sets"}' in text
+    assert 'hypeprice_search_rows_count' in text
@@ -0,0 +1,25 @@
+import pytest
+
+from backend.utils.paging import decode_cursor, encode_cursor, top_k
+
+
+def test_top_k_pages_do_not_overlap():
+    values = [5, 3, 9, 3, 7, 1, 8]
+    key = lambda i: (values[i], i)
+    seen, after = [], None
+    while True:
+        page, after = top_k(range(len(values)), key, 3, after)
+        seen.extend(page)
+        if after is None:
+            break
+        after = decode_cursor(encode_cursor('price_asc', after), 'price_asc')
+    assert seen == sorted(range(len(values)), key=key)
+
+
+def test_cursor_is_bound_to_its_sort():
+    cursor = encode_cursor('price_asc', (100, 3))
+    assert decode_cursor(cursor, 'price_asc') == (100, 3)
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 'price_desc')
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor', 'price_asc')
@@ -35,3 +35,19 @@ def test_detect_discount_text():
     disc_text, pct, strike = parser.detect_discount(serp_item, 1000)
     assert pct == 30
     assert '30' in disc_text
+
+
+def test_parse_grouped_and_plain_numbers():
+    assert parser.parse_currency('NT$ 12,800')[3] == 12800
+    assert parser.parse_currency('¥40000')[0] == 40000.0
+
+
+def test_ambiguous_dollar_uses_row_hints():
+    row = {'price': '$ 900 sale', 'delivery': 'NT$ 60 shipping'}
+    amt, cur, assumed, twd = parser.parse_currency(row['price'], row)
+    assert (cur, assumed, twd) == ('TWD', False, 900)
+
+
+def test_parse_currency_many_matches_single():
+    rows = [('£100', None), ('$ 50 sale', {'x': 'price in TWD'}), ('80', {'x': 'USD'})]
+    assert parser.parse_currency_many(rows) == [parser.parse_currency(p, r) for p, r in rows]
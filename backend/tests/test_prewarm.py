@@ -0,0 +1,45 @@
+import asyncio
+
+from backend.utils.cache import ttl_cache
+from backend.utils.prewarm import DecayedTopK, MinuteBudget, Prewarmer
+
+
+def test_decayed_topk_prefers_recent_popularity():
+    sketch = DecayedTopK(capacity=3, half_life=10)
+    for _ in range(5):
+        sketch.observe('old', now=0)
+    for _ in range(3):
+        sketch.observe('new', now=40)
+    sketch.observe('x', now=40)
+    sketch.observe('y', now=40)  # over capacity: lowest score is evicted
+    assert len(sketch) == 3
+    assert [k for k, _ in sketch.top(1, now=40)] == ['new']
+
+
+def test_budget_caps_calls_per_minute():
+    budget = MinuteBudget(2)
+    assert budget.take() and budget.take()
+    assert not budget.take()
+
+
+def test_prewarmer_refreshes_hot_entries_within_budget():
+    calls = []
+
+    @ttl_cache(ttl=60)
+    async def fetch(query, gl='tw'):
+        calls.append((query, gl))
+        return {'q': query, 'gl': gl}
+
+    pw = Prewarmer(fetch, top_k=5, budget_per_minute=2, min_score=1)
+    for _ in range(3):
+        pw.observe('barbour bedale', ['us', 'gb', 'jp'])
+
+    async def run():
+        refreshed = await pw.run_once()
+        assert refreshed == 2
+        # freshly warmed entries are not due again
+        assert all(fetch.cache.ttl_remaining(fetch.key('barbour bedale', gl=gl)) > 50 for _, gl in calls)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert pw.stats()['skipped_budget'] == 1
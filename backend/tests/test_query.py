@@ -0,0 +1,77 @@
+import asyncio
+
+from backend.utils.cache import ttl_cache
+from backend.utils.query import QueryStats, canonical_query, query_key
+
+
+def test_canonical_query_folds_spelling_variants():
+    assert canonical_query('  Ｂａｒｂｏｕｒ  Bedale！') == 'barbour bedale'
+    assert canonical_query('barbour  bedale ') == 'barbour bedale'
+    assert canonical_query("Arc'teryx Beta-LT") == canonical_query('ARC’TERYX beta lt') == 'arcteryx beta lt'
+    assert canonical_query('始祖鳥外套') == 'arcteryx 外套'
+    assert canonical_query('ﾊﾞﾌﾞｱｰ') == 'barbour'
+    assert canonical_query('TNF Nuptse') == canonical_query('The North Face nuptse') == 'the north face nuptse'
+    assert canonical_query('New Balance 990 / 2.5kg') == 'new balance 990 2.5kg'
+
+
+def test_cache_shares_entries_across_equivalent_calls():
+    calls = []
+
+    @ttl_cache(ttl=60, key=query_key)
+    async def fetch(query, gl='tw', hl='zh-tw'):
+        calls.append((query, gl))
+        return {'q': query}
+
+    async def run():
+        await fetch('Barbour Bedale', 'us')
+        await fetch(' barbour  bedale', gl='US')
+        await fetch('barbour bedale', gl='gb')
+
+    asyncio.run(run())
+    assert calls == [('Barbour Bedale', 'us'), ('barbour bedale', 'gb')]
+    assert query_key('x', 'us') == query_key('X', gl='us', hl='zh-tw') != query_key('x', 'us', 'en')
+
+
+def test_query_stats_reports_calls_saved():
+    stats = QueryStats(ttl=60)
+    for q in ('Barbour Bedale', 'barbour bedale', 'Barbour Bedale', 'ashby'):
+        stats.observe(q, 'us')
+    st = stats.stats()
+    assert st['lookups'] == 4 and st['normalized_hits'] == 2 and st['raw_hits'] == 1
+    assert st['upstream_calls_saved'] == 1
+
+
+def test_upstream_gets_the_users_spelling(monkeypatch):
+    import backend.main as main
+    from backend.utils.prewarm import Prewarmer
+
+    sent = []
+
+    async def fake_get(params):
+        sent.append(params['q'])
+        return {'shopping_results': []}
+
+    monkeypatch.setattr(main, 'SERPAPI_KEY', 'test')
+    monkeypatch.setattr(main, '_serpapi_get', fake_get)
+
+    async def run():
+        await main.call_serpapi_cached('A-COLD-WALL* 1/2 Zip', 'us')
+        await main.call_serpapi_cached('a cold wall 1 2 zip', 'us')
+
+    asyncio.run(run())
+    # one upstream call for both spellings, sent as the user typed it
+    assert sent == ['A-COLD-WALL* 1/2 Zip']
+
+    calls = []
+
+    @ttl_cache(ttl=60, key=query_key)
+    async def fetch(query, gl='tw', hl='zh-tw'):
+        calls.append(query)
+        return {'q': query}
+
+    pw = Prewarmer(fetch, top_k=5, budget_per_minute=5, min_score=1, canonical=canonical_query)
+    pw.observe('h m jacket', ['us'])
+    pw.observe('H&M Jacket', ['us'])
+    asyncio.run(pw.run_once())
+    # refreshed with the latest spelling, not the canonical 'h m jacket'
+    assert calls == ['H&M Jacket']
@@ -0,0 +1,185 @@
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from backend.utils.quota import CallBudget, CircuitBreaker, QuotaGuard, Rejected, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _status_error(code):
+    request = httpx.Request('GET', 'https://serpapi.test/search')
+    return httpx.HTTPStatusError('err', request=request, response=httpx.Response(code, request=request))
+
+
+def _guard(threshold=3, retries=2, clock=None):
+    clock = clock or FakeClock()
+    guard = QuotaGuard(TokenBucket(rate=0, burst=1), CallBudget(), CircuitBreaker(threshold, 30, clock=clock),
+                       max_retries=retries, backoff_base=0)
+    return guard, clock
+
+
+def test_token_bucket_bursts_then_limits_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock)
+    assert bucket.reserve(0) == 0 and bucket.reserve(0) == 0
+    assert bucket.reserve(0.1) is None  # next token is 0.5 s away
+    assert bucket.reserve(1) == pytest.approx(0.5)
+    clock.t = 10
+    assert bucket.reserve(0) == 0
+
+
+def test_budget_caps_day_and_resets_next_day():
+    now = [datetime(2024, 5, 1, 12, tzinfo=timezone.utc)]
+    budget = CallBudget(daily=2, monthly=3, now=lambda: now[0])
+    assert budget.take() and budget.take() and not budget.take()
+    now[0] = datetime(2024, 5, 2, tzinfo=timezone.utc)
+    assert budget.take() and not budget.take()  # monthly cap reached
+    assert budget.stats()['used_month'] == 3
+
+
+def test_budget_is_shared_through_its_store(tmp_path):
+    now = lambda: datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+    path = str(tmp_path / 'budget.sqlite3')
+    # two workers on one host
+    a = CallBudget(daily=3, now=now, path=path)
+    b = CallBudget(daily=3, now=now, path=path)
+    assert a.take() and b.take() and a.take()
+    assert not b.take() and not a.take()
+    # a restart starts from the stored counts
+    restarted = CallBudget(daily=3, now=now, path=path)
+    assert not restarted.take()
+    assert restarted.stats()['used_today'] == 3 and restarted.stats()['used_month'] == 3
+
+
+def test_guard_spends_budget_off_the_event_loop():
+    import threading
+
+    guard, _ = _guard()
+    threads = []
+    take = guard.budget.take
+
+    def recording_take():
+        threads.append(threading.get_ident())
+        return take()
+
+    guard.budget.take = recording_take
+
+    async def ok():
+        return {'ok': True}
+
+    assert asyncio.run(guard.call(ok)) == {'ok': True}
+    assert threads and threads[0] != threading.get_ident()
+    assert guard.budget.stats()['used_today'] == 1
+
+
+def test_retries_only_retryable_statuses():
+    guard, _ = _guard()
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _status_error(503)
+        return {'ok': True}
+
+    assert asyncio.run(guard.call(flaky)) == {'ok': True}
+    assert len(calls) == 3 and guard.retries == 2
+
+    calls.clear()
+
+    async def bad_request():
+        calls.append(1)
+        raise _status_error(401)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(guard.call(bad_request))
+    assert len(calls) == 1
+    assert guard.breaker.state == 'closed'
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    guard, clock = _guard(threshold=2, retries=0)
+    calls = []
+
+    async def down():
+        calls.append(1)
+        raise httpx.ConnectTimeout('timeout')
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectTimeout):
+            asyncio.run(guard.call(down))
+    assert guard.breaker.state == 'open'
+
+    with pytest.raises(Rejected) as exc:
+        asyncio.run(guard.call(down))
+    assert exc.value.reason == 'breaker_open' and len(calls) == 2
+
+    async def up():
+        return {'ok': True}
+
+    clock.t = 31  # half-open: one trial call goes through and closes the breaker
+    assert asyncio.run(guard.call(up)) == {'ok': True}
+    assert guard.breaker.state == 'closed'
+    assert guard.stats()['rejected']['breaker_open'] == 1
+
+
+def test_hung_upstream_opens_breaker_before_callers_give_up():
+    # 8 searches over 3 regions, each cancelled at its deadline like the orchestrator does;
+    # the attempt timeout is below the deadline, so timeouts count before the cancellation
+    guard = QuotaGuard(TokenBucket(rate=0, burst=1), CallBudget(), CircuitBreaker(5, 30),
+                       max_retries=2, backoff_base=0, attempt_timeout=0.02)
+    calls = []
+
+    async def hung():
+        calls.append(1)
+        await asyncio.sleep(3600)
+
+    async def search():
+        async def region():
+            try:
+                await guard.call(hung)
+            except Rejected:
+                pass
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(region() for _ in range(3))), 0.03)
+        except asyncio.TimeoutError:
+            pass
+
+    async def searches():
+        for _ in range(8):
+            await search()
+
+    asyncio.run(searches())
+    assert guard.breaker.state == 'open'
+    # two searches' worth of attempts before the breaker opened, then none
+    assert len(calls) <= 12 and guard.rejected['breaker_open'] >= 15
+
+
+def test_serpapi_calls_are_refused_without_upstream_calls_once_open(monkeypatch):
+    import backend.main as main
+
+    guard, _ = _guard(threshold=1, retries=0)
+    calls = []
+
+    async def fake_get(params):
+        calls.append(params['gl'])
+        raise _status_error(500)
+
+    monkeypatch.setattr(main, 'SERPAPI_KEY', 'test')
+    monkeypatch.setattr(main, 'serpapi_guard', guard)
+    monkeypatch.setattr(main, '_serpapi_get', fake_get)
+    assert asyncio.run(main.call_serpapi('jacket', gl='us')) == {}
+    # refused, not answered with `{}`, so the refusal is neither cached nor mistaken for "no results"
+    with pytest.raises(Rejected, match='breaker_open'):
+        asyncio.run(main.call_serpapi('jacket', gl='gb'))
+    assert calls == ['us']
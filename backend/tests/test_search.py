@@ -0,0 +1,318 @@
+import asyncio
+import time
+
+import backend.main as main
+from backend.scrapers import registry
+from backend.scrapers.base import BaseScraper
+from backend.scrapers.serpapi import SerpApiScraper
+
+
+def test_serpapi_scraper_runs_regions_concurrently():
+    async def fake_call(query, gl='tw'):
+        await asyncio.sleep(0.2)
+        return {'shopping_results': [{'title': f'{query} {gl}', 'price': '$10'}]}
+
+    scraper = SerpApiScraper(fake_call)
+    start = time.perf_counter()
+    rows = asyncio.run(scraper.scrape('jacket', ['us', 'gb', 'jp']))
+    elapsed = time.perf_counter() - start
+
+    assert {r.region for r in rows} == {'us', 'gb', 'jp'}
+    # max of the three calls, not the sum
+    assert elapsed < 0.5
+
+
+def test_serpapi_scraper_skips_failed_region():
+    async def fake_call(query, gl='tw'):
+        if gl == 'gb':
+            raise RuntimeError('boom')
+        return {'shopping_results': [{'title': 'x', 'price': '$10'}]}
+
+    rows = asyncio.run(SerpApiScraper(fake_call).scrape('jacket', ['us', 'gb']))
+    assert [r.region for r in rows] == ['us']
+
+
+class _FakeProvider(BaseScraper):
+    def __init__(self, name, rows=(), delay=0.0, fail=False, fallback=False, timeout=1.0):
+        self.name = name
+        self.rows = list(rows)
+        self.delay = delay
+        self.fail = fail
+        self.fallback = fallback
+        self.timeout = timeout
+        self.calls = 0
+
+    async def scrape(self, query, regions=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('boom')
+        return list(self.rows)
+
+
+def test_orchestrator_timeout_only_costs_the_slow_provider():
+    fast = _FakeProvider('fast', rows=[{'key': 'a'}], delay=0.01)
+    slow = _FakeProvider('slow', rows=[{'key': 'b'}], delay=2, timeout=0.2)
+    broken = _FakeProvider('broken', fail=True)
+
+    start = time.perf_counter()
+    rows, timings = asyncio.run(registry.Orchestrator().run('q', None, [fast, slow, broken]))
+
+    assert time.perf_counter() - start < 1.0
+    assert rows == [{'key': 'a'}]
+    assert timings['fast']['status'] == 'ok' and timings['fast']['rows'] == 1
+    assert timings['slow']['status'] == 'timeout'
+    assert timings['broken']['status'] == 'error'
+
+
+def test_orchestrator_runs_fallback_only_when_primary_is_empty():
+    primary = _FakeProvider('primary', rows=[{'key': 'a'}])
+    fallback = _FakeProvider('fallback', rows=[{'key': 'f'}], fallback=True)
+    rows, timings = asyncio.run(registry.Orchestrator().run('q', None, [primary, fallback]))
+    assert rows == [{'key': 'a'}] and fallback.calls == 0 and 'fallback' not in timings
+
+    primary.rows = []
+    rows, timings = asyncio.run(registry.Orchestrator().run('q', None, [primary, fallback]))
+    assert rows == [{'key': 'f'}] and fallback.calls == 1
+
+
+def test_search_endpoint_merges_regions(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        price = {'us': '$100', 'gb': '£50'}[gl]
+        return {'shopping_results': [{'title': 'Barbour Bedale Wax Jacket', 'price': price, 'source': 'SSENSE',
+                                      'link': f'https://x/{gl}'}]}
+
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    with TestClient(main.app) as client:
+        resp = client.post('/api/search', json={'q': 'Bedale', 'regions': ['us', 'gb']})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body['providers']['serpapi']['status'] == 'ok'
+    results = body['results']
+    assert len(results) == 2
+    assert sum(1 for r in results if r['is_lowest']) == 1
+    assert body['groups'][0]['size'] == 2 and body['groups'][0]['regions'] == ['gb', 'us']
+
+
+def test_reprice_cached_result_set_without_upstream_calls(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    calls = []
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        calls.append(gl)
+        return {'shopping_results': [{'title': 'Bedale', 'price': '$100', 'source': 'SSENSE', 'link': f'https://x/{gl}'}]}
+
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    with TestClient(main.app) as client:
+        first = client.post('/api/search', json={'q': 'Bedale', 'regions': ['us']}).json()
+        assert first['results'][0]['final_price_twd'] == 3250 + 800 + int(round(4050 * 0.17))
+
+        rid = first['result_set_id']
+        resp = client.post(f'/api/search/{rid}/reprice', json={'shipping_twd': 0, 'apply_tax': False})
+        assert resp.status_code == 200
+        assert resp.json()['results'][0]['final_price_twd'] == 3250
+
+        resp = client.post(f'/api/search/{rid}/reprice', json={'origin': 'US', 'weight_lbs': 2})
+        assert resp.json()['results'][0]['shipping_twd'] == 300
+
+        assert client.post('/api/search/nope/reprice', json={}).status_code == 404
+    assert calls == ['us']
+
+
+def test_stream_emits_items_per_region_then_summary(monkeypatch):
+    import json
+    from fastapi.testclient import TestClient
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        if gl == 'gb':
+            await asyncio.sleep(0.05)
+        price = {'us': '$100', 'gb': '£50'}[gl]
+        return {'shopping_results': [{'title': 'Bedale', 'price': price, 'source': 'SSENSE', 'link': f'https://x/{gl}'}]}
+
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    with TestClient(main.app) as client:
+        with client.stream('POST', '/api/search/stream', json={'q': 'Bedale', 'regions': ['us', 'gb']}) as resp:
+            assert resp.headers['content-type'].startswith('application/x-ndjson')
+            events = [json.loads(line) for line in resp.iter_lines() if line]
+
+    types = [e['type'] for e in events]
+    assert types == ['item', 'region', 'item', 'region', 'provider', 'done']
+    assert events[-2]['provider'] == 'serpapi' and events[-2]['rows'] == 2
+    assert events[0]['item']['url'] == 'https://x/us'  # fastest region first
+    done = events[-1]
+    assert done['count'] == 2
+    assert done['lowest_key'] == 'https://x/gb'
+    assert done['min_final_price_twd'] < done['max_final_price_twd']
+
+
+def test_assemble_items_dedupes_by_key_and_marks_lowest():
+    from backend.schemas import Item, Row
+
+    rows = [
+        Row('a', 'A', 100.0, 'USD', region='us'),
+        Row('b', 'B', 80.0, 'USD', region='us'),
+        Row('a', 'A', 90.0, 'USD', region='us'),
+    ]
+    items, groups = main.assemble_items(rows)
+    # no titles: every listing is its own product, cheapest first
+    assert [(it['retailer'], it['original_price']) for it in items] == [('B', 80.0), ('A', 90.0)]
+    assert [it['is_lowest'] for it in items] == [True, True]
+    assert [g['size'] for g in groups] == [1, 1]
+    # wire dicts still satisfy the public schema
+    assert Item(**items[0]).landed_cost_estimate == items[0]['final_price_twd']
+
+
+def test_get_search_revalidates_with_etag(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        return {'shopping_results': [
+            {'title': f'Bedale {i}', 'price': '$100', 'source': 'SSENSE', 'link': f'https://x/{gl}/{i}',
+             'thumbnail': f'https://images.example.com/thumbnails/{gl}/{i}.jpg'}
+            for i in range(20)
+        ]}
+
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    with TestClient(main.app) as client:
+        first = client.get('/api/search', params={'q': 'Bedale', 'regions': 'us,gb'},
+                           headers={'Accept-Encoding': 'gzip'})
+        assert first.status_code == 200
+        assert first.headers['content-encoding'] == 'gzip'
+        assert 'serpapi;dur=' in first.headers['server-timing']
+        assert len(first.json()['results']) == 40
+        etag = first.headers['etag']
+        assert etag.endswith('-gzip"')
+
+        again = client.get('/api/search', params={'q': 'Bedale', 'regions': 'us,gb'},
+                           headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+        assert again.status_code == 304 and again.content == b''
+
+        other = client.get('/api/search', params={'q': 'Bedale', 'regions': 'us,gb', 'apply_tax': 'false'},
+                           headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+        assert other.status_code == 200 and other.headers['etag'] != etag
+
+
+def test_search_view_filters_sorts_and_pages(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        return {'shopping_results': [
+            {'title': f'Model {gl} {i}', 'price': f'${100 + 10 * i}', 'source': 'SSENSE' if i % 2 else 'END.',
+             'link': f'https://x/{gl}/{i}'}
+            for i in range(6)
+        ]}
+
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    with TestClient(main.app) as client:
+        full = client.post('/api/search', json={'q': 'Model', 'regions': ['us', 'gb']}).json()
+        assert len(full['results']) == 12 and 'next_cursor' not in full
+
+        view = {'sort': 'price_desc', 'retailer': ['ssense'], 'limit': 2}
+        first = client.post('/api/search', json={'q': 'Model', 'regions': ['us', 'gb'], 'view': view}).json()
+        assert first['total'] == 6 and len(first['results']) == 2
+        assert first['facets']['retailer'] == {'SSENSE': 6, 'End Clothing': 6}
+        assert {g['group_id'] for g in first['groups']} == {it['group_id'] for it in first['results']}
+
+        rid, pages = first['result_set_id'], [first]
+        while pages[-1]['next_cursor']:
+            pages.append(client.get(f'/api/search/{rid}/page', params={
+                'sort': 'price_desc', 'retailer': 'SSENSE', 'limit': 2, 'cursor': pages[-1]['next_cursor']}).json())
+        prices = [it['final_price_twd'] for p in pages for it in p['results']]
+        assert len(pages) == 3 and len(prices) == 6 and prices == sorted(prices, reverse=True)
+        assert all(it['retailer'] == 'SSENSE' for p in pages for it in p['results'])
+
+        # unpaged order is the recommended order
+        page = client.get(f'/api/search/{rid}/page', params={'limit': 200}).json()
+        assert [it['url'] for it in page['results']] == [it['url'] for it in full['results']]
+
+        cheap = client.get(f'/api/search/{rid}/page', params={'max_price_twd': prices[-1], 'region': 'us'}).json()
+        assert [it['url'] for it in cheap['results']] == ['https://x/us/0', 'https://x/us/1'] and cheap['total'] == 2
+
+        bad = client.get(f'/api/search/{rid}/page', params={'sort': 'price_asc', 'cursor': pages[0]['next_cursor']})
+        assert bad.status_code == 400
+
+
+def test_batch_search_shares_upstream_calls(monkeypatch):
+    import json
+    from fastapi.testclient import TestClient
+
+    calls = []
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        calls.append((query, gl))
+        await asyncio.sleep(0.01)
+        return {'shopping_results': [{'title': f'{query} jacket', 'price': '$100', 'source': 'SSENSE',
+                                      'link': f'https://x/{query}/{gl}'}]}
+
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    queries = [{'q': 'bedale', 'regions': ['us', 'gb']}, {'q': 'ashby', 'regions': ['US']},
+               {'q': 'bedale', 'regions': ['gb']}, {'q': 'bedale', 'regions': ['us', 'gb'],
+                                                    'pricing': {'shipping_twd': 0, 'apply_tax': False}}]
+    with TestClient(main.app) as client:
+        resp = client.post('/api/search/batch', json={'queries': queries})
+        assert client.post('/api/search/batch', json={'queries': []}).status_code == 400
+    assert resp.status_code == 200
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    results = {e['index']: e['search'] for e in lines if e['type'] == 'result'}
+    assert sorted(results) == [0, 1, 2, 3]
+    assert len(results[0]['results']) == 2 and results[2]['results'][0]['url'] == 'https://x/bedale/gb'
+    assert results[3]['results'][0]['final_price_twd'] == 3250
+    done = lines[-1]
+    assert done['type'] == 'done' and done['upstream']['requested'] == 6 and done['upstream']['unique'] == 3
+    assert sorted(calls) == [('ashby', 'us'), ('bedale', 'gb'), ('bedale', 'us')]
+
+
+def _batch_guard(monkeypatch, daily=0):
+    from backend.utils import quota
+
+    sent = []
+
+    async def fake_get(params):
+        sent.append((params['q'], params['gl']))
+        return {'shopping_results': [{'title': f"{params['q']} jacket", 'price': '$100', 'source': 'SSENSE',
+                                      'link': f"https://x/{params['q']}/{params['gl']}"}]}
+
+    # burst of 2 and next to no wait: an impatient caller would be refused after two calls
+    guard = quota.QuotaGuard(quota.TokenBucket(rate=100, burst=2), quota.CallBudget(daily=daily),
+                             quota.CircuitBreaker(), max_wait=0.001, patient_headroom=0.01)
+    monkeypatch.setattr(main, 'serpapi_guard', guard)
+    monkeypatch.setattr(main, 'SERPAPI_KEY', 'test')
+    monkeypatch.setattr(main, '_serpapi_get', fake_get)
+    return guard, sent
+
+
+def _post_batch(queries):
+    import json
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as client:
+        resp = client.post('/api/search/batch', json={'queries': queries})
+    return [json.loads(line) for line in resp.text.splitlines()]
+
+
+def test_batch_paces_upstream_calls_to_the_rate_limit(monkeypatch):
+    guard, sent = _batch_guard(monkeypatch)
+    queries = [{'q': f'paced {i}', 'regions': ['us', 'gb']} for i in range(6)]
+    lines = _post_batch(queries)
+    results = [e for e in lines if e['type'] == 'result']
+    assert len(results) == 6
+    # every query answered by SerpApi itself, none by the fallbacks
+    assert all(r['search']['providers']['serpapi']['rows'] == 2 for r in results)
+    assert len(sent) == 12 and guard.rejected['rate_limited'] == 0
+    assert lines[-1]['upstream']['rejected'] == 0
+
+
+def test_batch_reports_refused_calls_and_does_not_cache_them(monkeypatch):
+    guard, sent = _batch_guard(monkeypatch, daily=4)
+    queries = [{'q': f'budget {i}', 'regions': ['us', 'gb']} for i in range(6)]
+    lines = _post_batch(queries)
+    errors = [e for e in lines if e['type'] == 'error']
+    assert len([e for e in lines if e['type'] == 'result']) == 2 and len(errors) == 4
+    assert all(e['detail'] == 'SerpApi call refused: budget_exhausted' for e in errors)
+    assert len(sent) == 4 and lines[-1]['upstream']['rejected'] == 8
+    # refusals are not negatively cached: the pair is asked again once budget is back
+    refused = errors[0]['query']
+    assert main.serpapi_cache.get(main.call_serpapi_cached.key(refused, gl='us')) is None
@@ -0,0 +1,31 @@
+import json
+import subprocess
+import sys
+import os
+
+ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+
+
+def test_import_defers_optional_dependencies(tmp_path):
+    code = (
+        "import json, sys; import backend.main as m; "
+        "print(json.dumps({'loaded': [n for n in ('numpy', 'httpx', 'PIL', 'playwright') if n in sys.modules], "
+        "'startup': m.startup}))"
+    )
+    env = {**os.environ, 'HISTORY_PATH': str(tmp_path / 'h.sqlite3'), 'CATALOG_PATH': str(tmp_path / 'c.sqlite3'),
+           'WATCHLIST_PATH': str(tmp_path / 'w.sqlite3'), 'IMAGE_CACHE_PATH': str(tmp_path / 'img')}
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    assert result['loaded'] == []
+    assert result['startup']['import_ms'] > 0
+
+
+def test_health_reports_startup_and_warms_imports():
+    from fastapi.testclient import TestClient
+
+    import backend.main as main
+
+    with TestClient(main.app) as client:
+        startup = client.get('/health').json()['startup']
+        assert startup['import_ms'] > 0 and startup['lifespan_ms'] >= 0 and startup['budget_ms'] > 0
+    assert main.startup['warm_imports_ms'] is not None and 'numpy' in sys.modules
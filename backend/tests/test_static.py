@@ -0,0 +1,51 @@
+import gzip
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from backend.utils.static import FrontendFiles
+
+
+def _dist(tmp_path):
+    assets = tmp_path / 'assets'
+    assets.mkdir()
+    js = b'console.log("hype");' * 100
+    (assets / 'index-AbCd1234.js').write_bytes(js)
+    (assets / 'index-AbCd1234.js.gz').write_bytes(gzip.compress(js))
+    (tmp_path / 'index.html').write_bytes(b'<!doctype html><title>HypePrice</title>' + b' ' * 2000)
+    (tmp_path / 'favicon.svg').write_bytes(b'<svg/>')
+    return js
+
+
+def test_serves_precompressed_hashed_assets_as_immutable(tmp_path):
+    js = _dist(tmp_path)
+    client = TestClient(Starlette(routes=[Mount('/', app=FrontendFiles(str(tmp_path)))]))
+
+    resp = client.get('/assets/index-AbCd1234.js', headers={'Accept-Encoding': 'br, gzip'})
+    assert resp.headers['content-encoding'] == 'gzip' and resp.content == js
+    assert resp.headers['cache-control'] == 'public, max-age=31536000, immutable'
+    assert resp.headers['content-type'].startswith('text/javascript')
+
+    plain = client.get('/assets/index-AbCd1234.js', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in plain.headers and plain.headers['etag'] != resp.headers['etag']
+
+    again = client.get('/assets/index-AbCd1234.js', headers={'Accept-Encoding': 'gzip',
+                                                              'If-None-Match': resp.headers['etag']})
+    assert again.status_code == 304 and again.content == b''
+
+    icon = client.get('/favicon.svg')
+    assert icon.headers['cache-control'] == 'no-cache' and icon.content == b'<svg/>'
+    assert client.get('/missing.js').status_code == 404
+    assert client.post('/index.html').status_code == 405
+
+
+def test_index_is_served_from_memory(tmp_path):
+    _dist(tmp_path)
+    files = FrontendFiles(str(tmp_path))
+    (tmp_path / 'index.html').unlink()  # no disk read after start
+    client = TestClient(Starlette(routes=[Mount('/', app=files)]))
+    resp = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert resp.status_code == 200 and resp.headers['content-encoding'] == 'gzip'
+    assert resp.text.startswith('<!doctype html>') and resp.headers['cache-control'] == 'no-cache'
+    assert client.head('/').content == b''
@@ -0,0 +1,81 @@
+import asyncio
+
+import backend.main as main
+from backend.utils.watchlist import Watchlist, WatchScheduler
+
+
+class _Sink:
+    name = 'test'
+
+    def __init__(self):
+        self.alerts = []
+
+    async def send(self, alert):
+        self.alerts.append(alert)
+
+
+def test_scheduler_only_acts_on_price_changes(tmp_path):
+    store = Watchlist(str(tmp_path / 'w.sqlite3'))
+    prices = iter([5000, 5000, 4200])
+
+    async def price_fn(query, regions, pricing):
+        return {'final_price_twd': next(prices), 'title': query, 'url': 'https://x/1'}
+
+    sink = _Sink()
+    sched = WatchScheduler(store, price_fn, sink=sink, min_interval=100, max_interval=1000)
+    entry = store.add('bedale', ['us', 'gb'], target_twd=4500, interval=100)
+
+    async def run():
+        now = entry['next_check']
+        assert await sched.run_once(now) == 1  # baseline: recorded, no alert
+        first = store.get(entry['id'])
+        assert first['best_twd'] == 5000 and first['changes'] == 1 and not sink.alerts
+        assert await sched.run_once(now) == 0  # not due yet
+
+        await sched.check(first, now + 200)  # unchanged: backs off
+        second = store.get(entry['id'])
+        assert second['interval'] == 150 and second['changes'] == 1 and not sink.alerts
+
+        alert = await sched.check(second, now + 500)  # dropped below target: alert, checked sooner
+        assert alert['previous_twd'] == 5000 and alert['final_price_twd'] == 4200 and alert['below_target']
+        assert sink.alerts == [alert]
+        assert store.get(entry['id'])['interval'] == 100  # halved, down to the minimum
+
+    asyncio.run(run())
+
+
+def test_scheduler_respects_call_budget(tmp_path):
+    store = Watchlist(str(tmp_path / 'w.sqlite3'))
+    calls = []
+
+    async def price_fn(query, regions, pricing):
+        calls.append(query)
+        return None
+
+    sched = WatchScheduler(store, price_fn, budget_per_minute=4)
+    for q in ('a', 'b', 'c'):
+        store.add(q, ['us', 'gb'])
+    assert asyncio.run(sched.run_once()) == 2
+    assert sorted(calls) == ['a', 'b'] and sched.stats()['skipped_budget'] == 1
+    assert sched.stats()['failures'] == 2
+
+
+def test_watchlist_endpoints(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    async def fake_call(query, gl='tw', hl='zh-tw'):
+        return {'shopping_results': [{'title': 'Bedale', 'price': '$100', 'source': 'SSENSE', 'link': f'https://x/{gl}'}]}
+
+    store = Watchlist(str(tmp_path / 'w.sqlite3'))
+    monkeypatch.setattr(main, 'call_serpapi_cached', fake_call)
+    monkeypatch.setattr(main, 'watchlist', store)
+    monkeypatch.setattr(main, 'watch_scheduler', WatchScheduler(store, main.watch_best, sink=_Sink()))
+    with TestClient(main.app) as client:
+        watch = client.post('/api/watchlist', json={'q': 'Bedale', 'regions': ['US'], 'target_twd': 3000}).json()
+        assert watch['regions'] == ['us'] and watch['best_twd'] is None
+        checked = client.post(f"/api/watchlist/{watch['id']}/check").json()
+        assert checked['watch']['best_twd'] == 3250 + 800 + int(round(4050 * 0.17))
+        assert checked['watch']['best']['url'] == 'https://x/us' and checked['alert'] is None
+        assert [w['id'] for w in client.get('/api/watchlist').json()] == [watch['id']]
+        assert client.delete(f"/api/watchlist/{watch['id']}").status_code == 200
+        assert client.delete(f"/api/watchlist/{watch['id']}").status_code == 404
@@ -1,35 +1,300 @@
+import sys
 import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
 from functools import wraps
-from typing import Callable, Any, Dict
+from typing import Callable, Any, Dict, Optional
 
+logger = logging.getLogger('hypeprice.cache')
 
-class SimpleTTLCache:
-    def __init__(self, ttl: int = 120):
+
+def _approx_size(value: Any, _depth: int = 0) -> int:
+    """Rough recursive size in bytes of JSON-like values (dict/list/str/number)."""
+    size = sys.getsizeof(value)
+    if _depth > 6:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _approx_size(k, _depth + 1) + _approx_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            size += _approx_size(v, _depth + 1)
+    return size
+
+
+def _is_empty(value: Any) -> bool:
+    return not value
+
+
+class LRUTTLCache:
+    """Bounded LRU cache with per-entry TTL.
+
+    - at most `max_entries` entries and (approximately) `max_bytes` bytes; least recently
+      used entries are evicted first
+    - values for which `is_negative(value)` is true (e.g. the `{}` a failed upstream call
+      returns) are kept only for `negative_ttl` seconds
+    - expired entries are dropped on read and by `sweep()`, which a background task runs
+      periodically (see `start_sweeper`)
+    - all operations are guarded by a lock, so the cache can be shared between threads
+    """
+
+    def __init__(self, ttl: float = 120, max_entries: int = 1024, max_bytes: Optional[int] = 32 * 1024 * 1024,
+                 negative_ttl: float = 10, is_negative: Callable[[Any], bool] = _is_empty,
+                 sizeof: Callable[[Any], int] = _approx_size):
         self.ttl = ttl
-        self.store: Dict[str, tuple] = {}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative
+        self.sizeof = sizeof
+        # key -> (value, expires_at, size)
+        self.store: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.negative_sets = 0
+        self.coalesced = 0
 
-    def get(self, key: str):
-        entry = self.store.get(key)
-        if not entry:
-            return None
-        val, expires = entry
-        if time.time() > expires:
-            del self.store[key]
+    def _drop(self, key: str):
+        _, _, size = self.store.pop(key)
+        self.bytes -= size
+
+    def get(self, key: str, default: Any = None):
+        with self._lock:
+            entry = self.store.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            val, expires, _ = entry
+            if time.monotonic() > expires:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.store.move_to_end(key)
+            self.hits += 1
+            return val
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        negative = self.is_negative(value)
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        if ttl <= 0:
+            return
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            # never let a single oversized value flush the whole cache
+            return
+        with self._lock:
+            if key in self.store:
+                self._drop(key)
+            self.store[key] = (value, time.monotonic() + ttl, size)
+            self.bytes += size
+            if negative:
+                self.negative_sets += 1
+            while len(self.store) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+                oldest = next(iter(self.store))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        """Seconds until `key` expires (None if absent). Does not count as a hit or touch LRU order."""
+        with self._lock:
+            entry = self.store.get(key)
+        if entry is None:
             return None
-        return val
+        return entry[1] - time.monotonic()
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self.store:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self.store.clear()
+            self.bytes = 0
+
+    def sweep(self) -> int:
+        """Drop every expired entry; returns how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (_, expires, _) in self.store.items() if now > expires]
+            for k in expired:
+                self._drop(k)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def start_sweeper(self, interval: float = 30.0) -> asyncio.Task:
+        """Start a background task on the running loop that calls `sweep()` every `interval` seconds."""
+        if self._sweeper is not None and not self._sweeper.done():
+            return self._sweeper
+
+        async def _run():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception('cache sweep failed')
+
+        self._sweeper = asyncio.get_running_loop().create_task(_run())
+        return self._sweeper
+
+    async def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def __len__(self):
+        return len(self.store)
 
-    def set(self, key: str, value: Any):
-        self.store[key] = (value, time.time() + self.ttl)
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.store),
+            'bytes': self.bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'negative_sets': self.negative_sets,
+            'coalesced': self.coalesced,
+        }
 
 
-def ttl_cache(ttl: int = 120):
-    cache = SimpleTTLCache(ttl=ttl)
+# backwards-compatible name
+SimpleTTLCache = LRUTTLCache
+
+
+def ttl_cache(ttl: int = 120, l2=None, key: Optional[Callable[..., str]] = None, **cache_kwargs):
+    """Cache decorator backed by `LRUTTLCache`.
+
+    For coroutine functions, concurrent misses on the same key are coalesced: the first
+    caller runs the function and the others await its result (single-flight). The shared
+    call is cancelled if every caller waiting on it is cancelled.
+
+    `l2` is an optional persistent tier (see `disk_cache.SQLiteCache`) consulted on an
+    in-memory miss. A stale L2 entry is returned immediately and refreshed in the
+    background (stale-while-revalidate). Only used for coroutine functions.
+
+    `key(*args, **kwargs)`, if given, builds the cache key from the call's arguments (e.g.
+    a canonical form, so equivalent calls share an entry); the default joins them as text.
+
+    The cache instances are exposed as `wrapped.cache` and `wrapped.l2`; `wrapped.key(...)`
+    returns the cache key for a call and `await wrapped.refresh(...)` (coroutines only)
+    re-runs the function and stores the result regardless of what is cached.
+    """
+    cache = LRUTTLCache(ttl=ttl, **cache_kwargs)
 
     def decorator(func: Callable):
+        def make_key(args, kwargs):
+            if key is not None:
+                return key(*args, **kwargs)
+            # build a simple key from args/kwargs (not perfect but OK for our use)
+            return func.__name__ + '|' + '|'.join(map(str, args)) + '|' + str(kwargs)
+
+        if asyncio.iscoroutinefunction(func):
+            inflight: Dict[str, list] = {}
+            refreshing: set = set()
+            background: set = set()
+
+            async def store(key, result):
+                cache.set(key, result)
+                if l2 is not None and not cache.is_negative(result):
+                    await l2.aset(key, result, cache.ttl)
+
+            def schedule_refresh(key, args, kwargs):
+                if key in refreshing:
+                    return
+                refreshing.add(key)
+
+                async def _refresh():
+                    try:
+                        # another worker process may already be revalidating this key
+                        if not await l2.atry_lease(key):
+                            return
+                        result = await func(*args, **kwargs)
+                        if not cache.is_negative(result):
+                            await store(key, result)
+                            l2.refreshes += 1
+                    except Exception:
+                        logger.exception('background refresh failed for %s', key)
+                    finally:
+                        refreshing.discard(key)
+
+                task = asyncio.ensure_future(_refresh())
+                background.add(task)
+                task.add_done_callback(background.discard)
+
+            async def load(key, args, kwargs):
+                if l2 is not None:
+                    hit = await l2.aget(key)
+                    if hit is not None:
+                        value, stale, remaining = hit
+                        if stale:
+                            schedule_refresh(key, args, kwargs)
+                        else:
+                            cache.set(key, value, ttl=remaining)
+                        return value
+                result = await func(*args, **kwargs)
+                await store(key, result)
+                return result
+
+            @wraps(func)
+            async def wrapped_async(*args, **kwargs):
+                key = make_key(args, kwargs)
+                val = cache.get(key)
+                if val is not None:
+                    return val
+                entry = inflight.get(key)
+                if entry is not None:
+                    cache.coalesced += 1
+                else:
+                    fut = asyncio.ensure_future(load(key, args, kwargs))
+                    # [shared future, number of callers waiting on it]
+                    entry = inflight[key] = [fut, 0]
+                    fut.add_done_callback(lambda f, key=key: inflight.pop(key, None))
+                fut = entry[0]
+                entry[1] += 1
+                try:
+                    # shield so one cancelled waiter does not cancel the shared call...
+                    return await asyncio.shield(fut)
+                finally:
+                    entry[1] -= 1
+                    # ...but stop the upstream work once nobody is waiting for it any more
+                    if entry[1] == 0 and not fut.done():
+                        fut.cancel()
+
+            async def refresh(*args, **kwargs):
+                result = await func(*args, **kwargs)
+                # keep a good cached value rather than replacing it with a failure
+                if not cache.is_negative(result):
+                    await store(make_key(args, kwargs), result)
+                return result
+
+            wrapped_async.cache = cache
+            wrapped_async.l2 = l2
+            wrapped_async.key = lambda *args, **kwargs: make_key(args, kwargs)
+            wrapped_async.refresh = refresh
+            return wrapped_async
+
         @wraps(func)
         def wrapped(*args, **kwargs):
-            # build a simple key from args/kwargs (not perfect but OK for our use)
-            key = func.__name__ + '|' + '|'.join(map(str, args)) + '|' + str(kwargs)
+            key = make_key(args, kwargs)
             val = cache.get(key)
             if val is not None:
                 return val
@@ -37,6 +302,9 @@ def ttl_cache(ttl: int = 120):
             cache.set(key, result)
             return result
 
+        wrapped.cache = cache
+        wrapped.l2 = None
+        wrapped.key = lambda *args, **kwargs: make_key(args, kwargs)
         return wrapped
 
     return decorator
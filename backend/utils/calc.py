@@ -1,4 +1,7 @@
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, Mapping, Optional, Sequence, Union
+
+if TYPE_CHECKING:
+    import numpy as np
 
 # Fixed conversion rates (assumed for now)
 RATES = {
@@ -6,11 +9,30 @@ RATES = {
     "JPY": 0.21,
     "USD": 32.5,
     "TWD": 1.0,
+    "EUR": 34.0,
 }
 
-DEFAULT_SHIPPING_TWD =0
+DEFAULT_SHIPPING_TWD = 800
 IMPORT_TAX_RATE = 0.17  # 17%
 
+# Estimated forwarding rates in TWD per lb by origin (reference: BuyandShip pricing page),
+# same table the frontend offers in its Origin selector.
+ORIGIN_RATES = {
+    "US": 150,
+    "GB": 200,
+    "JP": 100,
+    "HK": 60,
+    "AU": 220,
+    "EU": 210,
+}
+
+# SerpApi `gl` region codes that ship from a shared origin warehouse
+REGION_ORIGINS = {
+    "uk": "GB",
+    "de": "EU", "fr": "EU", "it": "EU", "es": "EU", "nl": "EU", "be": "EU",
+    "at": "EU", "ie": "EU", "pt": "EU", "fi": "EU", "dk": "EU", "se": "EU",
+}
+
 
 def convert_to_twd(amount: float, currency: str) -> float:
     rate = RATES.get(currency.upper(), None)
@@ -35,6 +57,96 @@ def calculate_landed_cost(original_price: float, currency: str, shipping_twd: fl
     }
 
 
+def origin_for_region(region: Optional[str]) -> Optional[str]:
+    """Map a search region (Google `gl` code) to an ORIGIN_RATES key."""
+    if not region:
+        return None
+    r = region.lower()
+    return REGION_ORIGINS.get(r, r.upper())
+
+
+def _lookup(codes: Sequence[Optional[str]], table: Mapping[str, float], default: float) -> 'np.ndarray':
+    """Vectorized dict lookup: map each code to table[code.upper()] (or `default`)."""
+    import numpy as np
+    keys = np.array([(c or '').upper() for c in codes], dtype=object)
+    if keys.size == 0:
+        return np.zeros(0, dtype=np.float64)
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    values = np.array([table.get(k, default) for k in uniq], dtype=np.float64)
+    return values[inverse]
+
+
+Number = Union[int, float]
+
+
+def landed_cost_batch(
+    amounts: Sequence[Number],
+    currencies: Sequence[str],
+    origins: Optional[Sequence[Optional[str]]] = None,
+    weights_lbs: Optional[Sequence[Optional[Number]]] = None,
+    *,
+    price_twd: Optional[Sequence[Number]] = None,
+    shipping_twd: Optional[Number] = None,
+    origin_rates: Optional[Mapping[str, float]] = None,
+    default_weight_lbs: Optional[Number] = None,
+    tax_rate: float = IMPORT_TAX_RATE,
+    tax_threshold: Number = 0,
+    apply_tax: bool = True,
+) -> Dict[str, 'np.ndarray']:
+    """Landed cost in integer TWD for a whole result set at once (columnar inputs).
+
+    - price: `amounts` converted with RATES (unknown currencies are treated as USD),
+      unless `price_twd` is given already converted
+    - shipping: flat `shipping_twd` if given; otherwise, when `origin_rates` is given,
+      weight (lbs) x per-origin rate, where missing weights use `default_weight_lbs`;
+      items with no usable rate or weight fall back to DEFAULT_SHIPPING_TWD
+    - tax: `tax_rate` x (price + shipping), only for items priced at or above
+      `tax_threshold`, and only if `apply_tax`
+
+    Returns int64 arrays: price_twd, shipping_twd, tax_twd, final_price_twd.
+    """
+    # numpy is imported on first use, keeping its ~100 ms out of the cold start; the app
+    # warms it right after startup
+    import numpy as np
+    n = len(amounts) if price_twd is None else len(price_twd)
+    if price_twd is None:
+        rates = _lookup(currencies, RATES, RATES["USD"])
+        price = np.rint(np.asarray(amounts, dtype=np.float64) * rates)
+    else:
+        price = np.rint(np.asarray(price_twd, dtype=np.float64))
+
+    if shipping_twd is not None:
+        shipping = np.full(n, float(shipping_twd))
+    elif origin_rates is not None and origins is not None:
+        per_lb = _lookup(origins, origin_rates, np.nan)
+        if weights_lbs is None:
+            weights = np.full(n, np.nan)
+        else:
+            weights = np.array([np.nan if w is None else w for w in weights_lbs], dtype=np.float64)
+        if default_weight_lbs is not None:
+            weights = np.where(np.isnan(weights), float(default_weight_lbs), weights)
+        shipping = np.rint(weights * per_lb)
+        shipping = np.where(np.isnan(shipping), float(DEFAULT_SHIPPING_TWD), shipping)
+    else:
+        shipping = np.full(n, float(DEFAULT_SHIPPING_TWD))
+
+    if apply_tax:
+        tax = np.rint((price + shipping) * tax_rate)
+        tax = np.where(price >= tax_threshold, tax, 0.0)
+    else:
+        tax = np.zeros(n)
+
+    price = price.astype(np.int64)
+    shipping = shipping.astype(np.int64)
+    tax = tax.astype(np.int64)
+    return {
+        "price_twd": price,
+        "shipping_twd": shipping,
+        "tax_twd": tax,
+        "final_price_twd": price + shipping + tax,
+    }
+
+
 def normalize_price_string_to_twd(price_string: str) -> int:
     """Normalize a price string to integer TWD.
 
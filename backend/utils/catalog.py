@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from ..schemas import Row
+from .history import normalize_url
+
+logger = logging.getLogger('hypeprice.catalog')
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_query(query: str, any_word: bool = False) -> Optional[str]:
+    """FTS5 MATCH expression for a free-text query: all (or any) of its words of 3+ chars,
+    the trigram minimum, anywhere in title or retailer; None if nothing is searchable."""
+    words = [w for w in _WORD_RE.findall(query.lower()) if len(w) >= 3]
+    if not words:
+        return None
+    return (' OR ' if any_word else ' ').join('"' + w.replace('"', '') + '"' for w in dict.fromkeys(words))
+
+
+class Catalog:
+    """Every real listing seen recently, with a full-text index over title and retailer.
+
+    Stored in a local SQLite file (WAL): a `listings` table keyed by region + normalized
+    URL, and an external-content FTS5 table kept in sync by triggers. With the trigram
+    tokenizer, partial words match too ("bedal" finds "Bedale"); results are ranked with
+    BM25. Used as the fallback provider when upstream is unavailable or over budget.
+    """
+
+    def __init__(self, path: str, max_age_days: float = 30, max_entries: int = 200_000):
+        self.path = path
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.written = 0
+        self.searches = 0
+        self.errors = 0
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS listings ('
+            ' id INTEGER PRIMARY KEY,'
+            ' key TEXT NOT NULL UNIQUE,'
+            ' title TEXT NOT NULL,'
+            ' retailer TEXT NOT NULL,'
+            ' region TEXT,'
+            ' url TEXT NOT NULL,'
+            ' image TEXT,'
+            ' original_price REAL NOT NULL,'
+            ' original_price_string TEXT,'
+            ' currency TEXT NOT NULL,'
+            ' discount_text TEXT,'
+            ' discount_pct REAL,'
+            ' seen_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS listings_seen_at ON listings(seen_at)')
+        try:
+            self._create_fts(conn, 'trigram')
+        except sqlite3.OperationalError:
+            # SQLite < 3.34 has no trigram tokenizer; whole-word matching still works
+            self._create_fts(conn, 'unicode61')
+
+    @staticmethod
+    def _create_fts(conn: sqlite3.Connection, tokenizer: str):
+        conn.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5('
+            f" title, retailer, content='listings', content_rowid='id', tokenize='{tokenizer}')"
+        )
+        conn.execute(
+            'CREATE TRIGGER IF NOT EXISTS listings_ai AFTER INSERT ON listings BEGIN'
+            ' INSERT INTO listings_fts(rowid, title, retailer) VALUES (new.id, new.title, new.retailer); END'
+        )
+        conn.execute(
+            'CREATE TRIGGER IF NOT EXISTS listings_ad AFTER DELETE ON listings BEGIN'
+            " INSERT INTO listings_fts(listings_fts, rowid, title, retailer) VALUES ('delete', old.id, old.title, old.retailer); END"
+        )
+        conn.execute(
+            'CREATE TRIGGER IF NOT EXISTS listings_au AFTER UPDATE OF title, retailer ON listings BEGIN'
+            " INSERT INTO listings_fts(listings_fts, rowid, title, retailer) VALUES ('delete', old.id, old.title, old.retailer);"
+            ' INSERT INTO listings_fts(rowid, title, retailer) VALUES (new.id, new.title, new.retailer); END'
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def record_many(self, rows: Sequence[Row]) -> int:
+        """Upsert listings (rows with a title and url) in one transaction; newest sighting wins."""
+        now = time.time()
+        params = [
+            (f"{r.region or ''}|{normalize_url(r.url)}", r.title, r.retailer, r.region, r.url, r.image,
+             r.original_price, r.original_price_string, r.currency, r.discount_text, r.discount_pct, now)
+            for r in rows if r.title and r.url
+        ]
+        if not params:
+            return 0
+        try:
+            conn = self._conn()
+            conn.execute('BEGIN')
+            try:
+                conn.executemany(
+                    'INSERT INTO listings (key, title, retailer, region, url, image, original_price,'
+                    ' original_price_string, currency, discount_text, discount_pct, seen_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+                    ' ON CONFLICT(key) DO UPDATE SET title = excluded.title, retailer = excluded.retailer,'
+                    ' url = excluded.url, image = excluded.image, original_price = excluded.original_price,'
+                    ' original_price_string = excluded.original_price_string, currency = excluded.currency,'
+                    ' discount_text = excluded.discount_text, discount_pct = excluded.discount_pct,'
+                    ' seen_at = excluded.seen_at',
+                    params,
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception('catalog write failed')
+            return 0
+        self.written += len(params)
+        if self.written % 5000 < len(params):
+            self.prune()
+        return len(params)
+
+    def search(self, query: str, regions: Optional[List[str]] = None, limit: int = 40) -> List[Row]:
+        """Best BM25 matches seen within `max_age_days`, as rows carrying their `seen_at`.
+
+        Listings matching every word are preferred; only if there are none does any word do.
+        """
+        self.searches += 1
+        return self._search(fts_query(query), regions, limit) or self._search(fts_query(query, True), regions, limit)
+
+    def _search(self, match: Optional[str], regions: Optional[List[str]], limit: int) -> List[Row]:
+        if match is None:
+            return []
+        sql = (
+            'SELECT l.key, l.title, l.retailer, l.region, l.url, l.image, l.original_price,'
+            ' l.original_price_string, l.currency, l.discount_text, l.discount_pct, l.seen_at'
+            ' FROM listings_fts JOIN listings l ON l.id = listings_fts.rowid'
+            ' WHERE listings_fts MATCH ? AND l.seen_at >= ?'
+        )
+        args: List[Any] = [match, time.time() - self.max_age_days * 86400]
+        if regions:
+            sql += f" AND l.region IN ({','.join('?' * len(regions))})"
+            args.extend(regions)
+        # title matches count double the retailer's
+        sql += ' ORDER BY bm25(listings_fts, 2.0, 1.0) LIMIT ?'
+        args.append(limit)
+        try:
+            found = self._conn().execute(sql, args).fetchall()
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception('catalog search failed')
+            return []
+        return [
+            Row(key=url, title=title, retailer=retailer, region=region, url=url, image=image,
+                original_price=price, original_price_string=price_string, currency=currency,
+                discount_text=discount_text, discount_pct=discount_pct, seen_at=seen_at)
+            for _, title, retailer, region, url, image, price, price_string, currency,
+            discount_text, discount_pct, seen_at in found
+        ]
+
+    def prune(self) -> int:
+        """Drop listings older than `max_age_days` and trim to `max_entries` (oldest first)."""
+        try:
+            conn = self._conn()
+            removed = conn.execute('DELETE FROM listings WHERE seen_at < ?',
+                                   (time.time() - self.max_age_days * 86400,)).rowcount
+            removed += conn.execute(
+                'DELETE FROM listings WHERE id IN ('
+                ' SELECT id FROM listings ORDER BY seen_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            ).rowcount
+            return removed
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception('catalog prune failed')
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {'path': self.path, 'written': self.written, 'searches': self.searches, 'errors': self.errors}
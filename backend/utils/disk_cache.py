@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger('hypeprice.cache')
+
+
+class SQLiteCache:
+    """Persistent second-tier cache stored in a local SQLite file (WAL mode).
+
+    Safe to share between several uvicorn workers: every process opens its own
+    connection, WAL lets readers run alongside a writer, and refreshes of a stale
+    entry are coordinated through a short lease column so only one process
+    revalidates it at a time.
+
+    Entries are fresh until `expires_at` and may be served stale until `stale_until`.
+    """
+
+    def __init__(self, path: str, stale_ttl: float = 600, max_entries: int = 20000, lease_seconds: float = 30):
+        self.path = path
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.refreshes = 0
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' stored_at REAL NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' stale_until REAL NOT NULL,'
+            ' lease_until REAL NOT NULL DEFAULT 0)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_stale_until ON entries(stale_until)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[Any, bool, float]]:
+        """Return (value, is_stale, seconds_until_expiry) or None when missing/too old."""
+        now = time.time()
+        try:
+            row = self._conn().execute(
+                'SELECT value, expires_at, stale_until FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception('disk cache read failed')
+            return None
+        if row is None or now > row[2]:
+            self.misses += 1
+            return None
+        value = json.loads(row[0])
+        if now > row[1]:
+            self.stale_hits += 1
+            return value, True, 0.0
+        self.hits += 1
+        return value, False, row[1] - now
+
+    def set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        try:
+            self._conn().execute(
+                'INSERT OR REPLACE INTO entries (key, value, stored_at, expires_at, stale_until, lease_until)'
+                ' VALUES (?, ?, ?, ?, ?, 0)',
+                (key, json.dumps(value, ensure_ascii=False), now, now + ttl, now + ttl + self.stale_ttl),
+            )
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception('disk cache write failed')
+            return
+        self._writes += 1
+        if self._writes % 200 == 0:
+            self.prune()
+
+    def try_lease(self, key: str) -> bool:
+        """Claim the right to refresh `key` across processes; False if another holder has it."""
+        now = time.time()
+        try:
+            cur = self._conn().execute(
+                'UPDATE entries SET lease_until = ? WHERE key = ? AND lease_until < ?',
+                (now + self.lease_seconds, key, now),
+            )
+        except sqlite3.Error:
+            self.errors += 1
+            return False
+        return cur.rowcount == 1
+
+    def prune(self) -> int:
+        """Delete entries past their stale window and trim to `max_entries` (oldest first)."""
+        try:
+            conn = self._conn()
+            removed = conn.execute('DELETE FROM entries WHERE stale_until < ?', (time.time(),)).rowcount
+            removed += conn.execute(
+                'DELETE FROM entries WHERE key IN ('
+                ' SELECT key FROM entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            ).rowcount
+            return removed
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception('disk cache prune failed')
+            return 0
+
+    async def aget(self, key: str):
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: float):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    async def atry_lease(self, key: str) -> bool:
+        return await asyncio.to_thread(self.try_lease, key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'path': self.path,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'refreshes': self.refreshes,
+            'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,122 @@
+import gzip
+import json
+import hashlib
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+# optional speedups: orjson for encoding, brotli for `br` responses
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON; orjson when installed, else the stdlib encoder."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over the JSON form of `parts`."""
+    return '"' + hashlib.blake2b(dumps(parts), digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match names `etag` (weak comparison, as RFC 9110 asks)."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = (t.strip() for t in header.split(','))
+    return any((t[2:] if t.startswith('W/') else t) == etag for t in tags)
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    out = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            out[coding.strip().lower()] = q
+    return out
+
+
+def negotiate(request: Request, available: Iterable[str]) -> Optional[str]:
+    """First of the `available` content codings the client accepts; None for identity."""
+    accepted = _accepted(request.headers.get('accept-encoding', ''))
+    for coding in available:
+        if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def choose_encoding(request: Request, available: Iterable[str] = ('br', 'gzip')) -> Optional[str]:
+    """Best content coding the client accepts that can be produced here, preferring brotli;
+    None for identity."""
+    return negotiate(request, [c for c in available if c != 'br' or brotli is not None])
+
+
+def compress(body: bytes, coding: Optional[str]) -> bytes:
+    if coding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if coding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def coded_etag(etag: str, coding: Optional[str]) -> str:
+    """Strong ETag of the `coding` form of a body tagged `etag` (identity keeps `etag`):
+    differently encoded bytes must not share a strong validator."""
+    return etag[:-1] + '-' + coding + '"' if coding else etag
+
+
+def revalidated(request: Request, etag: str) -> Optional[str]:
+    """The form of `etag` named by the request's If-None-Match, if any: the coding this
+    request would be sent, or identity (bodies too small to compress)."""
+    for tag in (coded_etag(etag, choose_encoding(request)), etag):
+        if etag_matches(request, tag):
+            return tag
+    return None
+
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(status_code=304, headers={'ETag': etag, 'Vary': 'Accept-Encoding', **(headers or {})})
+
+
+def json_response(request: Request, body: bytes, etag: Optional[str] = None, min_size: int = 1024,
+                  headers: Optional[Dict[str, str]] = None, cache=None) -> Response:
+    """JSON `body` (already encoded), compressed when it is at least `min_size` bytes and
+    the client accepts br/gzip, with the given strong ETag suffixed per coding (see
+    `coded_etag`). With a `cache` (`LRUTTLCache`) and an ETag, compressed bodies are kept
+    under their coded ETag, so repeats are not compressed again."""
+    out = {'Vary': 'Accept-Encoding', **(headers or {})}
+    coding = choose_encoding(request) if len(body) >= min_size else None
+    if etag:
+        etag = coded_etag(etag, coding)
+        out['ETag'] = etag
+    if coding:
+        compressed = cache.get(etag) if cache is not None and etag else None
+        if compressed is None:
+            compressed = compress(body, coding)
+            if cache is not None and etag:
+                cache.set(etag, compressed)
+        body = compressed
+        out['Content-Encoding'] = coding
+    return Response(content=body, media_type='application/json', headers=out)
@@ -0,0 +1,260 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .calc import landed_cost_batch, origin_for_region
+
+logger = logging.getLogger('hypeprice.history')
+
+# query parameters that only identify the click, not the product
+_TRACKING_PARAMS = {'gclid', 'gclsrc', 'dclid', 'fbclid', 'msclkid', 'srsltid', 'ref', 'ref_', 'referrer',
+                    'affiliate', 'aff', 'clickid', 'mc_cid', 'mc_eid', '_ga', 'cmpid', 'campaign'}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical product URL: lower-case host, no fragment/tracking parameters/trailing slash."""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not k.lower().startswith('utm_') and k.lower() not in _TRACKING_PARAMS]
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit(((parts.scheme or 'https').lower(), host, path, urlencode(sorted(query)), ''))
+
+
+class PriceHistory:
+    """Price observations per (normalized url, retailer, region) in a local SQLite file (WAL).
+
+    Observations are stored in a WITHOUT ROWID table clustered on (product_id, ts), so a
+    series read is one index range scan regardless of the table size. Timestamps are
+    rounded down to `resolution` seconds and the latest observation in a slot wins,
+    which bounds growth when the same search is repeated.
+    """
+
+    def __init__(self, path: str, resolution: int = 300, retention_days: int = 365,
+                 max_cached_ids: int = 200_000):
+        self.path = path
+        self.max_cached_ids = max_cached_ids
+        self.resolution = max(1, resolution)
+        self.retention_days = retention_days
+        self._local = threading.local()
+        self._ids: Dict[Tuple[str, str, str], int] = {}
+        self._ids_lock = threading.Lock()
+        self.written = 0
+        self.errors = 0
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS products ('
+            ' id INTEGER PRIMARY KEY,'
+            ' url TEXT NOT NULL,'
+            ' retailer TEXT NOT NULL,'
+            " region TEXT NOT NULL DEFAULT '',"
+            ' UNIQUE (url, retailer, region))'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS observations ('
+            ' product_id INTEGER NOT NULL,'
+            ' ts INTEGER NOT NULL,'
+            ' original_price REAL NOT NULL,'
+            ' currency TEXT NOT NULL,'
+            ' price_twd INTEGER NOT NULL,'
+            ' final_price_twd INTEGER NOT NULL,'
+            ' PRIMARY KEY (product_id, ts)) WITHOUT ROWID'
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _product_ids(self, conn: sqlite3.Connection, keys: Iterable[Tuple[str, str, str]]) -> Dict[tuple, int]:
+        """Ids for `keys`, inserting products seen for the first time. Returns exactly the
+        requested keys; the shared id cache is reset once it grows past `max_cached_ids`."""
+        wanted = set(keys)
+        with self._ids_lock:
+            ids = {k: self._ids[k] for k in wanted if k in self._ids}
+        missing = [k for k in wanted if k not in ids]
+        if missing:
+            conn.executemany('INSERT OR IGNORE INTO products (url, retailer, region) VALUES (?, ?, ?)', missing)
+            for k in missing:
+                row = conn.execute('SELECT id FROM products WHERE url = ? AND retailer = ? AND region = ?', k).fetchone()
+                ids[k] = row[0]
+            with self._ids_lock:
+                if len(self._ids) + len(missing) > self.max_cached_ids:
+                    self._ids.clear()
+                self._ids.update(ids)
+        return ids
+
+    def record_many(self, observations: Sequence[Tuple[float, str, str, str, float, str]]) -> int:
+        """Store (ts, url, retailer, region, original_price, currency) tuples in one transaction.
+
+        TWD price and default landed cost are computed here in one batch, off the request path.
+        """
+        if not observations:
+            return 0
+        priced = landed_cost_batch(
+            [o[4] for o in observations],
+            [o[5] for o in observations],
+            origins=[origin_for_region(o[3] or None) for o in observations],
+        )
+        price_twd = priced['price_twd'].tolist()
+        final = priced['final_price_twd'].tolist()
+        res = self.resolution
+        keys = [(normalize_url(o[1]), o[2], o[3] or '') for o in observations]
+        try:
+            conn = self._conn()
+            conn.execute('BEGIN')
+            try:
+                ids = self._product_ids(conn, keys)
+                conn.executemany(
+                    'INSERT OR REPLACE INTO observations'
+                    ' (product_id, ts, original_price, currency, price_twd, final_price_twd)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    [(ids[k], int(o[0]) // res * res, o[4], o[5], price_twd[i], final[i])
+                     for i, (k, o) in enumerate(zip(keys, observations))],
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                with self._ids_lock:
+                    self._ids.clear()  # ids inserted in the rolled back transaction are gone
+                raise
+        except Exception:
+            self.errors += 1
+            logger.exception('price history write failed')
+            return 0
+        self.written += len(observations)
+        return len(observations)
+
+    def products(self, url: str, retailer: Optional[str] = None, region: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = 'SELECT id, url, retailer, region FROM products WHERE url = ?'
+        args: List[Any] = [normalize_url(url)]
+        if retailer:
+            sql += ' AND retailer = ?'
+            args.append(retailer)
+        if region:
+            sql += ' AND region = ?'
+            args.append(region)
+        rows = self._conn().execute(sql, args).fetchall()
+        return [{'id': r[0], 'url': r[1], 'retailer': r[2], 'region': r[3] or None} for r in rows]
+
+    def series(self, product_id: int, since: float, until: float, points: int = 100) -> List[Dict[str, Any]]:
+        """At most `points` buckets between `since` and `until` with min/avg/max landed price."""
+        since, until = int(since), int(until)
+        width = max(self.resolution, -(-(until - since) // max(1, points)))
+        rows = self._conn().execute(
+            'SELECT (ts - ?) / ? AS b, MIN(ts), MIN(final_price_twd), AVG(final_price_twd), MAX(final_price_twd),'
+            ' MIN(price_twd), COUNT(*)'
+            ' FROM observations WHERE product_id = ? AND ts BETWEEN ? AND ?'
+            ' GROUP BY b ORDER BY b',
+            (since, width, product_id, since, until),
+        ).fetchall()
+        return [
+            {'ts': since + b * width, 'first_ts': first, 'min_final_twd': lo, 'avg_final_twd': int(round(avg)),
+             'max_final_twd': hi, 'min_price_twd': price, 'count': n}
+            for b, first, lo, avg, hi, price, n in rows
+        ]
+
+    def prune(self) -> int:
+        cutoff = int(time.time()) - self.retention_days * 86400
+        try:
+            return self._conn().execute('DELETE FROM observations WHERE ts < ?', (cutoff,)).rowcount
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception('price history prune failed')
+            return 0
+
+    async def aproducts(self, url: str, retailer: Optional[str] = None, region: Optional[str] = None):
+        return await asyncio.to_thread(self.products, url, retailer, region)
+
+    async def aseries(self, product_id: int, since: float, until: float, points: int = 100):
+        return await asyncio.to_thread(self.series, product_id, since, until, points)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'path': self.path, 'written': self.written, 'errors': self.errors}
+
+
+class BatchWriter:
+    """In-memory queue of records flushed by a background task to a store with `record_many`
+    (`PriceHistory`, `catalog.Catalog`).
+
+    `push` never blocks or touches the disk: records are appended to a bounded deque
+    (oldest dropped when full) and written in batches every `flush_interval` seconds, or
+    sooner once `batch_size` are waiting.
+    """
+
+    def __init__(self, store: PriceHistory, batch_size: int = 500, flush_interval: float = 2.0,
+                 max_queue: int = 50_000):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: deque = deque(maxlen=max_queue)
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.batches = 0
+
+    def push(self, records: Iterable[Any]):
+        q = self._queue
+        for o in records:
+            if len(q) == q.maxlen:
+                self.dropped += 1
+            q.append(o)
+        if self._wake is not None and len(q) >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        written = 0
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            written += await asyncio.to_thread(self.store.record_many, batch)
+            self.batches += 1
+        return written
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('price history flush failed')
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'queued': len(self._queue), 'dropped': self.dropped, 'batches': self.batches, **self.store.stats()}
@@ -0,0 +1,469 @@
+import os
+import hmac
+import time
+import socket
+import asyncio
+import hashlib
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from . import metrics
+from .cache import LRUTTLCache
+
+# optional and imported on first use (see `pillow`): without Pillow the proxy still caches
+# and serves the original images, unresized
+_pil = None
+
+logger = logging.getLogger('hypeprice.images')
+
+IMAGE_REQUESTS = metrics.Counter('hypeprice_image_requests_total', 'Image proxy requests.', ['outcome'])
+IMAGE_FETCH_DURATION = metrics.Histogram('hypeprice_image_fetch_duration_seconds',
+                                         'Origin image downloads.', ['status'])
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif',
+                 'avif': 'image/avif'}
+
+
+class ImageError(Exception):
+    """The image could not be fetched or decoded."""
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """Image format from the magic bytes (CONTENT_TYPES key), or None if `data` is no known image."""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'avif'
+    return None
+
+
+def pillow():
+    """(PIL.Image, PIL.ImageOps), imported on first use so startup does not pay for them;
+    None without Pillow."""
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image, ImageOps
+            _pil = (Image, ImageOps)
+        except ImportError:  # pragma: no cover - depends on the environment
+            _pil = False
+    return _pil or None
+
+
+def webp_supported() -> bool:
+    pil = pillow()
+    return pil is not None and 'WEBP' in pil[0].SAVE
+
+
+def check_url(url: str) -> str:
+    """`url` if the proxy may fetch it: http(s) with a host that is not obviously internal.
+    Raises ValueError otherwise.
+
+    Literal loopback, private and link-local addresses and `localhost` are refused here;
+    host names are resolved and checked by `resolve_public` before every connection.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if parts.scheme not in ('http', 'https') or not host:
+        raise ValueError('Only absolute http(s) image URLs can be proxied')
+    if host == 'localhost' or host.endswith('.localhost') or host.endswith('.internal'):
+        raise ValueError('Image host is not public')
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return url
+    if not ip.is_global:
+        raise ValueError('Image host is not public')
+    return url
+
+
+async def resolve_public(host: str, port: int) -> str:
+    """An address of `host` to connect to; ValueError unless every address it resolves
+    to is global (a name with one internal address could be made to use it)."""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as exc:
+        raise ImageError(f'Cannot resolve {host}: {exc}') from None
+    addresses = [info[4][0] for info in infos]
+    if not addresses:
+        raise ImageError(f'Cannot resolve {host}')
+    for address in addresses:
+        # scoped IPv6 addresses come back as 'fe80::1%eth0'
+        if not ipaddress.ip_address(address.split('%', 1)[0]).is_global:
+            raise ValueError('Image host is not public')
+    return addresses[0]
+
+
+def pinned(url: str, address: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """(url, headers, extensions) requesting `url` from `address`: the IP replaces the
+    host in the URL, while the Host header and the TLS server name (and so certificate
+    verification) keep the original host."""
+    parts = urlsplit(url)
+    host = f'[{address}]' if ':' in address else address
+    netloc = host if parts.port is None else f'{host}:{parts.port}'
+    host_header = parts.hostname if parts.port is None else f'{parts.hostname}:{parts.port}'
+    extensions = {'sni_hostname': parts.hostname} if parts.scheme == 'https' else {}
+    return (urlunsplit((parts.scheme, netloc, parts.path or '/', parts.query, '')),
+            {'Host': host_header}, extensions)
+
+
+def sign(secret: bytes, url: str) -> str:
+    """Signature of an image URL for `/img` (see `ImageProxy.verify`)."""
+    return hmac.new(secret, url.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def load_secret(path: str) -> bytes:
+    """Signing key kept at `path`, created on first use; every worker sharing the file
+    (and every restart) signs and verifies with the same key."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    # written in full under a temp name and linked into place, so a worker racing us
+    # either wins (and we read its key) or sees no file; never a partial one
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        os.chmod(tmp, 0o600)
+        f.write(os.urandom(32))
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def render(data: bytes, width: int, fmt: str, quality: int = 80) -> bytes:
+    """`data` scaled down to at most `width` pixels wide (never up) and encoded as `fmt`
+    ('webp' or 'jpeg'); the first frame of animations, EXIF orientation applied."""
+    Image, ImageOps = pillow()
+    try:
+        with Image.open(BytesIO(data)) as im:
+            # JPEG decoders can scale by 1/2..1/8 while decoding, far cheaper than resizing after
+            im.draft('RGB', (width, width * 4))
+            im.seek(0)
+            im = ImageOps.exif_transpose(im)
+            if im.width > width:
+                im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS, reducing_gap=3.0)
+            out = BytesIO()
+            if fmt == 'webp':
+                im = im.convert('RGBA' if 'A' in im.getbands() or 'transparency' in im.info else 'RGB')
+                im.save(out, 'WEBP', quality=quality, method=4)
+            else:
+                if 'A' in im.getbands() or 'transparency' in im.info:
+                    rgba = im.convert('RGBA')
+                    im = Image.new('RGB', rgba.size, (255, 255, 255))
+                    im.paste(rgba, mask=rgba.getchannel('A'))
+                im.convert('RGB').save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+            return out.getvalue()
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise ImageError(f'Undecodable image: {exc}') from None
+
+
+class DiskLRU:
+    """Size-capped directory of cached files, evicted least recently used first.
+
+    Files are named by a hash of their key and written atomically (temp file + rename).
+    The LRU order is kept in memory, rebuilt from file mtimes at start; reads refresh
+    the mtime so the order survives restarts. All methods are blocking file I/O: call
+    them from a thread (`asyncio.to_thread`) on the event loop.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # file name -> size, least recently used first
+        self._index: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith('.tmp'):
+                # left over from an interrupted write
+                self._remove(entry.name)
+                continue
+            st = entry.stat()
+            found.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(found):
+            self._index[name] = size
+            self.bytes += size
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=20).hexdigest()
+
+    def _remove(self, name: str):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            self._remove(name)
+
+    def get(self, key: str) -> Optional[bytes]:
+        name = self._name(key)
+        with self._lock:
+            if name not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                size = self._index.pop(name, None)
+                if size is not None:
+                    self.bytes -= size
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def set(self, key: str, data: bytes):
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            logger.exception('image cache write failed')
+            self._remove(os.path.basename(tmp))
+            return
+        with self._lock:
+            self.bytes += len(data) - self._index.pop(name, 0)
+            self._index[name] = len(data)
+            self._evict()
+
+    def __len__(self):
+        return len(self._index)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': len(self._index),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': 0,
+        }
+
+
+class ImageProxy:
+    """Fetch remote images once and serve resized variants from a `DiskLRU`.
+
+    The original download is cached under its URL and every (width, format) variant
+    under its own key, so a new width re-renders from disk instead of the origin.
+    Concurrent requests for the same source or variant share one download/render (single
+    flight), at most `concurrency` origin downloads run at a time, and failed URLs are
+    remembered for `failure_ttl` seconds so a broken thumbnail is not re-fetched by every
+    card that shows it.
+
+    Only URLs signed with `secret` (see `sign`; `main.proxied_image` signs the ones it
+    puts in results) are served, so the proxy cannot be used to fetch arbitrary URLs.
+    Every connection, redirects included, goes to an address `resolve` checked to be
+    public, and downloads stop as soon as they pass `max_source_bytes`.
+
+    `client` is a callable returning an `httpx.AsyncClient`; it should not keep
+    connections alive, since a pooled connection is matched by IP only and would be
+    reused for another host name. Widths are rounded up to one of `widths` to bound
+    the number of variants per image.
+    """
+
+    def __init__(self, cache: DiskLRU, client: Callable[[], Any], secret: bytes, concurrency: int = 8,
+                 widths: Sequence[int] = (200, 400, 800), quality: int = 80,
+                 max_source_bytes: int = 8 * 1024 * 1024, timeout: float = 10.0,
+                 max_redirects: int = 3, failure_ttl: float = 300,
+                 resolve: Callable[[str, int], Awaitable[str]] = resolve_public):
+        self.cache = cache
+        self.client = client
+        self.secret = secret
+        self.resolve = resolve
+        self.widths = tuple(sorted(widths))
+        self.quality = quality
+        self.max_source_bytes = max_source_bytes
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._sem = asyncio.Semaphore(concurrency)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._failed = LRUTTLCache(ttl=failure_ttl, max_entries=4096, max_bytes=None, negative_ttl=failure_ttl)
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def sign(self, url: str) -> str:
+        return sign(self.secret, url)
+
+    def verify(self, url: str, signature: Optional[str]) -> bool:
+        return bool(signature) and hmac.compare_digest(self.sign(url), signature)
+
+    def width_for(self, width: int) -> int:
+        return next((w for w in self.widths if w >= width), self.widths[-1])
+
+    def variant_format(self, accept: str) -> Optional[str]:
+        """Format variants are rendered in for a client's `Accept` header; None while
+        images cannot be resized (originals are served)."""
+        if pillow() is None:
+            return None
+        return 'webp' if 'image/webp' in (accept or '') and webp_supported() else 'jpeg'
+
+    async def _once(self, key: str, make: Callable[[], Awaitable[bytes]]) -> bytes:
+        # the work runs as its own task: a client that disconnects does not cancel a
+        # download or render other requests (or the next view) are waiting for
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(make())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # retrieved here so a failure nobody waited for is not logged as unhandled
+            task.exception()
+
+    async def _fetch(self, url: str) -> Tuple[int, Optional[str], bytes]:
+        """(status, redirect location, body) of one request, made to a checked address."""
+        parts = urlsplit(check_url(url))
+        address = await self.resolve(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        target, headers, extensions = pinned(url, address)
+        headers['Accept'] = 'image/avif,image/webp,image/*;q=0.8'
+        async with self.client().stream('GET', target, headers=headers, extensions=extensions,
+                                        timeout=self.timeout, follow_redirects=False) as resp:
+            if resp.is_redirect:
+                return resp.status_code, resp.headers.get('location'), b''
+            if resp.status_code != 200:
+                return resp.status_code, None, b''
+            length = resp.headers.get('content-length')
+            if length and length.isdigit() and int(length) > self.max_source_bytes:
+                raise ImageError('Image too large')
+            chunks = []
+            size = 0
+            async for chunk in resp.aiter_bytes():
+                size += len(chunk)
+                if size > self.max_source_bytes:
+                    raise ImageError('Image too large')
+                chunks.append(chunk)
+            return 200, None, b''.join(chunks)
+
+    async def _download(self, url: str) -> bytes:
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            async with self._sem:
+                for _ in range(self.max_redirects + 1):
+                    code, location, data = await self._fetch(url)
+                    if location is None:
+                        break
+                    url = urljoin(url, location)
+                else:
+                    raise ImageError('Too many redirects')
+            if code != 200:
+                status = str(code)
+                raise ImageError(f'Origin answered {code}')
+            if sniff_format(data) is None:
+                raise ImageError('Not an image')
+            status = 'ok'
+            return data
+        except ValueError as exc:
+            raise ImageError(str(exc)) from None
+        except Exception as exc:
+            if isinstance(exc, ImageError):
+                raise
+            raise ImageError(f'Fetch failed: {exc!r}') from None
+        finally:
+            IMAGE_FETCH_DURATION.labels(status).observe(time.perf_counter() - start)
+
+    async def source(self, url: str) -> bytes:
+        """Original image bytes, downloaded at most once while cached."""
+        key = 'src|' + url
+        data = await asyncio.to_thread(self.cache.get, key)
+        if data is not None:
+            return data
+        failure = self._failed.get(url)
+        if failure is not None:
+            raise ImageError(failure)
+
+        async def fetch():
+            self.fetches += 1
+            try:
+                data = await self._download(url)
+            except ImageError as exc:
+                self.fetch_errors += 1
+                self._failed.set(url, str(exc))
+                raise
+            await asyncio.to_thread(self.cache.set, key, data)
+            return data
+
+        return await self._once(key, fetch)
+
+    async def get(self, url: str, width: int, fmt: Optional[str]) -> Tuple[bytes, str]:
+        """(image bytes, content type) of `url` scaled to `width` in `fmt` (see
+        `variant_format`); raises ValueError for URLs that may not be proxied and
+        ImageError when the image cannot be fetched or decoded."""
+        check_url(url)
+        if fmt is None:
+            data = await self.source(url)
+            IMAGE_REQUESTS.labels('original').inc()
+            return data, CONTENT_TYPES[sniff_format(data)]
+        key = f'{fmt}|{width}|{url}'
+        data = await asyncio.to_thread(self.cache.get, key)
+        if data is not None:
+            IMAGE_REQUESTS.labels('hit').inc()
+            return data, CONTENT_TYPES[fmt]
+
+        async def make():
+            data = await asyncio.to_thread(render, await self.source(url), width, fmt, self.quality)
+            await asyncio.to_thread(self.cache.set, key, data)
+            return data
+
+        try:
+            data = await self._once(key, make)
+        except ImageError:
+            IMAGE_REQUESTS.labels('error').inc()
+            raise
+        IMAGE_REQUESTS.labels('miss').inc()
+        return data, CONTENT_TYPES[fmt]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'cache': self.cache.stats(),
+            'fetches': self.fetches,
+            'fetch_errors': self.fetch_errors,
+            'in_flight': len(self._inflight),
+            'resize': pillow() is not None,
+            'webp': webp_supported(),
+        }
@@ -0,0 +1,125 @@
+import re
+import math
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+# words that describe the listing, not the product
+_STOPWORDS = {
+    'the', 'a', 'an', 'and', 'in', 'with', 'for', 'of', 'by', 'on', 'to', 'at', 'from',
+    'men', 'mens', 'man', 'women', 'womens', 'woman', 'unisex', 'kids',
+    'new', 'sale', 'free', 'shipping', 'delivery', 'authentic', 'genuine', 'official', 'online', 'shop',
+    'size', 'sizes', 'colour', 'color', 'col',
+}
+# size markers; a number right after one of these is a size, not a model number
+_SIZE_MARKERS = {'uk', 'eu', 'us', 'it', 'fr', 'jp', 'w', 'l', 'size'}
+_SIZES = {'xxs', 'xs', 's', 'm', 'l', 'xl', 'xxl', 'xxxl', '2xl', '3xl', '4xl', 'os', 'one'}
+_COLOURS = {
+    'black': 'black', 'white': 'white', 'navy': 'navy', 'blue': 'blue', 'red': 'red', 'green': 'green',
+    'olive': 'olive', 'sage': 'sage', 'khaki': 'khaki', 'brown': 'brown', 'tan': 'tan', 'beige': 'beige',
+    'stone': 'stone', 'sand': 'sand', 'cream': 'cream', 'ecru': 'ecru', 'ivory': 'ivory', 'grey': 'grey',
+    'gray': 'grey', 'charcoal': 'charcoal', 'pink': 'pink', 'purple': 'purple', 'yellow': 'yellow',
+    'orange': 'orange', 'burgundy': 'burgundy', 'rustic': 'rustic', 'camel': 'camel',
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+
+
+def _stem(tok: str) -> str:
+    # just enough to equate "waxed"/"wax" and "jackets"/"jacket"
+    if len(tok) > 4 and tok.endswith('ed') and not tok[-3].isdigit():
+        return tok[:-2]
+    if len(tok) > 3 and tok.endswith('s') and not tok.endswith('ss') and not tok[-2].isdigit():
+        return tok[:-1]
+    return tok
+
+
+@lru_cache(maxsize=8192)
+def title_tokens(title: str, retailer: str = '') -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """(identity tokens, colours) of a listing title.
+
+    Brand and model words become identity tokens; sizes, filler words and the retailer's
+    own name are dropped; colours are returned separately so that differently coloured
+    variants of one model are kept apart.
+    """
+    text = unicodedata.normalize('NFKD', title or '').encode('ascii', 'ignore').decode('ascii').lower()
+    text = text.replace("'s", '').replace("'", '')
+    own = set(_TOKEN_RE.findall(retailer.lower())) if retailer else set()
+    tokens = set()
+    colours = set()
+    prev = ''
+    for tok in _TOKEN_RE.findall(text):
+        if tok in _COLOURS:
+            colours.add(_COLOURS[tok])
+        elif tok in _SIZES or (prev in _SIZE_MARKERS and tok[0].isdigit()):
+            pass
+        elif tok in _STOPWORDS or tok in _SIZE_MARKERS or tok in own:
+            pass
+        else:
+            tokens.add(_stem(tok))
+        prev = tok
+    return frozenset(tokens), frozenset(colours)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_titles(titles: Sequence[Optional[str]], retailers: Sequence[str] = (),
+                   threshold: float = 0.8, max_block: int = 64) -> List[int]:
+    """Group listings of the same product; returns a cluster label per title.
+
+    Two listings match when the IDF-weighted share of the smaller title's tokens that
+    the other title also has is at least `threshold` (so extra descriptive words in a
+    longer title do not prevent a match, but a different model name does) and their
+    colours do not conflict.
+
+    Candidates come from a token inverted index: each listing is only compared with
+    earlier listings sharing one of its discriminative tokens (in at most `max_block`
+    titles; a common token carries little weight, so a match needs the rare ones) and
+    each posting list is read up to `max_block` entries, so the cost stays near-linear
+    instead of O(n^2).
+    """
+    n = len(titles)
+    retailers = list(retailers) or [''] * n
+    parsed = [title_tokens(t or '', r or '') for t, r in zip(titles, retailers)]
+    df: Dict[str, int] = defaultdict(int)
+    for toks, _ in parsed:
+        for t in toks:
+            df[t] += 1
+    idf = {t: math.log((n + 1) / c) + 0.1 for t, c in df.items()}
+    weights = [sum(idf[t] for t in toks) for toks, _ in parsed]
+
+    index: Dict[str, List[int]] = defaultdict(list)
+    parent = list(range(n))
+    # colours seen in each cluster (by root), so an uncoloured listing cannot chain two colours
+    cluster_colours = [c for _, c in parsed]
+    for i, (toks, _) in enumerate(parsed):
+        if len(toks) < 2:
+            continue  # too little to go on (missing or one-word title): stays on its own
+        # only discriminative tokens open candidates; if there are none, the rarest one does
+        keys = [t for t in toks if df[t] <= max_block] or [min(toks, key=lambda t: (df[t], t))]
+        seen = set()
+        for t in keys:
+            for j in index[t][:max_block]:
+                if j in seen:
+                    continue
+                seen.add(j)
+                ri, rj = _find(parent, i), _find(parent, j)
+                if ri == rj:
+                    continue
+                ci, cj = cluster_colours[ri], cluster_colours[rj]
+                if ci and cj and not (ci & cj):
+                    continue
+                common = toks & parsed[j][0]
+                if len(common) >= 2 and sum(idf[x] for x in common) >= threshold * min(weights[i], weights[j]):
+                    parent[ri] = rj
+                    cluster_colours[rj] = ci | cj
+        for t in toks:
+            index[t].append(i)
+
+    labels: Dict[int, int] = {}
+    return [labels.setdefault(_find(parent, i), len(labels)) for i in range(n)]
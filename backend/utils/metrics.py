@@ -0,0 +1,228 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# seconds; spans a cached lookup (~1 ms) to a slow upstream call (~15 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _num(v: float) -> str:
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), registry: Optional['Registry'] = None):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values: str):
+        """Child for one label combination; hold on to it on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels(*())
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        return [f'{name}{_labels(labelnames, values)} {_num(self.value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def set(self, value: float):
+        """For collectors mirroring a counter kept elsewhere."""
+        self._default().set(value)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, values):
+        lines = []
+        total = 0
+        for bound, n in zip(self.bounds + (float('inf'),), self.counts):
+            total += n
+            le = 'le="' + _num(bound) + '"'
+            lines.append(f'{name}_bucket{_labels(labelnames, values, le)} {total}')
+        lines.append(f'{name}_sum{_labels(labelnames, values)} {_num(self.sum)}')
+        lines.append(f'{name}_count{_labels(labelnames, values)} {total}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS, registry: Optional['Registry'] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    """Metrics in the Prometheus text format (version 0.0.4).
+
+    Values are plain counters updated in place, so recording costs a lock and an
+    addition; `collectors` are called at scrape time to copy in stats kept elsewhere
+    (cache sizes, breaker state), so those cost nothing between scrapes.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, fn: Callable[[], None]):
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            fn()
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_IN_FLIGHT = Gauge('hypeprice_http_requests_in_flight', 'HTTP requests being served.')
+HTTP_DURATION = Histogram('hypeprice_http_request_duration_seconds',
+                          'Time to serve an HTTP request, body included.', ['method', 'route', 'status'])
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording in-flight requests and latency per route template.
+
+    The route is read from the scope after routing (`/api/history`, not the full URL),
+    so the label set stays bounded; requests that matched no route share `unmatched`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get('route')
+            path = (getattr(route, 'path', None) or '/') if route is not None else 'unmatched'
+            HTTP_DURATION.labels(scope['method'], path, str(status[0])).observe(time.perf_counter() - start)
@@ -0,0 +1,44 @@
+import base64
+import heapq
+import json
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+SORTS = ('recommended', 'price_asc', 'price_desc', 'discount')
+
+
+def encode_cursor(sort: str, key: Sequence[Any]) -> str:
+    """Opaque keyset cursor: the sort and the sort key of the last item of a page."""
+    raw = json.dumps([sort, list(key)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, ...]:
+    """Sort key stored in `cursor`; ValueError if it is malformed or made for another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Malformed cursor')
+    if cursor_sort != sort:
+        raise ValueError('Cursor was made for another sort order')
+    if not isinstance(key, list) or not all(isinstance(k, (int, float)) for k in key):
+        raise ValueError('Malformed cursor')
+    return tuple(key)
+
+
+def top_k(candidates: Iterable[int], key: Callable[[int], Tuple[Any, ...]], limit: int,
+          after: Optional[Tuple[Any, ...]] = None) -> Tuple[List[int], Optional[Tuple[Any, ...]]]:
+    """The `limit` smallest candidates by `key` that sort after `after`, and the key to
+    continue from (None on the last page).
+
+    Keys must be unique (end them with the row index) so pages never overlap or skip.
+    A bounded heap keeps this O(n log limit) whatever the page depth; nothing is sorted
+    beyond the page itself.
+    """
+    if after is not None:
+        candidates = (i for i in candidates if key(i) > after)
+    page = heapq.nsmallest(limit + 1, candidates, key=key)
+    if len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    return page, key(page[-1])
@@ -1,92 +1,135 @@
 import re
-from typing import Dict, Optional, Tuple
-
-# conversion multipliers (matches main rates)
-RATES = {
-    'GBP': 41.5,
-    'JPY': 0.21,
-    'USD': 32.5,
-    'TWD': 1.0,
-}
-
-
-def _extract_number(text: str) -> float:
-    num_re = re.compile(r'([0-9]{1,3}(?:,[0-9]{3})*(?:\.[0-9]+)?|[0-9]+(?:\.[0-9]+)?)')
-    m = num_re.search(text)
-    if not m:
-        return 0.0
-    return float(m.group(1).replace(',', ''))
-
-
-def parse_currency(price_str: str, serp_result: Optional[Dict] = None) -> Tuple[float, str, bool, int]:
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .calc import RATES
+
+
+# Single-pass tokenizer: every currency marker and the first number in one scan.
+# When several markers appear, _PRIORITY decides (TWD > GBP > EUR > JPY > USD > bare $);
+# multi-character markers come before the bare `$` so `NT$`/`US$`/`HK$` win over it.
+_TOKEN_RE = re.compile(
+    r'(?P<TWD>NT\$|HK\$|\bNT\b|\bTWD\b)'
+    r'|(?P<USD>US\$|\bUSD\b)'
+    r'|(?P<GBP>£|\bGBP\b)'
+    r'|(?P<EUR>€|\bEUR\b)'
+    r'|(?P<JPY>¥|\bJPY\b)'
+    r'|(?P<DOLLAR>\$)'
+    r'|(?P<NUM>[0-9]{1,3}(?:,[0-9]{3})+(?:\.[0-9]+)?|[0-9]+(?:\.[0-9]+)?)',
+    re.IGNORECASE,
+)
+_PRIORITY = {'TWD': 0, 'GBP': 1, 'EUR': 2, 'JPY': 3, 'USD': 4, 'DOLLAR': 5}
+_PLAIN_DOLLAR_RE = re.compile(r'\$\s*[0-9,]+(?:\.[0-9]+)?')
+# the lookahead lets the engine skip positions that cannot start a marker
+_HINT_RE = re.compile(r'(?=[NTUntu])(?:(?P<TWD>NT\$|\bTWD\b|\bNT\b)|(?P<USD>US\$|\bUSD\b))', re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def _classify(text: str) -> Tuple[float, Optional[str], bool]:
+    """Scan `text` once. Returns (amount, marker, plain_dollar) where marker is the
+    highest-priority currency marker found (or None) and plain_dollar tells whether the
+    whole string is just `$<number>`."""
+    amount = None
+    marker = None
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == 'NUM':
+            if amount is None:
+                amount = float(m.group().replace(',', ''))
+        elif marker is None or _PRIORITY[kind] < _PRIORITY[marker]:
+            marker = kind
+    plain_dollar = marker == 'DOLLAR' and _PLAIN_DOLLAR_RE.fullmatch(text) is not None
+    return (amount or 0.0), marker, plain_dollar
+
+
+class RowHints:
+    """Currency hints (mentions TWD / mentions USD) taken from all string fields of a
+    SerpApi row. Computed lazily, at most once per row, and only if a price string
+    is ambiguous; share one instance between every parse of the same row."""
+
+    __slots__ = ('_row', '_flags')
+
+    def __init__(self, serp_result: Optional[Dict]):
+        self._row = serp_result
+        self._flags = None
+
+    @property
+    def flags(self) -> Tuple[bool, bool]:
+        if self._flags is None:
+            twd = usd = False
+            if self._row:
+                combined = ' '.join([v for v in self._row.values() if isinstance(v, str)])
+                upper = combined.upper()
+                # cheap substring prefilter before running the regex
+                if 'NT' not in upper and 'TWD' not in upper and 'US' not in upper:
+                    combined = ''
+                for m in _HINT_RE.finditer(combined):
+                    if m.lastgroup == 'TWD':
+                        twd = True
+                    else:
+                        usd = True
+                    if twd and usd:
+                        break
+            self._flags = (twd, usd)
+        return self._flags
+
+
+def _to_twd(amt: float, currency: str) -> int:
+    return int(round(amt * RATES[currency]))
+
+
+def parse_currency(price_str: str, serp_result: Optional[Dict] = None,
+                   hints: Optional[RowHints] = None) -> Tuple[float, str, bool, int]:
     """Strict deterministic parser.
 
+    `hints` may be passed (see `RowHints`) to share the scan of `serp_result` between
+    every price field of the same row.
+
     Returns: (amount, currency_code, assumed_usd_flag, price_twd_int)
     """
-    s = (price_str or '')
-    text = s.strip()
-    assumed = False
+    text = (price_str or '').strip()
+    amt, marker, plain_dollar = _classify(text)
 
-    # 1) TWD / NT / HK$
-    if re.search(r'(NT\$|\bNT\b|\bTWD\b|HK\$)', text, flags=re.IGNORECASE):
-        amt = _extract_number(text)
-        return amt, 'TWD', False, int(round(amt))
+    if marker is not None and marker != 'DOLLAR':
+        return amt, marker, False, _to_twd(amt, marker)
 
-    # 2) GBP
-    if re.search(r'(£|\bGBP\b)', text, flags=re.IGNORECASE):
-        amt = _extract_number(text)
-        return amt, 'GBP', False, int(round(amt * RATES['GBP']))
-
-    # 3) EUR
-    if re.search(r'(€|\bEUR\b)', text, flags=re.IGNORECASE):
-        amt = _extract_number(text)
-        return amt, 'EUR', False, int(round(amt * 34.0))
-
-    # 4) JPY
-    if re.search(r'(¥|\bJPY\b)', text, flags=re.IGNORECASE):
-        amt = _extract_number(text)
-        return amt, 'JPY', False, int(round(amt * RATES['JPY']))
-
-    # 5) USD explicit
-    if re.search(r'(US\$|\bUSD\b)', text, flags=re.IGNORECASE):
-        amt = _extract_number(text)
-        return amt, 'USD', False, int(round(amt * RATES['USD']))
-
-    # 6) ambiguous $
-    if '$' in text:
-        if re.fullmatch(r'\$\s*[0-9,]+(?:\.[0-9]+)?', text):
-            amt = _extract_number(text)
-            return amt, 'USD', True, int(round(amt * RATES['USD']))
-
-        if serp_result:
-            combined = ' '.join([str(v) for v in serp_result.values() if isinstance(v, str)])
-            if re.search(r'(NT\$|\bTWD\b|\bNT\b)', combined, flags=re.IGNORECASE):
-                amt = _extract_number(text)
-                return amt, 'TWD', False, int(round(amt))
-
-        amt = _extract_number(text)
-        return amt, 'USD', True, int(round(amt * RATES['USD']))
-
-    # fallback: check serp_result hints
-    if serp_result:
-        combined = ' '.join([str(v) for v in serp_result.values() if isinstance(v, str)])
-        if re.search(r'(NT\$|\bTWD\b|\bNT\b)', combined, flags=re.IGNORECASE):
-            amt = _extract_number(text)
+    twd_hint, usd_hint = (hints if hints is not None else RowHints(serp_result)).flags
+
+    # ambiguous $
+    if marker == 'DOLLAR':
+        if not plain_dollar and twd_hint:
             return amt, 'TWD', False, int(round(amt))
-        if re.search(r'(US\$|\bUSD\b)', combined, flags=re.IGNORECASE):
-            amt = _extract_number(text)
-            return amt, 'USD', False, int(round(amt * RATES['USD']))
+        return amt, 'USD', True, _to_twd(amt, 'USD')
+
+    # no marker: fall back to row hints
+    if twd_hint:
+        return amt, 'TWD', False, int(round(amt))
+    if usd_hint:
+        return amt, 'USD', False, _to_twd(amt, 'USD')
 
     # final fallback: assume USD but mark assumed
-    amt = _extract_number(text)
-    return amt, 'USD', True, int(round(amt * RATES['USD']))
+    return amt, 'USD', True, _to_twd(amt, 'USD')
+
+
+def parse_currency_many(rows: Iterable[Tuple[str, Optional[Dict]]]) -> List[Tuple[float, str, bool, int]]:
+    """Batch form of `parse_currency` for (price_str, serp_result) pairs."""
+    out = []
+    for price_str, serp_result in rows:
+        out.append(parse_currency(price_str, serp_result))
+    return out
+
+
+_PCT_RE = re.compile(r'([0-9]{1,3})\s?%|([0-9]{1,3})\s?％')
 
 
-def detect_discount(serp_item: Dict, price_twd: int) -> Tuple[Optional[str], Optional[float], Optional[int]]:
+def detect_discount(serp_item: Dict, price_twd: int,
+                    hints: Optional[RowHints] = None) -> Tuple[Optional[str], Optional[float], Optional[int]]:
     """Try to detect discount from serp result. Returns (text, pct, strike_twd).
 
     pct is integer percentage if derivable, strike_twd is original price in TWD if found.
     """
+    if hints is None:
+        hints = RowHints(serp_item)
     discount_text = None
     discount_pct = None
     strike_twd = None
@@ -96,7 +139,7 @@ def detect_discount(serp_item: Dict, price_twd: int) -> Tuple[Optional[str], Opt
         val = serp_item.get(key)
         if val:
             try:
-                amt, cur, assumed, t = parse_currency(str(val), serp_item)
+                amt, cur, assumed, t = parse_currency(str(val), serp_item, hints)
                 strike_twd = t
                 break
             except Exception:
@@ -115,7 +158,7 @@ def detect_discount(serp_item: Dict, price_twd: int) -> Tuple[Optional[str], Opt
             v = serp_item.get(key)
             if v:
                 txt = str(v)
-                m = re.search(r'([0-9]{1,3})\s?%|([0-9]{1,3})\s?％', txt)
+                m = _PCT_RE.search(txt)
                 if m:
                     pct = int(m.group(1) or m.group(2))
                     discount_pct = pct
@@ -0,0 +1,185 @@
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger('hypeprice.prewarm')
+
+
+class DecayedTopK:
+    """Approximate top-K of recently popular keys.
+
+    Each key keeps a score that halves every `half_life` seconds and grows by one per
+    observation. Memory is bounded to `capacity` keys; when full, the lowest-scoring key
+    is dropped (a decayed space-saving sketch).
+    """
+
+    def __init__(self, capacity: int = 256, half_life: float = 900.0):
+        self.capacity = capacity
+        self.half_life = half_life
+        self._scores: Dict[Hashable, Tuple[float, float]] = {}
+
+    def _decayed(self, score: float, since: float, now: float) -> float:
+        return score * math.pow(0.5, (now - since) / self.half_life)
+
+    def observe(self, key: Hashable, weight: float = 1.0, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        score, since = self._scores.get(key, (0.0, now))
+        self._scores[key] = (self._decayed(score, since, now) + weight, now)
+        if len(self._scores) > self.capacity:
+            victim = min(self._scores, key=lambda k: self._decayed(*self._scores[k], now))
+            if victim != key:
+                del self._scores[victim]
+
+    def score(self, key: Hashable, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        entry = self._scores.get(key)
+        return self._decayed(entry[0], entry[1], now) if entry else 0.0
+
+    def top(self, k: int, min_score: float = 0.0, now: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        now = time.monotonic() if now is None else now
+        scored = [(key, self._decayed(s, t, now)) for key, (s, t) in self._scores.items()]
+        scored = [x for x in scored if x[1] >= min_score]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored[:k]
+
+    def __len__(self):
+        return len(self._scores)
+
+
+class MinuteBudget:
+    """Allows at most `per_minute` calls in any 60 s window (fixed window)."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._window = 0
+        self._used = 0
+
+    def take(self, n: int = 1) -> bool:
+        """Spend `n` calls if they all fit in this minute's budget."""
+        window = int(time.monotonic() // 60)
+        if window != self._window:
+            self._window = window
+            self._used = 0
+        if self._used + n > self.per_minute:
+            return False
+        self._used += n
+        return True
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+
+class Prewarmer:
+    """Background refresher for the hottest (query, region) pairs of a `ttl_cache` function.
+
+    `fetch` must be a coroutine wrapped by `cache.ttl_cache` and called as
+    `fetch(query, gl=region)`. Every `interval` seconds, the top `top_k` pairs whose
+    entry is missing or expires within `lead` seconds are refreshed, spending at most
+    `budget_per_minute` upstream calls.
+
+    `canonical`, if given, maps each observed query to the form the cache keys on, so
+    differently spelled searches for the same thing add up to one hot entry. Refreshes
+    still send the latest spelling users searched for, never the canonical form.
+    """
+
+    def __init__(self, fetch: Callable, top_k: int = 10, budget_per_minute: int = 10,
+                 lead: float = 15.0, interval: float = 5.0, min_score: float = 2.0,
+                 half_life: float = 900.0, canonical: Optional[Callable[[str], str]] = None):
+        self.fetch = fetch
+        self.canonical = canonical
+        self.top_k = top_k
+        self.lead = lead
+        self.interval = interval
+        self.min_score = min_score
+        self.sketch = DecayedTopK(capacity=max(64, top_k * 16), half_life=half_life)
+        # canonical query -> latest spelling seen, most recent last
+        self.spellings: 'OrderedDict[str, str]' = OrderedDict()
+        self.budget = MinuteBudget(budget_per_minute)
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.skipped_budget = 0
+        self.failures = 0
+
+    def observe(self, query: str, regions: List[str]):
+        if self.canonical is not None:
+            raw, query = query, self.canonical(query)
+            self.spellings[query] = raw
+            self.spellings.move_to_end(query)
+            if len(self.spellings) > self.sketch.capacity * 2:
+                self.spellings.popitem(last=False)
+        for region in regions:
+            self.sketch.observe((query, region))
+
+    def is_hot(self, query: str, regions: List[str]) -> bool:
+        """Whether any of the (query, region) pairs is currently popular enough to keep warm."""
+        if self.canonical is not None:
+            query = self.canonical(query)
+        return any(self.sketch.score((query, r)) >= self.min_score for r in regions)
+
+    def due(self) -> List[Tuple[str, str]]:
+        """(query, region) pairs among the top-K whose cache entry is missing or about to expire."""
+        out = []
+        for (query, region), _ in self.sketch.top(self.top_k, min_score=self.min_score):
+            remaining = self.fetch.cache.ttl_remaining(self.fetch.key(query, gl=region))
+            if remaining is None or remaining < self.lead:
+                out.append((query, region))
+        return out
+
+    async def run_once(self) -> int:
+        batch = []
+        for pair in self.due():
+            if not self.budget.take():
+                self.skipped_budget += 1
+                break
+            batch.append(pair)
+        if not batch:
+            return 0
+        results = await asyncio.gather(
+            *(self.fetch.refresh(self.spellings.get(q, q), gl=region) for q, region in batch),
+            return_exceptions=True,
+        )
+        for (q, region), res in zip(batch, results):
+            if isinstance(res, Exception) or not res:
+                self.failures += 1
+                logger.warning('prewarm of %r/%s failed', q, region)
+            else:
+                self.refreshed += 1
+        return len(batch)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception('prewarm iteration failed')
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tracked': len(self.sketch),
+            'hot': [{'query': q, 'region': r, 'score': round(s, 2)}
+                    for (q, r), s in self.sketch.top(self.top_k, min_score=self.min_score)],
+            'refreshed': self.refreshed,
+            'failures': self.failures,
+            'skipped_budget': self.skipped_budget,
+            'budget_per_minute': self.budget.per_minute,
+            'budget_used': self.budget.used,
+        }
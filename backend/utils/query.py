@@ -0,0 +1,118 @@
+import re
+import hashlib
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict
+
+from .cache import LRUTTLCache
+
+# alias -> canonical brand name, both in canonical form (NFKC, lower case, no punctuation).
+# Latin aliases match whole words; CJK ones match anywhere (no spaces between words).
+BRAND_ALIASES = {
+    'arc teryx': 'arcteryx',
+    'stoneisland': 'stone island',
+    'newbalance': 'new balance',
+    'tnf': 'the north face',
+    'north face': 'the north face',
+    'the north face': 'the north face',
+    'ralphlauren': 'ralph lauren',
+    'w i p': 'wip',
+    '巴伯爾': 'barbour',
+    '巴布爾': 'barbour',
+    'バブアー': 'barbour',
+    '始祖鳥': 'arcteryx',
+    'アークテリクス': 'arcteryx',
+    '石頭島': 'stone island',
+    'ストーンアイランド': 'stone island',
+    '紐巴倫': 'new balance',
+    'ニューバランス': 'new balance',
+    '北臉': 'the north face',
+    'ザノースフェイス': 'the north face',
+}
+
+_APOSTROPHES = dict.fromkeys(map(ord, "'’‘ʼ`´"), None)
+# a dot or comma inside a number ("2.5", "1,000") is not punctuation
+_NUMBER_SEP_RE = re.compile(r'(?<=\d)[.,](?=\d)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def _alias_re(aliases: Dict[str, str]) -> re.Pattern:
+    parts = []
+    # longest first, so "the north face" wins over "north face"
+    for alias in sorted(aliases, key=len, reverse=True):
+        if alias.isascii():
+            parts.append(r'(?<![a-z0-9])' + re.escape(alias) + r'(?![a-z0-9])')
+        else:
+            parts.append(re.escape(alias))
+    return re.compile('|'.join(parts))
+
+
+_ALIAS_RE = _alias_re(BRAND_ALIASES)
+
+
+@lru_cache(maxsize=4096)
+def canonical_query(query: str) -> str:
+    """Canonical form of a search query, so equivalent spellings share one cache entry.
+
+    NFKC folds full-width Latin and half-width katakana; then lower case, apostrophes
+    dropped ("arc'teryx" -> "arcteryx"), other punctuation and symbols turned into
+    spaces (except separators inside numbers), brand aliases replaced and whitespace
+    collapsed: "  Ｂａｒｂｏｕｒ  Bedale！" -> "barbour bedale".
+    """
+    text = unicodedata.normalize('NFKC', query or '').casefold().translate(_APOSTROPHES)
+    text = _NUMBER_SEP_RE.sub('\0', text)
+    text = ''.join(' ' if unicodedata.category(c)[0] in 'PS' else c for c in text).replace('\0', '.')
+    text = _SPACE_RE.sub(' ', text).strip()
+    text = _ALIAS_RE.sub(lambda m: ' ' + BRAND_ALIASES[m.group()] + ' ', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def query_key(query: str, gl: str = 'tw', hl: str = 'zh-tw') -> str:
+    """Stable cache key for a (query, gl, hl) call: a hash of the canonical triple.
+
+    Takes the same arguments as `call_serpapi`, so positional and keyword calls agree.
+    """
+    canonical = '\x1f'.join((canonical_query(query), (gl or '').lower(), (hl or '').lower()))
+    return 'q|' + hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+class QueryStats:
+    """Hit rates of canonical keys versus raw query strings over the same lookups.
+
+    A shadow count, independent of the real cache: each lookup is a normalized hit if its
+    canonical key was looked up within `ttl` seconds, and a raw hit if the exact same
+    (query, gl, hl) was. The difference is the upstream calls canonicalization saves.
+    """
+
+    def __init__(self, ttl: float = 120, max_entries: int = 4096, max_variants: int = 32):
+        self.max_variants = max_variants
+        # canonical key -> raw (query, gl, hl) variants seen within ttl
+        self._seen = LRUTTLCache(ttl=ttl, max_entries=max_entries, max_bytes=None, negative_ttl=ttl)
+        self.lookups = 0
+        self.raw_hits = 0
+        self.normalized_hits = 0
+
+    def observe(self, query: str, gl: str = 'tw', hl: str = 'zh-tw'):
+        self.lookups += 1
+        key = query_key(query, gl, hl)
+        raw = (query, gl, hl)
+        variants = self._seen.get(key)
+        if variants is None:
+            self._seen.set(key, {raw})
+            return
+        self.normalized_hits += 1
+        if raw in variants:
+            self.raw_hits += 1
+        elif len(variants) < self.max_variants:
+            variants.add(raw)
+
+    def stats(self) -> Dict[str, Any]:
+        n = self.lookups
+        return {
+            'lookups': n,
+            'raw_hits': self.raw_hits,
+            'normalized_hits': self.normalized_hits,
+            'raw_hit_rate': round(self.raw_hits / n, 4) if n else 0.0,
+            'normalized_hit_rate': round(self.normalized_hits / n, 4) if n else 0.0,
+            'upstream_calls_saved': self.normalized_hits - self.raw_hits,
+        }
@@ -0,0 +1,370 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger('hypeprice.quota')
+
+# upstream answers worth another attempt; anything else (bad key, bad request) is final
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Set for background work (batches) that should wait as long as it takes for a rate-limit
+# token instead of being rejected after `QuotaGuard.max_wait` (see `TokenBucket.acquire_patiently`).
+patient: ContextVar[bool] = ContextVar('quota_patient', default=False)
+
+
+class Rejected(Exception):
+    """The guard refused to call upstream (breaker open, budget spent, rate limited)."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _httpx():
+    # httpx is imported lazily with the first HTTP client; before that, no exception can be
+    # one of its types, so there is no need to import it here
+    return sys.modules.get('httpx')
+
+
+def is_timeout(exc: BaseException) -> bool:
+    httpx = _httpx()
+    return isinstance(exc, TimeoutError) or (httpx is not None and isinstance(exc, httpx.TimeoutException))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if is_timeout(exc):
+        return True
+    httpx = _httpx()
+    if httpx is None:
+        return False
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUSES
+    return isinstance(exc, httpx.TransportError)
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    httpx = _httpx()
+    if httpx is not None and isinstance(exc, httpx.HTTPStatusError):
+        value = exc.response.headers.get('retry-after')
+        if value and value.strip().isdigit():
+            return float(value)
+    return None
+
+
+class TokenBucket:
+    """`rate` calls per second on average, bursts of up to `burst`.
+
+    `acquire(max_wait)` reserves a token, sleeping until it is available; if that would
+    take longer than `max_wait` seconds nothing is reserved and it returns False.
+    A `rate` of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Seconds to wait for a token, or None if that exceeds `max_wait`."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            return None
+        # tokens may go negative: later callers queue up behind this reservation
+        self.tokens -= 1
+        return wait
+
+    async def acquire(self, max_wait: float = 0.0) -> bool:
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    async def acquire_patiently(self, headroom: float):
+        """Wait for a token however long it takes, reserving one only once it is at most
+        `headroom` seconds away. Patient callers thus never queue more than `headroom`
+        of reservations ahead of callers using `acquire(max_wait)`, so a large batch
+        paces itself to the rate without starving interactive calls."""
+        while True:
+            wait = self.reserve(headroom)
+            if wait is not None:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                return
+            await asyncio.sleep(max(headroom, 1 / self.rate))
+
+
+class CallBudget:
+    """Caps upstream calls per UTC day and per UTC month (0 = unlimited).
+
+    Counters live in a SQLite file (WAL) shared by every worker on the host and kept
+    across restarts, one row per day and per month. A call is counted with a single
+    `UPDATE ... SET used = used + 1 WHERE used < limit` per period inside one
+    transaction, so concurrent workers can never overspend. The default ':memory:'
+    path keeps the counts in this process only (tests, scripts).
+
+    `take` is a blocking write (it may wait on other workers' locks); async callers use
+    `atake`, which runs it in a worker thread like the other stores. If the store cannot
+    be written the call is refused (the budget fails closed).
+    """
+
+    def __init__(self, daily: int = 0, monthly: int = 0,
+                 now: Callable[[], datetime] = lambda: datetime.now(timezone.utc), path: str = ':memory:',
+                 keep_days: int = 62):
+        self.daily = daily
+        self.monthly = monthly
+        self.now = now
+        self.path = path
+        self.keep_days = keep_days
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._pruned = ''
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS budget (period TEXT PRIMARY KEY, used INTEGER NOT NULL)')
+
+    def _periods(self):
+        now = self.now()
+        return 'day:' + now.strftime('%Y-%m-%d'), 'month:' + now.strftime('%Y-%m')
+
+    def _count(self, period: str, limit: int) -> bool:
+        self._conn.execute('INSERT OR IGNORE INTO budget (period, used) VALUES (?, 0)', (period,))
+        if limit:
+            cur = self._conn.execute('UPDATE budget SET used = used + 1 WHERE period = ? AND used < ?',
+                                     (period, limit))
+        else:
+            cur = self._conn.execute('UPDATE budget SET used = used + 1 WHERE period = ?', (period,))
+        return cur.rowcount == 1
+
+    def _prune(self, day: str):
+        # once per day: drop counters of periods long gone
+        if day == self._pruned:
+            return
+        self._pruned = day
+        cutoff = (self.now() - timedelta(days=self.keep_days)).strftime('%Y-%m-%d')
+        self._conn.execute("DELETE FROM budget WHERE (period LIKE 'day:%' AND period < ?)"
+                           " OR (period LIKE 'month:%' AND period < ?)", ('day:' + cutoff, 'month:' + cutoff[:7]))
+
+    def take(self) -> bool:
+        day, month = self._periods()
+        with self._lock:
+            ok = False
+            try:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    ok = self._count(day, self.daily) and self._count(month, self.monthly)
+                    if ok:
+                        self._prune(day)
+                finally:
+                    self._conn.execute('COMMIT' if ok else 'ROLLBACK')
+            except sqlite3.Error:
+                self.errors += 1
+                logger.exception('call budget store failed; refusing the call')
+                return False
+        return ok
+
+    async def atake(self) -> bool:
+        return await asyncio.to_thread(self.take)
+
+    def used(self) -> Dict[str, int]:
+        day, month = self._periods()
+        with self._lock:
+            try:
+                rows = dict(self._conn.execute('SELECT period, used FROM budget WHERE period IN (?, ?)',
+                                               (day, month)).fetchall())
+            except sqlite3.Error:
+                self.errors += 1
+                rows = {}
+        return {'day': rows.get(day, 0), 'month': rows.get(month, 0)}
+
+    def stats(self) -> Dict[str, Any]:
+        used = self.used()
+        return {
+            'daily_limit': self.daily or None,
+            'used_today': used['day'],
+            'monthly_limit': self.monthly or None,
+            'used_month': used['month'],
+            'errors': self.errors,
+        }
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; while open every call fails fast.
+
+    After `reset_timeout` seconds one trial call is let through (half-open): success
+    closes the breaker, failure opens it again for another `reset_timeout`.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial = False
+
+    def allow(self) -> bool:
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = 'half_open'
+            self._trial = False
+        if self.state == 'half_open' and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def release(self):
+        """The call let through ended without a verdict (cancelled or rejected locally)."""
+        self._trial = False
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.threshold:
+            if self.state != 'open':
+                self.times_opened += 1
+                logger.warning('circuit breaker opened after %d consecutive failures', self.failures)
+            self.state = 'open'
+            self.opened_at = self.clock()
+            self._trial = False
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == 'open':
+            retry_in = round(max(0.0, self.reset_timeout - (self.clock() - self.opened_at)), 1)
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'times_opened': self.times_opened,
+            'retry_in': retry_in,
+        }
+
+
+class QuotaGuard:
+    """Protects a paid upstream API: rate limit, call budget, circuit breaker and retries.
+
+    `await guard.call(fn)` runs `fn()` (a coroutine factory) at most `1 + max_retries`
+    times. Only retryable failures (see `is_retryable`) are retried, after a jittered
+    exponential backoff, and only they count towards opening the breaker; every
+    attempt spends a token and a unit of budget. Raises
+    `Rejected` without calling upstream when the breaker is open, the budget is spent or
+    no token frees up within `max_wait` seconds. Calls made while `patient` is set wait
+    for their token instead (queueing at most `patient_headroom` seconds ahead).
+
+    Each attempt is cut off after `attempt_timeout` seconds (None = no limit). A timed-out
+    attempt counts towards the breaker at once, even if it is retried: keep
+    `attempt_timeout` below the caller's deadline so that a hung upstream still opens the
+    breaker when callers give up before the last retry.
+    """
+
+    def __init__(self, bucket: TokenBucket, budget: CallBudget, breaker: CircuitBreaker,
+                 max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 4.0,
+                 max_wait: float = 2.0, patient_headroom: float = 0.5,
+                 attempt_timeout: Optional[float] = None):
+        self.bucket = bucket
+        self.budget = budget
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_wait = max_wait
+        self.patient_headroom = patient_headroom
+        self.attempt_timeout = attempt_timeout
+        self.calls = 0
+        self.retries = 0
+        self.rejected: Dict[str, int] = {'breaker_open': 0, 'budget_exhausted': 0, 'rate_limited': 0}
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        raise Rejected(reason)
+
+    def backoff(self, attempt: int) -> float:
+        # "full jitter": uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.breaker.allow():
+            self._reject('breaker_open')
+        try:
+            return await self._attempts(fn)
+        except (Rejected, asyncio.CancelledError):
+            # no verdict on upstream health; let the next caller be the half-open trial
+            self.breaker.release()
+            raise
+
+    async def _attempts(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            if patient.get():
+                await self.bucket.acquire_patiently(self.patient_headroom)
+            elif not await self.bucket.acquire(self.max_wait):
+                self._reject('rate_limited')
+            if not await self.budget.atake():
+                self._reject('budget_exhausted')
+            self.calls += 1
+            try:
+                async with asyncio.timeout(self.attempt_timeout):
+                    result = await fn()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if not is_retryable(exc):
+                    # upstream answered (e.g. 400/401): not an outage
+                    self.breaker.record_success()
+                    raise
+                if is_timeout(exc) or attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                hint = _retry_after(exc)
+                if hint is not None:
+                    delay = max(delay, min(hint, self.backoff_max))
+                logger.warning('upstream call failed (%r); retry %d in %.2fs', exc, attempt + 1, delay)
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'breaker': self.breaker.stats(),
+            'budget': self.budget.stats(),
+            'rate_per_second': self.bucket.rate or None,
+            'calls': self.calls,
+            'retries': self.retries,
+            'rejected': dict(self.rejected),
+        }
@@ -0,0 +1,135 @@
+import os
+import re
+import hashlib
+import mimetypes
+from typing import Dict, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, PlainTextResponse, Response
+
+from . import encoding
+
+# Vite output: assets/<name>-<8 char content hash>.<ext>
+HASHED_ASSET_RE = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# everything else (index.html, favicon, ...) is revalidated with its ETag on every use
+REVALIDATE = 'no-cache'
+# precompressed siblings, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticFile:
+    """One servable file and its precompressed siblings.
+
+    `variants` maps a content coding ('' for identity) to (path, stat). `body` holds the
+    content per coding for files kept in memory (index.html).
+    """
+
+    __slots__ = ('path', 'content_type', 'cache_control', 'etag', 'variants', 'body')
+
+    def __init__(self, path: str, rel: str, stat: os.stat_result):
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.cache_control = IMMUTABLE if HASHED_ASSET_RE.match(rel) else REVALIDATE
+        self.etag = '"' + hashlib.blake2b(f'{rel}|{stat.st_mtime_ns}|{stat.st_size}'.encode(),
+                                          digest_size=12).hexdigest() + '"'
+        self.variants: Dict[str, Tuple[str, os.stat_result]] = {'': (path, stat)}
+        self.body: Optional[Dict[str, bytes]] = None
+
+    def load(self):
+        """Keep the file and its compressed forms in memory; missing siblings are made here once."""
+        body = {}
+        for coding, (path, _) in self.variants.items():
+            with open(path, 'rb') as f:
+                body[coding] = f.read()
+        for coding, _ in ENCODINGS:
+            if coding not in body and (coding != 'br' or encoding.brotli is not None):
+                body[coding] = encoding.compress(body[''], coding)
+        self.body = body
+
+    def codings(self):
+        return self.body.keys() if self.body is not None else self.variants.keys()
+
+
+class FrontendFiles:
+    """ASGI app serving the built frontend (`frontend_dist`) without per-request work.
+
+    - files are indexed once at start; the build does not change while the app runs
+    - `.br` / `.gz` siblings written by the frontend build (`frontend/scripts/compress.mjs`)
+      are sent to clients that accept them; nothing is compressed per request
+    - content-hashed assets (`assets/name-<hash>.js`) are cacheable for a year and marked
+      `immutable`; other files must revalidate with their ETag (answered with 304)
+    - `index.html` is served from memory, compressed once at start if the build did not
+    - `/` and directory paths serve their `index.html`; unknown paths get `404.html` if the
+      build has one, like `StaticFiles(html=True)`
+    """
+
+    def __init__(self, directory: str, index: str = 'index.html'):
+        self.directory = os.path.abspath(directory)
+        self.index = index
+        self.files: Dict[str, StaticFile] = {}
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        siblings = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                if name.endswith(suffixes):
+                    siblings.append((rel, path))
+                    continue
+                self.files[rel] = StaticFile(path, rel, os.stat(path))
+        for rel, path in siblings:
+            for coding, suffix in ENCODINGS:
+                entry = self.files.get(rel[:-len(suffix)]) if rel.endswith(suffix) else None
+                if entry is not None:
+                    entry.variants[coding] = (path, os.stat(path))
+                    break
+            else:
+                # a compressed file without an original (e.g. a downloadable .gz) is served as is
+                self.files[rel] = StaticFile(path, rel, os.stat(path))
+        for rel, entry in self.files.items():
+            if rel == index or rel.endswith('/' + index) or rel == '404.html':
+                entry.load()
+
+    def lookup(self, path: str) -> Tuple[Optional[StaticFile], int]:
+        rel = path.lstrip('/')
+        if rel == '' or rel.endswith('/'):
+            rel += self.index
+        entry = self.files.get(rel)
+        if entry is None and '.' not in rel.rsplit('/', 1)[-1]:
+            entry = self.files.get(rel + '/' + self.index)
+        if entry is not None:
+            return entry, 200
+        return self.files.get('404.html'), 404
+
+    def response(self, request: Request, path: str) -> Response:
+        if request.method not in ('GET', 'HEAD'):
+            return PlainTextResponse('Method Not Allowed', status_code=405, headers={'Allow': 'GET, HEAD'})
+        entry, status = self.lookup(path)
+        if entry is None:
+            return PlainTextResponse('Not Found', status_code=404)
+        coding = encoding.negotiate(request, [c for c, _ in ENCODINGS if c in entry.codings()]) or ''
+        etag = encoding.coded_etag(entry.etag, coding)
+        headers = {'Cache-Control': entry.cache_control, 'ETag': etag, 'Vary': 'Accept-Encoding'}
+        if status == 200 and encoding.etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        if coding:
+            headers['Content-Encoding'] = coding
+        if entry.body is not None:
+            body = entry.body[coding]
+            return Response(content=b'' if request.method == 'HEAD' else body, status_code=status,
+                            media_type=entry.content_type,
+                            headers={**headers, 'Content-Length': str(len(body))})
+        file_path, stat = entry.variants[coding]
+        return FileResponse(file_path, status_code=status, headers=headers, media_type=entry.content_type,
+                            stat_result=stat)
+
+    async def __call__(self, scope, receive, send):
+        path = scope['path']
+        root = scope.get('root_path', '')
+        if root and path.startswith(root):
+            path = path[len(root):]
+        response = self.response(Request(scope, receive), path)
+        await response(scope, receive, send)
@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from . import metrics
+from .prewarm import MinuteBudget
+
+logger = logging.getLogger('hypeprice.watchlist')
+
+WATCH_CHECKS = metrics.Counter('hypeprice_watch_checks_total', 'Watchlist entries re-priced.', ['outcome'])
+WATCH_ALERTS = metrics.Counter('hypeprice_watch_alerts_total', 'Price change alerts sent.', ['sink', 'status'])
+
+# columns of `watches`, in SELECT order
+_COLUMNS = ('id', 'query', 'regions', 'target_twd', 'pricing', 'created_at', 'interval', 'next_check',
+            'last_checked', 'checks', 'changes', 'best_twd', 'best')
+
+
+class Watchlist:
+    """Saved searches (query + regions + optional target landed price) in a local SQLite file.
+
+    Each entry carries its own schedule (`interval`, `next_check`) and its last best
+    landed price, so the scheduler can pick due entries with one index range scan and
+    tell a real price change from a repeat of the same result.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS watches ('
+            ' id INTEGER PRIMARY KEY,'
+            ' query TEXT NOT NULL,'
+            ' regions TEXT NOT NULL,'
+            ' target_twd INTEGER,'
+            ' pricing TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' interval REAL NOT NULL,'
+            ' next_check REAL NOT NULL,'
+            ' last_checked REAL,'
+            ' checks INTEGER NOT NULL DEFAULT 0,'
+            ' changes INTEGER NOT NULL DEFAULT 0,'
+            ' best_twd INTEGER,'
+            ' best TEXT)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS watches_next_check ON watches(next_check)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _entry(row) -> Dict[str, Any]:
+        e = dict(zip(_COLUMNS, row))
+        e['regions'] = e['regions'].split(',')
+        e['pricing'] = json.loads(e['pricing']) if e['pricing'] else None
+        e['best'] = json.loads(e['best']) if e['best'] else None
+        return e
+
+    def add(self, query: str, regions: List[str], target_twd: Optional[int] = None,
+            pricing: Optional[Dict[str, Any]] = None, interval: float = 900) -> Dict[str, Any]:
+        """New entry, due for its first check right away."""
+        now = time.time()
+        cur = self._conn().execute(
+            'INSERT INTO watches (query, regions, target_twd, pricing, created_at, interval, next_check)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (query, ','.join(regions), target_twd, json.dumps(pricing) if pricing else None, now, interval, now),
+        )
+        return self.get(cur.lastrowid)
+
+    def get(self, watch_id: int) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(f"SELECT {', '.join(_COLUMNS)} FROM watches WHERE id = ?", (watch_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(f"SELECT {', '.join(_COLUMNS)} FROM watches ORDER BY id").fetchall()
+        return [self._entry(r) for r in rows]
+
+    def delete(self, watch_id: int) -> bool:
+        return self._conn().execute('DELETE FROM watches WHERE id = ?', (watch_id,)).rowcount > 0
+
+    def due(self, now: float, limit: int = 50) -> List[Dict[str, Any]]:
+        """Entries whose `next_check` has passed, most overdue first."""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM watches WHERE next_check <= ? ORDER BY next_check LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        return [self._entry(r) for r in rows]
+
+    def record_check(self, watch_id: int, checked_at: float, next_check: float, interval: float,
+                     best: Optional[Dict[str, Any]] = None):
+        """Reschedule an entry; with `best`, its best price changed and is replaced too."""
+        if best is None:
+            self._conn().execute(
+                'UPDATE watches SET last_checked = ?, next_check = ?, interval = ?, checks = checks + 1 WHERE id = ?',
+                (checked_at, next_check, interval, watch_id),
+            )
+        else:
+            self._conn().execute(
+                'UPDATE watches SET last_checked = ?, next_check = ?, interval = ?, checks = checks + 1,'
+                ' changes = changes + 1, best_twd = ?, best = ? WHERE id = ?',
+                (checked_at, next_check, interval, best['final_price_twd'], json.dumps(best), watch_id),
+            )
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM watches').fetchone()[0]
+
+
+class LogSink:
+    """Alert sink that only logs; the default when no webhook is configured."""
+
+    name = 'log'
+
+    async def send(self, alert: Dict[str, Any]):
+        logger.info('watch %s %r: %s -> %s TWD%s', alert['watch_id'], alert['query'], alert['previous_twd'],
+                    alert['final_price_twd'], ' (below target)' if alert['below_target'] else '')
+
+
+class WebhookSink:
+    """Alert sink that POSTs each alert as JSON to `url`.
+
+    `client` is a callable returning a shared `httpx.AsyncClient`. Delivery is best
+    effort: failures are logged and counted, not retried.
+    """
+
+    name = 'webhook'
+
+    def __init__(self, url: str, client: Callable[[], Any], timeout: float = 5.0):
+        self.url = url
+        self.client = client
+        self.timeout = timeout
+
+    async def send(self, alert: Dict[str, Any]):
+        resp = await self.client().post(self.url, json=alert, timeout=self.timeout)
+        resp.raise_for_status()
+
+
+class WatchScheduler:
+    """Background re-pricing of watchlist entries.
+
+    Every `tick` seconds, due entries are checked, spending at most `budget_per_minute`
+    upstream calls (one per region of an entry). `price_fn(query, regions, pricing)`
+    returns the best listing (`final_price_twd`, `title`, `url`, ...) or None if the search
+    failed. Only a changed best price is written back and sent to the alert `sink`.
+
+    Intervals adapt per entry between `min_interval` and `max_interval`: halved when the
+    price changed, grown by half when it did not (the first check only sets a baseline), and capped at twice the minimum while
+    the entry is hot (`hot_fn(query, regions)`, e.g. recently searched) or within 10% of
+    its target. The next check is jittered by +-15% so entries added together spread out.
+    """
+
+    def __init__(self, store: Watchlist, price_fn: Callable[..., Awaitable[Optional[Dict[str, Any]]]],
+                 sink=None, budget_per_minute: int = 20, min_interval: float = 900,
+                 max_interval: float = 6 * 3600, tick: float = 15.0,
+                 hot_fn: Optional[Callable[[str, List[str]], bool]] = None):
+        self.store = store
+        self.price_fn = price_fn
+        self.sink = sink or LogSink()
+        self.budget = MinuteBudget(budget_per_minute)
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.tick = tick
+        self.hot_fn = hot_fn
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.changes = 0
+        self.failures = 0
+        self.alerts = 0
+        self.alert_failures = 0
+        self.skipped_budget = 0
+
+    def next_interval(self, entry: Dict[str, Any], factor: float, best_twd: Optional[int]) -> float:
+        interval = entry['interval'] * factor
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        target = entry['target_twd']
+        near_target = target is not None and best_twd is not None and best_twd <= target * 1.1
+        if near_target or (self.hot_fn is not None and self.hot_fn(entry['query'], entry['regions'])):
+            interval = min(interval, self.min_interval * 2)
+        return interval
+
+    async def check(self, entry: Dict[str, Any], now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Re-price one entry; returns the alert sent, if any."""
+        now = time.time() if now is None else now
+        try:
+            best = await self.price_fn(entry['query'], entry['regions'], entry['pricing'])
+        except Exception:
+            logger.exception('watch %s check failed', entry['id'])
+            best = None
+        self.checks += 1
+        if best is None:
+            # keep the current interval; the search will be retried on schedule
+            self.failures += 1
+            WATCH_CHECKS.labels('failed').inc()
+            await asyncio.to_thread(self.store.record_check, entry['id'], now,
+                                    now + entry['interval'] * random.uniform(0.85, 1.15), entry['interval'])
+            return None
+
+        previous = entry['best_twd']
+        changed = best['final_price_twd'] != previous
+        # the first price seen is a baseline, neither a change nor a sign of stability
+        factor = 1.0 if previous is None else (0.5 if changed else 1.5)
+        interval = self.next_interval(entry, factor, best['final_price_twd'])
+        next_check = now + interval * random.uniform(0.85, 1.15)
+        await asyncio.to_thread(self.store.record_check, entry['id'], now, next_check, interval,
+                                best if changed else None)
+        WATCH_CHECKS.labels('changed' if changed else 'unchanged').inc()
+        if not changed:
+            return None
+        self.changes += 1
+        target = entry['target_twd']
+        below_target = target is not None and best['final_price_twd'] <= target
+        if previous is None and not below_target:
+            return None  # first price seen: a baseline, not a change worth an alert
+        alert = {
+            'watch_id': entry['id'],
+            'query': entry['query'],
+            'regions': entry['regions'],
+            'previous_twd': previous,
+            'final_price_twd': best['final_price_twd'],
+            'target_twd': target,
+            'below_target': below_target,
+            'best': best,
+            'checked_at': now,
+        }
+        try:
+            await self.sink.send(alert)
+            self.alerts += 1
+            WATCH_ALERTS.labels(self.sink.name, 'sent').inc()
+        except Exception as exc:
+            self.alert_failures += 1
+            WATCH_ALERTS.labels(self.sink.name, 'failed').inc()
+            logger.warning('watch %s alert via %s failed: %r', entry['id'], self.sink.name, exc)
+        return alert
+
+    async def run_once(self, now: Optional[float] = None) -> int:
+        """Check the due entries that fit in this minute's budget; returns how many."""
+        now = time.time() if now is None else now
+        batch = []
+        for entry in await asyncio.to_thread(self.store.due, now):
+            if not self.budget.take(min(len(entry['regions']), self.budget.per_minute)):
+                self.skipped_budget += 1
+                break
+            batch.append(entry)
+        if batch:
+            await asyncio.gather(*(self.check(e, now) for e in batch))
+        return len(batch)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception('watchlist iteration failed')
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sink': self.sink.name,
+            'checks': self.checks,
+            'changes': self.changes,
+            'failures': self.failures,
+            'alerts': self.alerts,
+            'alert_failures': self.alert_failures,
+            'skipped_budget': self.skipped_budget,
+            'budget_per_minute': self.budget.per_minute,
+            'budget_used': self.budget.used,
+        }
@@ -0,0 +1,38 @@
+// Writes .br and .gz siblings next to the compressible files of the Vite build, so the
+// backend (backend/utils/static.py) can serve them without compressing per request.
+// Usage: node scripts/compress.mjs [dist]
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'node:fs'
+import { join } from 'node:path'
+import { brotliCompressSync, gzipSync, constants } from 'node:zlib'
+
+const COMPRESSIBLE = /\.(js|mjs|css|html|svg|json|txt|map|webmanifest)$/
+const MIN_BYTES = 512
+
+function walk(dir) {
+  return readdirSync(dir).flatMap(name => {
+    const path = join(dir, name)
+    return statSync(path).isDirectory() ? walk(path) : [path]
+  })
+}
+
+const dist = process.argv[2] || 'dist'
+let written = 0
+for (const path of walk(dist)) {
+  if (!COMPRESSIBLE.test(path)) continue
+  const body = readFileSync(path)
+  if (body.length < MIN_BYTES) continue
+  const variants = {
+    '.br': brotliCompressSync(body, {
+      params: { [constants.BROTLI_PARAM_QUALITY]: 11, [constants.BROTLI_PARAM_SIZE_HINT]: body.length },
+    }),
+    '.gz': gzipSync(body, { level: 9 }),
+  }
+  for (const [suffix, data] of Object.entries(variants)) {
+    // a compressed copy that is not smaller is not worth sending
+    if (data.length < body.length) {
+      writeFileSync(path + suffix, data)
+      written++
+    }
+  }
+}
+console.log(`compress: wrote ${written} precompressed files in ${dist}`)
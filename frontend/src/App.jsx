@@ -1,6 +1,14 @@
-import React, { useState, useMemo, useEffect } from 'react'
+import React, { useState, useMemo, useEffect, useRef } from 'react'
 
-function PriceCard({ item, shippingCost, applyTax, taxThreshold, taxRate }) {
+// listings served from the server's local catalog carry the unix time they were last seen live
+function formatAge(observedAt) {
+  const mins = Math.max(0, Math.round((Date.now() / 1000 - observedAt) / 60))
+  if (mins < 60) return `${mins}m`
+  if (mins < 48 * 60) return `${Math.round(mins / 60)}h`
+  return `${Math.round(mins / 1440)}d`
+}
+
+function PriceCard({ item }) {
   const placeholder = 'https://placehold.co/400x400?text=Product+Image'
   const src = item.image_url || item.image || placeholder
 
@@ -14,7 +22,7 @@ function PriceCard({ item, shippingCost, applyTax, taxThreshold, taxRate }) {
       <div className="relative">
         {item.is_lowest && (
           <div className="absolute top-2 right-2 z-10">
-            <span className="bg-emerald-500 text-emerald-900 text-xs font-semibold px-2 py-1 rounded">Lowest</span>
+            <span className="bg-emerald-500 text-emerald-900 text-xs font-semibold px-2 py-1 rounded">{item.group_size > 1 ? `Lowest of ${item.group_size}` : 'Lowest'}</span>
           </div>
         )}
         {item.discount_text && (
@@ -22,10 +30,14 @@ function PriceCard({ item, shippingCost, applyTax, taxThreshold, taxRate }) {
             <span className="bg-red-600 text-red-50 text-xs font-semibold px-2 py-1 rounded">{item.discount_text}</span>
           </div>
         )}
-        <img src={src} alt={item.retailer} onError={onImgError} className="w-full h-48 object-cover" />
+        <img src={src} alt={item.retailer} onError={onImgError} loading="lazy" decoding="async" className="w-full h-48 object-cover" />
       </div>
       <div className="p-4">
         <h3 className="text-lg font-semibold">{item.retailer}</h3>
+        {item.title && <div className="text-sm text-gray-400 truncate" title={item.title}>{item.title}</div>}
+        {item.observed_at && (
+          <div className="text-xs text-amber-400">Saved listing, seen {formatAge(item.observed_at)} ago</div>
+        )}
         <div className="mt-2">
           <div className="text-2xl font-extrabold text-emerald-400">NT$ {item.price_twd}</div>
           <div className="text-sm text-gray-400">{item.original_price_string ? item.original_price_string : `${item.original_price} ${item.currency}`}</div>
@@ -40,17 +52,8 @@ function PriceCard({ item, shippingCost, applyTax, taxThreshold, taxRate }) {
           </div>
           <div className="text-right">
             <div className="text-sm text-gray-400">Your Final</div>
-            <div className="text-xl font-extrabold text-emerald-400">
-              NT$ {
-                (() => {
-                  const base = Number(item.price_twd || 0)
-                  const ship = Number(shippingCost || 0)
-                  const tax = (applyTax && base >= Number(taxThreshold || 0)) ? Math.round((base + ship) * (taxRate || 0.17)) : 0
-                  return base + ship + tax
-                })()
-              }
-            </div>
-            <div className="text-xs text-gray-400">Shipping: NT$ {Number(shippingCost || 0)}{applyTax? ` · Tax ${Math.round((taxRate||0.17)*100)}%` : ''}</div>
+            <div className="text-xl font-extrabold text-emerald-400">NT$ {item.final_price_twd}</div>
+            <div className="text-xs text-gray-400">Shipping: NT$ {item.shipping_twd}{item.tax_twd ? ` · Tax NT$ ${item.tax_twd}` : ''}</div>
           </div>
         </div>
       </div>
@@ -58,56 +61,178 @@ function PriceCard({ item, shippingCost, applyTax, taxThreshold, taxRate }) {
   )
 }
 
+// server-side sort keys (see `ResultView` in backend/schemas.py) and page size
+const SORT_PARAMS = { recommended: 'recommended', low: 'price_asc', high: 'price_desc', discount: 'discount' }
+const PAGE_SIZE = 24
+
 export default function App() {
   const [q, setQ] = useState('Barbour Spey')
   const [results, setResults] = useState([])
+  const [resultSetId, setResultSetId] = useState(null)
+  // server-side paging of the result set: cursor of the next page, matching total, retailer counts
+  const [nextCursor, setNextCursor] = useState(null)
+  const [total, setTotal] = useState(null)
+  const [facets, setFacets] = useState(null)
   const [sortOption, setSortOption] = useState(() => localStorage.getItem('sortOption') || 'recommended')
   const [storeFilter, setStoreFilter] = useState(() => localStorage.getItem('storeFilter') || 'All Stores')
-  const [shippingCost, setShippingCost] = useState(() => Number(localStorage.getItem('shippingCost') || 800))
+  // flat shipping (NT$) overriding the server's origin/weight estimate; '' = use the estimate
+  const [shippingOverride, setShippingOverride] = useState(() => localStorage.getItem('shippingOverride') || '')
   const [applyTax, setApplyTax] = useState(() => (localStorage.getItem('applyTax') || 'true') === 'true')
   const [taxThreshold, setTaxThreshold] = useState(() => Number(localStorage.getItem('taxThreshold') || 0))
   const TAX_RATE = 0.17
-  const [originCountry, setOriginCountry] = useState(() => localStorage.getItem('originCountry') || 'US')
+  // shipping origin ('' = each listing's market) and parcel weight; the server owns the
+  // per-lb rates (ORIGIN_RATES in backend/utils/calc.py) and prices shipping from these
+  const [originCountry, setOriginCountry] = useState(() => localStorage.getItem('originCountry') || '')
   const [weightLbs, setWeightLbs] = useState(() => Number(localStorage.getItem('weightLbs') || 1))
-
-  // Estimated per-lb rates in TWD (reference: BuyandShip pricing page). These are estimates
-  // to help quick calculations; users should consult the official page for exact fees.
-  const ORIGIN_RATES = {
-    US: 150,
-    GB: 200,
-    JP: 100,
-    HK: 60,
-    AU: 220,
-    EU: 210,
-  }
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
 
+  // landed-cost options sent to the backend, which computes all prices (shipping included)
+  const pricing = useMemo(() => {
+    const p = {
+      weight_lbs: Number(weightLbs || 0),
+      apply_tax: applyTax,
+      tax_threshold: Number(taxThreshold || 0),
+      tax_rate: TAX_RATE,
+    }
+    if (originCountry) p.origin = originCountry
+    if (shippingOverride !== '') p.shipping_twd = Number(shippingOverride)
+    return p
+  }, [originCountry, weightLbs, shippingOverride, applyTax, taxThreshold])
+
+  // in-flight streaming search; aborting it makes the server cancel its upstream calls
+  const searchAbort = useRef(null)
+  useEffect(() => () => searchAbort.current && searchAbort.current.abort(), [])
+
   async function doSearch(e) {
     e && e.preventDefault()
+    if (searchAbort.current) searchAbort.current.abort()
+    const controller = new AbortController()
+    searchAbort.current = controller
     setLoading(true)
     setError(null)
+    setResults([])
+    setResultSetId(null)
+    setNextCursor(null)
+    setTotal(null)
+    setFacets(null)
     try {
-      const res = await fetch('/api/search', {
+      const res = await fetch('/api/search/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ q }),
+        body: JSON.stringify({ q, pricing }),
+        signal: controller.signal,
       })
-      if (!res.ok) {
+      if (!res.ok || !res.body) {
         const text = await res.text()
         console.error('Search API error', res.status, text)
         setError(`Search failed: ${res.status}`)
-        setResults([])
       } else {
-        const data = await res.json()
-        setResults(data.results || [])
+        // newline-delimited JSON events: item* ... done
+        const reader = res.body.getReader()
+        const decoder = new TextDecoder()
+        const byKey = new Map()
+        let buf = ''
+        while (true) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buf += decoder.decode(value, { stream: true })
+          let changed = false
+          let nl
+          while ((nl = buf.indexOf('\n')) >= 0) {
+            const line = buf.slice(0, nl).trim()
+            buf = buf.slice(nl + 1)
+            if (!line) continue
+            const ev = JSON.parse(line)
+            if (ev.type === 'item') {
+              byKey.set(ev.item.key, ev.item)
+              changed = true
+            } else if (ev.type === 'done') {
+              // regroup per product (cheapest group first) and mark the lowest listing of each group
+              const grouped = new Map()
+              for (const g of ev.groups || []) {
+                g.keys.forEach((k, idx) => {
+                  const it = byKey.get(k)
+                  if (it) grouped.set(k, { ...it, group_id: g.group_id, group_size: g.size, is_lowest: idx === 0 })
+                })
+              }
+              for (const [k, it] of byKey) {
+                if (!grouped.has(k)) grouped.set(k, { ...it, is_lowest: k === ev.lowest_key })
+              }
+              byKey.clear()
+              for (const [k, it] of grouped) byKey.set(k, it)
+              setResultSetId(ev.result_set_id || null)
+              changed = true
+            }
+          }
+          if (changed) setResults(Array.from(byKey.values()))
+        }
       }
     } catch (err) {
+      if (err.name === 'AbortError') return
       console.error(err)
       setError('Network error')
-      setResults([])
     } finally {
-      setLoading(false)
+      if (searchAbort.current === controller) {
+        searchAbort.current = null
+        setLoading(false)
+      }
+    }
+  }
+
+  // one page of the cached result set, priced, filtered and sorted on the server
+  function pageUrl(id, cursor) {
+    const params = new URLSearchParams({
+      sort: SORT_PARAMS[sortOption] || 'recommended',
+      limit: String(PAGE_SIZE),
+    })
+    for (const [k, v] of Object.entries(pricing)) params.set(k, String(v))
+    if (storeFilter && storeFilter !== 'All Stores') params.set('retailer', storeFilter)
+    if (cursor) params.set('cursor', cursor)
+    return `/api/search/${id}/page?${params}`
+  }
+
+  async function fetchPage(id, cursor) {
+    const res = await fetch(pageUrl(id, cursor))
+    if (res.status === 404) {
+      // result set expired on the server; the next search will create a new one
+      setResultSetId(null)
+      return null
+    }
+    if (!res.ok) throw new Error(`Page request failed: ${res.status}`)
+    return res.json()
+  }
+
+  // first page whenever the result set, pricing, sort or store filter changes
+  useEffect(() => {
+    if (!resultSetId) return
+    let cancelled = false
+    const timer = setTimeout(async () => {
+      try {
+        const data = await fetchPage(resultSetId)
+        if (data && !cancelled) {
+          setResults(data.results || [])
+          setNextCursor(data.next_cursor || null)
+          setTotal(data.total ?? null)
+          setFacets(data.facets || null)
+        }
+      } catch (err) {
+        console.error(err)
+      }
+    }, 250)
+    return () => { cancelled = true; clearTimeout(timer) }
+  }, [resultSetId, pricing, sortOption, storeFilter])
+
+  async function loadMore() {
+    if (!resultSetId || !nextCursor) return
+    try {
+      const data = await fetchPage(resultSetId, nextCursor)
+      if (data) {
+        setResults(prev => prev.concat(data.results || []))
+        setNextCursor(data.next_cursor || null)
+      }
+    } catch (err) {
+      console.error(err)
     }
   }
 
@@ -116,7 +241,7 @@ export default function App() {
     try {
       localStorage.setItem('sortOption', sortOption)
       localStorage.setItem('storeFilter', storeFilter)
-      localStorage.setItem('shippingCost', String(shippingCost))
+      localStorage.setItem('shippingOverride', shippingOverride)
       localStorage.setItem('applyTax', String(applyTax))
       localStorage.setItem('taxThreshold', String(taxThreshold))
       localStorage.setItem('originCountry', originCountry)
@@ -124,26 +249,13 @@ export default function App() {
     } catch (e) {
       // ignore storage errors (e.g., private mode)
     }
-  }, [sortOption, storeFilter, shippingCost, applyTax, taxThreshold, originCountry, weightLbs])
+  }, [sortOption, storeFilter, shippingOverride, applyTax, taxThreshold, originCountry, weightLbs])
 
-  // derived values: store options and the filtered/sorted list
+  // store options: every retailer of the result set (from the server's facets once paged)
   const storeOptions = useMemo(() => {
-    const setStores = new Set((results || []).map(r => r.retailer || 'Unknown'))
-    return ['All Stores', ...Array.from(setStores)]
-  }, [results])
-
-  const displayedList = useMemo(() => {
-    let list = (results || []).slice()
-    if (storeFilter && storeFilter !== 'All Stores') {
-      list = list.filter(i => (i.retailer || '').toLowerCase() === (storeFilter || '').toLowerCase())
-    }
-    if (sortOption === 'low') {
-      list.sort((a, b) => (a.price_twd || 0) - (b.price_twd || 0))
-    } else if (sortOption === 'high') {
-      list.sort((a, b) => (b.price_twd || 0) - (a.price_twd || 0))
-    }
-    return list
-  }, [results, sortOption, storeFilter])
+    const stores = facets ? Object.keys(facets.retailer || {}) : Array.from(new Set((results || []).map(r => r.retailer || 'Unknown')))
+    return ['All Stores', ...stores]
+  }, [facets, results])
 
   return (
     <div className="min-h-screen p-8 bg-gray-900 text-gray-100">
@@ -166,14 +278,13 @@ export default function App() {
               <option value="recommended">Recommended</option>
               <option value="low">Price: Low to High</option>
               <option value="high">Price: High to Low</option>
+              <option value="discount">Biggest Discount</option>
             </select>
           </div>
           <div>
             <label className="text-sm text-gray-300 mr-2">Store</label>
             <select value={storeFilter} onChange={e => setStoreFilter(e.target.value)} className="p-2 bg-gray-800 border border-gray-700 rounded">
-              {/* options generated from results */}
-              <option value="All Stores">All Stores</option>
-              {Array.from(new Set(results.map(r => r.retailer || 'Unknown'))).map((s, i) => (
+              {storeOptions.map((s, i) => (
                 <option key={i} value={s}>{s}</option>
               ))}
             </select>
@@ -181,7 +292,8 @@ export default function App() {
           <div className="mt-3 md:mt-0 flex items-center gap-2">
             <a className="text-sm text-emerald-300 underline" href="https://www.buyandship.com.tw/" target="_blank" rel="noreferrer">運費參考 BuyandShip</a>
             <label className="text-sm text-gray-300 ml-4 mr-2">Origin</label>
-            <select value={originCountry} onChange={e => { setOriginCountry(e.target.value); const rate = ORIGIN_RATES[e.target.value] || 0; setShippingCost(Math.round((weightLbs||0) * rate)); }} className="p-2 bg-gray-800 border border-gray-700 rounded">
+            <select value={originCountry} onChange={e => setOriginCountry(e.target.value)} className="p-2 bg-gray-800 border border-gray-700 rounded">
+              <option value="">Listing's market</option>
               <option value="US">United States</option>
               <option value="GB">United Kingdom</option>
               <option value="JP">Japan</option>
@@ -191,10 +303,10 @@ export default function App() {
             </select>
 
             <label className="text-sm text-gray-300 ml-4 mr-2">Weight (lbs)</label>
-            <input type="number" min="0" step="0.1" value={weightLbs} onChange={e => { const v = Number(e.target.value); setWeightLbs(v); const rate = ORIGIN_RATES[originCountry] || 0; setShippingCost(Math.round(v * rate)); }} className="w-20 p-2 bg-gray-800 border border-gray-700 rounded text-gray-100" />
+            <input type="number" min="0" step="0.1" value={weightLbs} onChange={e => setWeightLbs(Number(e.target.value))} className="w-20 p-2 bg-gray-800 border border-gray-700 rounded text-gray-100" />
 
             <label className="text-sm text-gray-300 ml-4 mr-2">Shipping NT$</label>
-            <input type="number" value={shippingCost} onChange={e => setShippingCost(Number(e.target.value))} className="w-24 p-2 bg-gray-800 border border-gray-700 rounded text-gray-100" />
+            <input type="number" min="0" placeholder="estimate" value={shippingOverride} onChange={e => setShippingOverride(e.target.value)} className="w-24 p-2 bg-gray-800 border border-gray-700 rounded text-gray-100" />
             <label className="text-sm text-gray-300 ml-4 mr-2">Apply Tax</label>
             <input type="checkbox" checked={applyTax} onChange={e => setApplyTax(e.target.checked)} className="align-middle" />
             <label className="text-sm text-gray-300 ml-4 mr-2">Tax Threshold NT$</label>
@@ -206,18 +318,26 @@ export default function App() {
           {error && <div className="text-red-400 mb-4">{error}</div>}
           {results.length === 0 && !loading && !error && <div className="text-gray-400 mb-4">No results yet — try searching.</div>}
           <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-4">
-            {displayedList.map((r, idx) => (
+            {results.map((r, idx) => (
               r.url ? (
                 <a key={idx} href={r.url} target="_blank" rel="noreferrer" className="block">
-                  <PriceCard item={r} shippingCost={shippingCost} applyTax={applyTax} taxThreshold={taxThreshold} taxRate={TAX_RATE} />
+                  <PriceCard item={r} />
                 </a>
               ) : (
                 <div key={idx}>
-                  <PriceCard item={r} shippingCost={shippingCost} applyTax={applyTax} taxThreshold={taxThreshold} taxRate={TAX_RATE} />
+                  <PriceCard item={r} />
                 </div>
               )
             ))}
           </div>
+          {total !== null && (
+            <div className="flex items-center gap-4 mt-6 text-sm text-gray-400">
+              <span>Showing {results.length} of {total}</span>
+              {nextCursor && (
+                <button onClick={loadMore} className="px-4 py-2 bg-gray-800 border border-gray-700 rounded text-gray-100">Load more</button>
+              )}
+            </div>
+          )}
         </div>
       </div>
     </div>